@@ -4,7 +4,6 @@ Analytics Permissions
 Permission classes for analytics endpoints.
 """
 from rest_framework import permissions
-from apps.users.models import User
 
 
 class CanViewStudentAnalytics(permissions.BasePermission):
@@ -32,28 +31,20 @@ class CanViewStudentAnalytics(permissions.BasePermission):
         # Students can only view their own stats
         # obj here is the Student instance
         if user.has_role('STUDENT'):
-            # Check if this user is associated with the student
-            from apps.classes.models import Student
-            try:
-                student = Student.objects.get(user=user)
-                return student.id == obj.id
-            except Student.DoesNotExist:
-                return False
+            # Students are linked to accounts by email
+            return user.authz.student_id == obj.id
         
         # Teachers can view students in their classes
         if user.has_role('TEACHER'):
-            from apps.classes.models import Teacher, ClassStudent
-            try:
-                teacher = Teacher.objects.get(user=user)
-                # Check if student is in any of teacher's classes
-                teacher_classes = teacher.classes.all()
-                student_classes = ClassStudent.objects.filter(
-                    student_id=obj.id
-                ).values_list('class_instance_id', flat=True)
-                
-                return any(c.id in student_classes for c in teacher_classes)
-            except Teacher.DoesNotExist:
+            from apps.classes.models import ClassStudent
+            teacher_id = user.authz.teacher_id
+            if not teacher_id:
                 return False
+            # Check if student is in any of teacher's classes
+            return ClassStudent.objects.filter(
+                student_id=obj.id,
+                class_instance__teacher_id=teacher_id
+            ).exists()
         
         return False
 
@@ -83,12 +74,8 @@ class CanViewClassAnalytics(permissions.BasePermission):
         # Teachers can only view their own classes
         # obj here is the Class instance
         if user.has_role('TEACHER'):
-            from apps.classes.models import Teacher
-            try:
-                teacher = Teacher.objects.get(user=user)
-                return obj.teacher_id == teacher.id
-            except Teacher.DoesNotExist:
-                return False
+            teacher_id = user.authz.teacher_id
+            return bool(teacher_id) and obj.teacher_id == teacher_id
         
         # Students cannot view class-level analytics
         return False
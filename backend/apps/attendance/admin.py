@@ -2,6 +2,7 @@
 Admin interface for Attendance app
 """
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
 from .models import Attendance
 
@@ -175,20 +176,20 @@ class AttendanceAdmin(admin.ModelAdmin):
     def mark_as_present(self, request, queryset):
         """Bulk action to mark selected as PRESENT"""
         unlocked = queryset.filter(session__status='ACTIVE')
-        count = unlocked.update(status='PRESENT')
+        count = unlocked.update(status='PRESENT', updated_at=timezone.now())
         self.message_user(request, f'{count} attendance records marked as PRESENT')
     mark_as_present.short_description = 'Mark selected as PRESENT'
     
     def mark_as_absent(self, request, queryset):
         """Bulk action to mark selected as ABSENT"""
         unlocked = queryset.filter(session__status='ACTIVE')
-        count = unlocked.update(status='ABSENT')
+        count = unlocked.update(status='ABSENT', updated_at=timezone.now())
         self.message_user(request, f'{count} attendance records marked as ABSENT')
     mark_as_absent.short_description = 'Mark selected as ABSENT'
     
     def mark_as_late(self, request, queryset):
         """Bulk action to mark selected as LATE"""
         unlocked = queryset.filter(session__status='ACTIVE')
-        count = unlocked.update(status='LATE')
+        count = unlocked.update(status='LATE', updated_at=timezone.now())
         self.message_user(request, f'{count} attendance records marked as LATE')
     mark_as_late.short_description = 'Mark selected as LATE'
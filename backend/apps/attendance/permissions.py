@@ -17,7 +17,7 @@ class CanMarkAttendance(BasePermission):
         """Check user is teacher or admin"""
         return (
             request.user.is_authenticated and
-            (request.user.has_role('TEACHER') or request.user.has_role('ADMIN'))
+            request.user.has_any_role('TEACHER', 'ADMIN')
         )
     
     def has_object_permission(self, request, view, obj):
@@ -30,8 +30,9 @@ class CanMarkAttendance(BasePermission):
             return True
         
         # Teachers can only mark for their own classes
-        if hasattr(request.user, 'teacher_profile'):
-            return obj.session.teacher == request.user.teacher_profile
+        teacher_id = request.user.authz.teacher_id
+        if teacher_id:
+            return obj.session.teacher_id == teacher_id
         
         return False
 
@@ -60,12 +61,14 @@ class CanViewAttendance(BasePermission):
             return True
         
         # Teachers can view their class attendance
-        if hasattr(request.user, 'teacher_profile'):
-            return obj.session.teacher == request.user.teacher_profile
+        teacher_id = request.user.authz.teacher_id
+        if teacher_id:
+            return obj.session.teacher_id == teacher_id
         
         # Students can view their own attendance
-        if hasattr(request.user, 'student_profile'):
-            return obj.student == request.user.student_profile
+        student_id = request.user.authz.student_id
+        if student_id:
+            return obj.student_id == student_id
         
         return False
 
@@ -79,5 +82,5 @@ class IsTeacherOrAdmin(BasePermission):
         """Check user is teacher or admin"""
         return (
             request.user.is_authenticated and
-            (request.user.has_role('TEACHER') or request.user.has_role('ADMIN'))
+            request.user.has_any_role('TEACHER', 'ADMIN')
         )
@@ -21,6 +21,7 @@ from .serializers import (
 from .permissions import CanMarkAttendance, CanViewAttendance, IsTeacherOrAdmin
 from apps.sessions.models import ClassSession
 from apps.classes.models import Student
+from classroom_api.pagination import EstimatedCountPagination
 
 
 class AttendanceViewSet(viewsets.ModelViewSet):
@@ -37,6 +38,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
     
     queryset = Attendance.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = EstimatedCountPagination
     
     def get_queryset(self):
         """
@@ -5,3 +5,21 @@ class ClassesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.classes'
     verbose_name = 'Academic Structure'
+    
+    def ready(self):
+        """Import signals when app is ready"""
+        import apps.classes.signals  # noqa
+        
+        from django.db.models.signals import post_migrate, pre_migrate
+        from classroom_api.search import create_trigram_extension
+        from apps.classes.signals import backfill_enrolled_counts
+        pre_migrate.connect(
+            create_trigram_extension,
+            sender=self,
+            dispatch_uid='classes_create_trigram_extension'
+        )
+        post_migrate.connect(
+            backfill_enrolled_counts,
+            sender=self,
+            dispatch_uid='classes_backfill_enrolled_counts'
+        )
@@ -0,0 +1,22 @@
+"""
+Recompute the Class.enrolled_count counter cache from class_students
+"""
+from django.core.management.base import BaseCommand
+
+from apps.classes.services import EnrollmentService
+
+
+class Command(BaseCommand):
+    help = 'Repair Class.enrolled_count so it matches the actual number of enrollments'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--class-id',
+            action='append',
+            dest='class_ids',
+            help='Only repair the given class (may be repeated)'
+        )
+    
+    def handle(self, *args, **options):
+        repaired = EnrollmentService.repair_enrolled_counts(options['class_ids'])
+        self.stdout.write(self.style.SUCCESS(f'Repaired enrolled_count on {repaired} class(es)'))
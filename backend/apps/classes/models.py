@@ -3,6 +3,8 @@ from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator
 
+from classroom_api.search import trigram_index, prefix_index
+
 
 class Subject(models.Model):
     """
@@ -17,6 +19,10 @@ class Subject(models.Model):
     class Meta:
         db_table = 'subjects'
         ordering = ['name']
+        indexes = [
+            trigram_index('name', 'subjects'),
+            trigram_index('code', 'subjects'),
+        ]
     
     def __str__(self):
         return f"{self.code} - {self.name}"
@@ -42,6 +48,10 @@ class Teacher(models.Model):
     class Meta:
         db_table = 'teachers'
         ordering = ['employee_id']
+        indexes = [
+            trigram_index('employee_id', 'teachers'),
+            trigram_index('department', 'teachers'),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} ({self.employee_id})"
@@ -80,21 +90,23 @@ class Class(models.Model):
         null=True,
         validators=[MinValueValidator(1)]
     )
+    # Counter cache of ClassStudent rows, maintained by apps.classes.signals
+    # and repaired with `manage.py repair_enrolled_counts`
+    enrolled_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         db_table = 'classes'
         ordering = ['-academic_year', 'semester', 'name']
         verbose_name_plural = 'Classes'
+        indexes = [
+            trigram_index('name', 'classes'),
+            trigram_index('academic_year', 'classes'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.subject.code} ({self.academic_year} {self.semester})"
     
-    @property
-    def enrolled_count(self):
-        """Return the number of students enrolled in this class"""
-        return self.enrolled_students.count()
-    
     @property
     def is_full(self):
         """Check if the class has reached maximum capacity"""
@@ -121,6 +133,15 @@ class Student(models.Model):
     class Meta:
         db_table = 'students'
         ordering = ['student_id']
+        indexes = [
+            trigram_index('student_id', 'students'),
+            trigram_index('first_name', 'students'),
+            trigram_index('last_name', 'students'),
+            trigram_index('email', 'students'),
+            prefix_index('student_id', 'students'),
+            prefix_index('first_name', 'students'),
+            prefix_index('last_name', 'students'),
+        ]
     
     def __str__(self):
         return f"{self.student_id} - {self.first_name} {self.last_name}"
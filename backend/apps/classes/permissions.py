@@ -8,7 +8,7 @@ class IsAdminOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.method in permissions.SAFE_METHODS:
             return request.user.is_authenticated
-        return request.user.is_authenticated and request.user.roles.filter(name='ADMIN').exists()
+        return request.user.is_authenticated and request.user.has_role('ADMIN')
 
 
 class IsTeacherOrAdmin(permissions.BasePermission):
@@ -18,7 +18,7 @@ class IsTeacherOrAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        return request.user.roles.filter(name__in=['TEACHER', 'ADMIN']).exists()
+        return request.user.has_any_role('TEACHER', 'ADMIN')
 
 
 class IsClassOwnerOrAdmin(permissions.BasePermission):
@@ -30,12 +30,13 @@ class IsClassOwnerOrAdmin(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         # Admins have full access
-        if request.user.roles.filter(name='ADMIN').exists():
+        if request.user.has_role('ADMIN'):
             return True
         
         # Teachers can only modify their own classes
-        if hasattr(request.user, 'teacher_profile'):
-            return obj.teacher == request.user.teacher_profile
+        teacher_id = request.user.authz.teacher_id
+        if teacher_id:
+            return obj.teacher_id == teacher_id
         
         return False
 
@@ -47,15 +48,16 @@ class CanManageEnrollment(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        return request.user.roles.filter(name__in=['TEACHER', 'ADMIN']).exists()
+        return request.user.has_any_role('TEACHER', 'ADMIN')
     
     def has_object_permission(self, request, view, obj):
         # Admins can manage all enrollments
-        if request.user.roles.filter(name='ADMIN').exists():
+        if request.user.has_role('ADMIN'):
             return True
         
         # Teachers can manage their own class enrollments
-        if hasattr(request.user, 'teacher_profile'):
-            return obj.teacher == request.user.teacher_profile
+        teacher_id = request.user.authz.teacher_id
+        if teacher_id:
+            return obj.teacher_id == teacher_id
         
         return False
@@ -1,3 +1,5 @@
+import csv
+import io
 from rest_framework import serializers
 from .models import Subject, Teacher, Class, Student, ClassStudent
 from apps.users.serializers import UserSerializer
@@ -165,3 +167,75 @@ class EnrollmentSerializer(serializers.Serializer):
         if not Student.objects.filter(id=value).exists():
             raise serializers.ValidationError("Student not found")
         return value
+
+
+class BulkEnrollmentSerializer(serializers.Serializer):
+    """
+    Serializer for bulk enroll/unenroll actions
+    
+    Accepts either a JSON list of student UUIDs / student_id codes, or a CSV
+    upload with a 'student_id' (or 'id') column. Without a recognised header
+    the first column of every row is used.
+    """
+    MAX_ROWS = 5000
+    
+    students = serializers.ListField(
+        child=serializers.CharField(max_length=50),
+        required=False,
+        allow_empty=False,
+        help_text="List of student UUIDs or student_id codes"
+    )
+    file = serializers.FileField(
+        required=False,
+        help_text="CSV file with one student per row"
+    )
+    
+    def validate(self, data):
+        """Normalise both input styles into a single identifiers list"""
+        if data.get('file'):
+            identifiers = self._read_csv(data['file'])
+        elif data.get('students'):
+            identifiers = [value.strip() for value in data['students'] if value.strip()]
+        else:
+            raise serializers.ValidationError("Provide either 'students' or a CSV 'file'")
+        
+        if not identifiers:
+            raise serializers.ValidationError("No students found in request")
+        if len(identifiers) > self.MAX_ROWS:
+            raise serializers.ValidationError(
+                f"At most {self.MAX_ROWS} students can be processed per request"
+            )
+        
+        data['identifiers'] = identifiers
+        return data
+    
+    def _read_csv(self, upload):
+        """Stream identifiers out of an uploaded CSV file"""
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            reader = csv.reader(stream)
+            identifiers = []
+            column = 0
+            for line_number, row in enumerate(reader):
+                if line_number == 0:
+                    header = [cell.strip().lower() for cell in row]
+                    for name in ('student_id', 'id'):
+                        if name in header:
+                            column = header.index(name)
+                            break
+                    else:
+                        if row and row[0].strip():
+                            identifiers.append(row[0].strip())
+                    continue
+                
+                if len(row) > column and row[column].strip():
+                    identifiers.append(row[column].strip())
+                
+                if len(identifiers) > self.MAX_ROWS:
+                    break
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise serializers.ValidationError({'file': f'Could not parse CSV: {e}'})
+        finally:
+            stream.detach()
+        
+        return identifiers
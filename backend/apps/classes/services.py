@@ -0,0 +1,294 @@
+"""
+Enrollment Services
+Capacity-safe enrollment logic shared by the class views and management commands
+"""
+import uuid
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, IntegerField
+from django.db.models.functions import Coalesce
+
+from .models import Class, ClassStudent, Student
+
+
+class EnrollmentService:
+    """Service for enrolling and unenrolling students"""
+
+    @staticmethod
+    def enroll(class_id, student):
+        """
+        Enroll a student in a class without over-filling it
+
+        The class row is locked for the duration of the transaction so that
+        concurrent enrollments are serialised on the capacity check. The
+        enrolled_count counter itself is bumped by the ClassStudent post_save
+        signal inside the same transaction.
+
+        Args:
+            class_id: UUID of the class
+            student: Student instance to enroll
+
+        Returns:
+            ClassStudent: the created enrollment
+
+        Raises:
+            ValueError: If the class is full or the student is already enrolled
+        """
+        with transaction.atomic():
+            class_instance = Class.objects.select_for_update().only(
+                'id', 'max_students', 'enrolled_count'
+            ).get(id=class_id)
+
+            if class_instance.is_full:
+                raise ValueError('Class is full')
+
+            try:
+                with transaction.atomic():
+                    return ClassStudent.objects.create(
+                        class_instance_id=class_instance.id,
+                        student=student
+                    )
+            except IntegrityError:
+                raise ValueError('Student is already enrolled in this class')
+
+    @staticmethod
+    def unenroll(class_id, student):
+        """
+        Remove a student from a class
+
+        Returns:
+            bool: True if an enrollment was deleted, False if none existed
+        """
+        with transaction.atomic():
+            enrollment = ClassStudent.objects.filter(
+                class_instance_id=class_id,
+                student=student
+            ).first()
+
+            if not enrollment:
+                return False
+
+            enrollment.delete()
+            return True
+
+    @staticmethod
+    def repair_enrolled_counts(class_ids=None):
+        """
+        Recompute Class.enrolled_count from the class_students table
+
+        Args:
+            class_ids: Optional iterable of class UUIDs to restrict the repair to
+
+        Returns:
+            int: Number of classes whose counter was out of date
+        """
+        actual_count = ClassStudent.objects.filter(
+            class_instance_id=OuterRef('pk')
+        ).order_by().values('class_instance_id').annotate(
+            total=Count('id')
+        ).values('total')
+
+        queryset = Class.objects.all()
+        if class_ids is not None:
+            queryset = queryset.filter(id__in=list(class_ids))
+
+        queryset = queryset.annotate(
+            actual=Coalesce(Subquery(actual_count, output_field=IntegerField()), 0)
+        )
+
+        drifted = [
+            class_id for class_id, counter, actual in
+            queryset.values_list('id', 'enrolled_count', 'actual')
+            if counter != actual
+        ]
+
+        if drifted:
+            with transaction.atomic():
+                Class.objects.filter(id__in=drifted).update(
+                    enrolled_count=Coalesce(
+                        Subquery(actual_count, output_field=IntegerField()), 0
+                    )
+                )
+
+        return len(drifted)
+
+    @staticmethod
+    def resolve_students(identifiers):
+        """
+        Resolve a list of student UUIDs and/or student_id codes in one query
+
+        Args:
+            identifiers: Iterable of strings (UUIDs or student_id codes)
+
+        Returns:
+            dict: identifier -> Student UUID for every identifier that matched
+        """
+        uuids = set()
+        codes = set()
+        for identifier in identifiers:
+            codes.add(identifier)
+            try:
+                uuids.add(uuid.UUID(identifier))
+            except ValueError:
+                pass
+
+        resolved = {}
+        rows = Student.objects.filter(
+            Q(id__in=uuids) | Q(student_id__in=codes)
+        ).values_list('id', 'student_id')
+
+        for student_uuid, student_code in rows:
+            resolved[str(student_uuid)] = student_uuid
+            resolved[student_code] = student_uuid
+
+        return {
+            identifier: resolved[identifier]
+            for identifier in identifiers
+            if identifier in resolved
+        }
+
+    @staticmethod
+    def bulk_enroll(class_id, identifiers):
+        """
+        Enroll many students at once under a single capacity check
+
+        Args:
+            class_id: UUID of the class
+            identifiers: List of student UUIDs or student_id codes
+
+        Returns:
+            list: One {'student': identifier, 'status': ..., 'student_uuid': ...}
+            outcome per input row, in input order. Status is one of
+            'enrolled', 'already_enrolled', 'duplicate', 'not_found' or 'class_full'.
+        """
+        resolved = EnrollmentService.resolve_students(identifiers)
+
+        with transaction.atomic():
+            class_instance = Class.objects.select_for_update().only(
+                'id', 'max_students', 'enrolled_count'
+            ).get(id=class_id)
+
+            already_enrolled = set(
+                ClassStudent.objects.filter(
+                    class_instance_id=class_id,
+                    student_id__in=set(resolved.values())
+                ).values_list('student_id', flat=True)
+            )
+
+            if class_instance.max_students:
+                remaining = max(class_instance.max_students - class_instance.enrolled_count, 0)
+            else:
+                remaining = None
+
+            results = []
+            seen = set()
+            to_create = []
+            for identifier in identifiers:
+                student_uuid = resolved.get(identifier)
+                if student_uuid is None:
+                    outcome = 'not_found'
+                elif student_uuid in already_enrolled:
+                    outcome = 'already_enrolled'
+                elif student_uuid in seen:
+                    outcome = 'duplicate'
+                elif remaining is not None and len(to_create) >= remaining:
+                    outcome = 'class_full'
+                else:
+                    outcome = 'enrolled'
+                    to_create.append(ClassStudent(
+                        class_instance_id=class_id,
+                        student_id=student_uuid
+                    ))
+
+                if student_uuid is not None:
+                    seen.add(student_uuid)
+
+                results.append({
+                    'student': identifier,
+                    'student_uuid': str(student_uuid) if student_uuid else None,
+                    'status': outcome,
+                })
+
+            if to_create:
+                # bulk_create skips post_save, so the counter is reset from
+                # the table while the class row is still locked
+                ClassStudent.objects.bulk_create(to_create, ignore_conflicts=True)
+                EnrollmentService._sync_enrolled_count(class_id)
+
+        return results
+
+    @staticmethod
+    def bulk_unenroll(class_id, identifiers):
+        """
+        Remove many students from a class at once
+
+        Returns:
+            list: One {'student': identifier, 'status': ...} outcome per input row.
+            Status is one of 'unenrolled', 'not_enrolled', 'duplicate' or 'not_found'.
+        """
+        resolved = EnrollmentService.resolve_students(identifiers)
+
+        with transaction.atomic():
+            Class.objects.select_for_update().only('id').get(id=class_id)
+
+            enrollments = ClassStudent.objects.filter(
+                class_instance_id=class_id,
+                student_id__in=set(resolved.values())
+            )
+            enrolled = set(enrollments.values_list('student_id', flat=True))
+
+            results = []
+            seen = set()
+            for identifier in identifiers:
+                student_uuid = resolved.get(identifier)
+                if student_uuid is None:
+                    outcome = 'not_found'
+                elif student_uuid in seen:
+                    outcome = 'duplicate'
+                elif student_uuid in enrolled:
+                    outcome = 'unenrolled'
+                else:
+                    outcome = 'not_enrolled'
+
+                if student_uuid is not None:
+                    seen.add(student_uuid)
+
+                results.append({
+                    'student': identifier,
+                    'student_uuid': str(student_uuid) if student_uuid else None,
+                    'status': outcome,
+                })
+
+            if enrolled:
+                # QuerySet.delete() would fire post_delete (one counter UPDATE)
+                # per row, so delete in one statement and reset the counter
+                # from the table while the class row is still locked.
+                # Nothing references class_students, so there is no cascade.
+                meta = ClassStudent._meta
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'DELETE FROM {meta.db_table} '
+                        f'WHERE {meta.get_field("class_instance").column} = %s '
+                        f'AND {meta.get_field("student").column} = ANY(%s)',
+                        [class_id, list(enrolled)]
+                    )
+                EnrollmentService._sync_enrolled_count(class_id)
+
+        return results
+
+    @staticmethod
+    def _sync_enrolled_count(class_id):
+        """Set one class's enrolled_count to the real number of enrollments"""
+        Class.objects.filter(id=class_id).update(
+            enrolled_count=Coalesce(
+                Subquery(
+                    ClassStudent.objects.filter(
+                        class_instance_id=class_id
+                    ).order_by().values('class_instance_id').annotate(
+                        total=Count('id')
+                    ).values('total'),
+                    output_field=IntegerField()
+                ),
+                0
+            )
+        )
@@ -0,0 +1,99 @@
+"""
+Signals for maintaining the Class.enrolled_count counter cache and
+revoking tokens whose teacher_id or student_id claim no longer matches
+"""
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from apps.users.authorization import revoke_authorization
+from .models import Class, ClassStudent, Student, Teacher
+
+
+@receiver(post_save, sender=ClassStudent)
+def increment_enrolled_count(sender, instance, created, **kwargs):
+    """Bump the class counter when a new enrollment row is inserted"""
+    if not created:
+        return
+    
+    Class.objects.filter(id=instance.class_instance_id).update(
+        enrolled_count=F('enrolled_count') + 1
+    )
+
+
+@receiver(post_delete, sender=ClassStudent)
+def decrement_enrolled_count(sender, instance, **kwargs):
+    """
+    Lower the class counter when an enrollment row is removed
+    
+    Also fires for cascade deletes (e.g. deleting a Student), so the
+    counter stays correct whichever way the enrollment disappears.
+    """
+    Class.objects.filter(
+        id=instance.class_instance_id,
+        enrolled_count__gt=0
+    ).update(
+        enrolled_count=F('enrolled_count') - 1
+    )
+
+
+@receiver(post_save, sender=Teacher)
+def revoke_authorization_on_teacher_created(sender, instance, created, **kwargs):
+    """New teacher profiles must show up in the user's token claims"""
+    if created:
+        revoke_authorization([instance.user_id])
+
+
+@receiver(post_delete, sender=Teacher)
+def revoke_authorization_on_teacher_deleted(sender, instance, **kwargs):
+    """Removed teacher profiles must disappear from the user's token claims"""
+    revoke_authorization([instance.user_id])
+
+
+def _revoke_authorization_for_emails(emails):
+    """Student records are linked to accounts by email"""
+    emails = [email for email in emails if email]
+    if emails:
+        revoke_authorization(
+            get_user_model().objects.filter(email__in=emails).values_list('pk', flat=True)
+        )
+
+
+@receiver(pre_save, sender=Student)
+def remember_student_email(sender, instance, **kwargs):
+    """Keep the stored email so post_save can tell whether the link moved"""
+    instance._stored_email = Student.objects.filter(pk=instance.pk).values_list(
+        'email', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=Student)
+def revoke_authorization_on_student_linked(sender, instance, created, **kwargs):
+    """New or re-addressed student records change the student_id claim"""
+    stored_email = getattr(instance, '_stored_email', None)
+    if created or stored_email != instance.email:
+        _revoke_authorization_for_emails([stored_email, instance.email])
+
+
+@receiver(post_delete, sender=Student)
+def revoke_authorization_on_student_deleted(sender, instance, **kwargs):
+    """Removed student records must disappear from the account's token claims"""
+    _revoke_authorization_for_emails([instance.email])
+
+
+def backfill_enrolled_counts(sender, using, **kwargs):
+    """
+    Bring enrolled_count in line with class_students after migrate
+
+    Connected to post_migrate in ClassesConfig.ready(), so the first migrate
+    after the column is added fills it for existing classes; on later runs
+    it only rewrites classes whose counter has drifted. Same repair as
+    `manage.py repair_enrolled_counts`.
+    """
+    from .services import EnrollmentService
+
+    # The classes app ships no migration files, so its tables may not exist yet
+    if Class._meta.db_table not in connections[using].introspection.table_names():
+        return
+    EnrollmentService.repair_enrolled_counts()
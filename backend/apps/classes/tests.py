@@ -2,11 +2,13 @@
 Tests for Module 2: Academic Structure
 Tests all models, serializers, views, and permissions
 """
+from io import StringIO
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from datetime import date, timedelta
+from apps.users.authentication import RoleClaimsJWTAuthentication, RoleClaimsRefreshToken
 from apps.users.models import Role
 from apps.classes.models import Subject, Teacher, Class, Student, ClassStudent
 
@@ -158,10 +160,55 @@ class ClassModelTest(TestCase):
         self.assertEqual(self.cs_class.teacher, self.teacher)
 
     def test_class_enrolled_count(self):
-        """Test enrolled_count property"""
+        """Test enrolled_count counter is maintained on enroll and unenroll"""
         self.assertEqual(self.cs_class.enrolled_count, 0)
 
         # Add a student
+        student = Student.objects.create(
+            student_id='S001',
+            first_name='Jane',
+            last_name='Doe',
+            email='jane@test.com',
+            enrollment_date=date.today()
+        )
+        enrollment = ClassStudent.objects.create(
+            class_instance=self.cs_class,
+            student=student
+        )
+
+        self.cs_class.refresh_from_db()
+        self.assertEqual(self.cs_class.enrolled_count, 1)
+
+        enrollment.delete()
+        self.cs_class.refresh_from_db()
+        self.assertEqual(self.cs_class.enrolled_count, 0)
+
+    def test_repair_enrolled_counts(self):
+        """Test repair command restores a drifted counter"""
+        from django.core.management import call_command
+
+        student = Student.objects.create(
+            student_id='S001',
+            first_name='Jane',
+            last_name='Doe',
+            email='jane@test.com',
+            enrollment_date=date.today()
+        )
+        ClassStudent.objects.create(
+            class_instance=self.cs_class,
+            student=student
+        )
+        Class.objects.filter(id=self.cs_class.id).update(enrolled_count=7)
+
+        call_command('repair_enrolled_counts', stdout=StringIO())
+
+        self.cs_class.refresh_from_db()
+        self.assertEqual(self.cs_class.enrolled_count, 1)
+
+    def test_enrolled_counts_backfilled_after_migrate(self):
+        """Test post_migrate fills enrolled_count for existing enrollments"""
+        from django.core.management.sql import emit_post_migrate_signal
+
         student = Student.objects.create(
             student_id='S001',
             first_name='Jane',
@@ -173,7 +220,11 @@ class ClassModelTest(TestCase):
             class_instance=self.cs_class,
             student=student
         )
+        Class.objects.filter(id=self.cs_class.id).update(enrolled_count=0)
 
+        emit_post_migrate_signal(0, False, 'default')
+
+        self.cs_class.refresh_from_db()
         self.assertEqual(self.cs_class.enrolled_count, 1)
 
     def test_class_str(self):
@@ -522,6 +573,106 @@ class ClassAPITest(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_enroll_student_into_full_class(self):
+        """Test enrollment is rejected once max_students is reached"""
+        self.cs_class.max_students = 1
+        self.cs_class.save()
+
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(
+            f'/api/classes/classes/{self.cs_class.id}/enroll/',
+            {'student_id': str(self.student1.id)}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(
+            f'/api/classes/classes/{self.cs_class.id}/enroll/',
+            {'student_id': str(self.student2.id)}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Class is full')
+
+        self.cs_class.refresh_from_db()
+        self.assertEqual(self.cs_class.enrolled_count, 1)
+        self.assertEqual(ClassStudent.objects.count(), 1)
+
+    def test_enroll_student_twice(self):
+        """Test duplicate enrollment is rejected without bumping the counter"""
+        self.client.force_authenticate(user=self.admin_user)
+        url = f'/api/classes/classes/{self.cs_class.id}/enroll/'
+        self.client.post(url, {'student_id': str(self.student1.id)})
+        response = self.client.post(url, {'student_id': str(self.student1.id)})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.cs_class.refresh_from_db()
+        self.assertEqual(self.cs_class.enrolled_count, 1)
+
+    def test_bulk_enroll_mixed_identifiers(self):
+        """Test bulk enroll accepts UUIDs and student_id codes with per-row outcomes"""
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.post(
+            f'/api/classes/classes/{self.cs_class.id}/bulk-enroll/',
+            {'students': [str(self.student1.id), 'S002', 'S999', 'S002']},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        outcomes = [row['status'] for row in response.data['results']]
+        self.assertEqual(outcomes, ['enrolled', 'enrolled', 'not_found', 'duplicate'])
+
+        self.cs_class.refresh_from_db()
+        self.assertEqual(self.cs_class.enrolled_count, 2)
+
+    def test_bulk_enroll_respects_capacity(self):
+        """Test bulk enroll stops at max_students"""
+        self.cs_class.max_students = 1
+        self.cs_class.save()
+
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(
+            f'/api/classes/classes/{self.cs_class.id}/bulk-enroll/',
+            {'students': ['S001', 'S002']},
+            format='json'
+        )
+        outcomes = [row['status'] for row in response.data['results']]
+        self.assertEqual(outcomes, ['enrolled', 'class_full'])
+        self.assertEqual(ClassStudent.objects.count(), 1)
+
+    def test_bulk_enroll_csv_upload(self):
+        """Test bulk enroll from an uploaded CSV file"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        upload = SimpleUploadedFile(
+            'cohort.csv',
+            b'student_id,name\nS001,Jane Doe\nS002,John Smith\n',
+            content_type='text/csv'
+        )
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.post(
+            f'/api/classes/classes/{self.cs_class.id}/bulk-enroll/',
+            {'file': upload},
+            format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['enrolled_count'], 2)
+
+    def test_bulk_unenroll(self):
+        """Test bulk unenroll removes enrollments and updates the counter"""
+        ClassStudent.objects.create(class_instance=self.cs_class, student=self.student1)
+        ClassStudent.objects.create(class_instance=self.cs_class, student=self.student2)
+
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.post(
+            f'/api/classes/classes/{self.cs_class.id}/bulk-unenroll/',
+            {'students': ['S001', 'S002']},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unenrolled_count'], 2)
+        self.assertEqual(ClassStudent.objects.count(), 0)
+
+        self.cs_class.refresh_from_db()
+        self.assertEqual(self.cs_class.enrolled_count, 0)
+
     def test_unenroll_student(self):
         """Test unenrolling a student"""
         # First enroll
@@ -555,6 +706,143 @@ class ClassAPITest(APITestCase):
         self.assertIn('class_instance', response.data[0])
         self.assertIn('enrolled_at', response.data[0])
 
+    def test_export_class_roster_csv(self):
+        """Test roster can be streamed as CSV"""
+        ClassStudent.objects.create(
+            class_instance=self.cs_class,
+            student=self.student1
+        )
+
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get(f'/api/classes/classes/{self.cs_class.id}/roster/?export=csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('S001', lines[1])
+
+    def test_export_class_students_jsonl(self):
+        """Test enrolled students can be streamed as JSON lines"""
+        import json
+
+        ClassStudent.objects.create(class_instance=self.cs_class, student=self.student1)
+        ClassStudent.objects.create(class_instance=self.cs_class, student=self.student2)
+
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get(f'/api/classes/classes/{self.cs_class.id}/students/?export=jsonl')
+        rows = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual([row['student_id'] for row in rows], ['S001', 'S002'])
+
+    def test_export_unknown_format(self):
+        """Test unknown export formats are rejected"""
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get(f'/api/classes/classes/{self.cs_class.id}/roster/?export=xml')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_role_checks_are_cached(self):
+        """Test roles and teacher profile are loaded once per user instance"""
+        user = User.objects.get(id=self.teacher_user.id)
+        with self.assertNumQueries(2):
+            self.assertTrue(user.has_role('TEACHER'))
+            self.assertFalse(user.has_role('ADMIN'))
+            self.assertTrue(user.has_any_role('TEACHER', 'ADMIN'))
+            self.assertEqual(user.authz.teacher_id, self.teacher.id)
+            self.assertEqual(user.authz.teacher_id, self.teacher.id)
+
+    def test_role_cache_reset_on_role_change(self):
+        """Test changing a user's roles drops the cached role set"""
+        user = User.objects.get(id=self.teacher_user.id)
+        self.assertFalse(user.has_role('ADMIN'))
+        user.roles.add(Role.objects.get(name='ADMIN'))
+        self.assertTrue(user.has_role('ADMIN'))
+
+    def test_token_claims_authorize_without_queries(self):
+        """Test role checks on a claims-authenticated user need no queries"""
+        token = RoleClaimsRefreshToken.for_user(self.teacher_user).access_token
+        user = RoleClaimsJWTAuthentication().get_user(token)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.is_authenticated)
+            self.assertTrue(user.has_role('TEACHER'))
+            self.assertFalse(user.has_role('ADMIN'))
+            self.assertEqual(user.authz.teacher_id, self.teacher.id)
+
+    def test_student_claim_authorizes_without_queries(self):
+        """Test the linked student record comes from the token claims"""
+        student_user = User.objects.create_user(email='pupil@test.com', password='pupil123')
+        student = Student.objects.create(
+            student_id='S900',
+            first_name='Pat',
+            last_name='Pupil',
+            email='pupil@test.com',
+            enrollment_date=date.today()
+        )
+
+        token = RoleClaimsRefreshToken.for_user(student_user).access_token
+        user = RoleClaimsJWTAuthentication().get_user(token)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.authz.student_id, student.id)
+            self.assertIsNone(user.authz.teacher_id)
+
+    def test_token_revoked_when_student_record_linked(self):
+        """Test creating a student record for an account invalidates its tokens"""
+        from rest_framework_simplejwt.exceptions import AuthenticationFailed
+
+        student_user = User.objects.create_user(email='pupil@test.com', password='pupil123')
+        token = RoleClaimsRefreshToken.for_user(student_user).access_token
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(
+                student_id='S900',
+                first_name='Pat',
+                last_name='Pupil',
+                email='pupil@test.com',
+                enrollment_date=date.today()
+            )
+
+        with self.assertRaises(AuthenticationFailed):
+            RoleClaimsJWTAuthentication().get_user(token)
+
+    def test_access_token_authenticates_on_empty_cache(self):
+        """Test a fresh token is accepted when its authz version is not cached"""
+        from django.core.cache import cache
+
+        cache.clear()
+        token = RoleClaimsRefreshToken.for_user(self.teacher_user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/classes/classes/').status_code, status.HTTP_200_OK)
+
+    def test_token_revoked_when_roles_change(self):
+        """Test tokens issued before a role change are rejected"""
+        token = RoleClaimsRefreshToken.for_user(self.teacher_user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get('/api/classes/classes/').status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher_user.roles.add(Role.objects.get(name='ADMIN'))
+
+        response = self.client.get('/api/classes/classes/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stale_authz_version_does_not_overwrite_revocation(self):
+        """Test a version read before a revocation committed cannot be cached after it"""
+        from django.core.cache import cache
+        from apps.users.authorization import (
+            AUTHZ_VERSION_CACHE_TIMEOUT, _authz_version_key, get_authz_version, revoke_authorization
+        )
+
+        old_version = get_authz_version(self.teacher_user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            revoke_authorization([self.teacher_user.pk])
+
+        # A reader that loaded the row before the commit tries to cache it
+        cache.add(_authz_version_key(self.teacher_user.pk), old_version, AUTHZ_VERSION_CACHE_TIMEOUT)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_authz_version(self.teacher_user.pk), old_version + 1)
+
 
 class TeacherAPITest(APITestCase):
     """Test Teacher API endpoints"""
@@ -594,6 +882,130 @@ class TeacherAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
 
+    def test_bulk_assign_teacher_role(self):
+        """Test bulk TEACHER assignment creates every profile in a few queries"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        users = [
+            User.objects.create_user(email=f'faculty{i}@test.com', password='pass12345')
+            for i in range(25)
+        ]
+
+        self.client.force_authenticate(user=self.admin_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/users/bulk-update-roles/', {
+                'user_ids': [str(user.id) for user in users],
+                'roles': ['TEACHER'],
+                'action': 'add'
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated_count'], 25)
+        self.assertLess(len(queries), 15)
+
+        employee_ids = list(
+            Teacher.objects.filter(user__in=users).values_list('employee_id', flat=True)
+        )
+        self.assertEqual(len(employee_ids), 25)
+        self.assertEqual(len(set(employee_ids)), 25)
+
+    def test_import_accounts_csv(self):
+        """Test bulk import queues the file and the task creates accounts and reports bad rows"""
+        import os
+        import tempfile
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from apps.users.services import AccountImportService
+        from apps.users.tasks import import_accounts_task
+
+        content = (
+            'email,first_name,last_name,password,roles,student_id,employee_id\n'
+            'alice@test.com,Alice,A,password123,STUDENT,S100,\n'
+            'bob@test.com,Bob,B,password123,TEACHER,,\n'
+            'carol@test.com,Carol,C,,TEACHER,,T001\n'
+            'teacher@test.com,Dup,User,password123,,,\n'
+            'dave@test.com,Dave,D,password123,STUDENT,,\n'
+        )
+        upload = SimpleUploadedFile('accounts.csv', content.encode(), content_type='text/csv')
+
+        self.client.force_authenticate(user=self.admin_user)
+        with tempfile.TemporaryDirectory() as imports_dir, \
+                mock.patch.object(AccountImportService, 'IMPORTS_DIR', imports_dir), \
+                mock.patch.object(import_accounts_task, 'delay') as delay:
+            delay.return_value.id = 'import-1'
+            response = self.client.post('/api/users/import/', {'file': upload}, format='multipart')
+            args, kwargs = delay.call_args
+            result = import_accounts_task.apply(args=args, kwargs=kwargs).get()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['task_id'], 'import-1')
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(sorted(error['row'] for error in result['errors']), [4, 5, 6])
+        self.assertFalse(os.path.exists(args[0]))
+        self.assertTrue(User.objects.get(email='alice@test.com').check_password('password123'))
+        self.assertTrue(Student.objects.filter(student_id='S100', email='alice@test.com').exists())
+        self.assertTrue(Teacher.objects.filter(user__email='bob@test.com').exists())
+
+    def test_import_accounts_api_rejects_unknown_format(self):
+        """Test the HTTP import refuses unsupported files before queueing anything"""
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from apps.users.tasks import import_accounts_task
+
+        upload = SimpleUploadedFile('accounts.xlsx', b'data')
+
+        self.client.force_authenticate(user=self.admin_user)
+        with mock.patch.object(import_accounts_task, 'delay') as delay:
+            response = self.client.post('/api/users/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        delay.assert_not_called()
+
+    def test_import_status_reports_progress_and_results(self):
+        """Test polling an import returns running counts, then the per-row results"""
+        from unittest import mock
+        from apps.users.tasks import import_accounts_task
+
+        self.client.force_authenticate(user=self.admin_user)
+        running = mock.Mock(state='PROGRESS', info={'created': 1000, 'failed': 3})
+        running.name = import_accounts_task.name
+        with mock.patch('apps.users.views.AsyncResult', return_value=running):
+            response = self.client.get('/api/users/import/abc/')
+        self.assertEqual(response.data['status'], 'running')
+        self.assertEqual(response.data['created'], 1000)
+
+        errors = [{'row': 4, 'email': 'x@test.com', 'errors': ['Duplicate email']}]
+        done = mock.Mock(state='SUCCESS', result={'created': 2, 'failed': 1, 'errors': errors})
+        done.name = import_accounts_task.name
+        with mock.patch('apps.users.views.AsyncResult', return_value=done):
+            response = self.client.get('/api/users/import/abc/')
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['errors'], errors)
+
+    def test_user_directory_paginates_and_filters_by_role(self):
+        """Test the user directory pages with a constant number of queries"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        for i in range(30):
+            User.objects.create_user(email=f'user{i}@test.com', password='pass12345')
+
+        self.client.force_authenticate(user=self.admin_user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/list/?limit=10')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 32)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertLessEqual(len(queries), 5)
+
+        response = self.client.get('/api/users/list/?limit=10&role=TEACHER')
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['roles'], ['TEACHER'])
+
+        response = self.client.get('/api/users/list/?limit=10&search=user1')
+        self.assertEqual(response.data['count'], 11)
+
     def test_get_teacher_classes(self):
         """Test getting classes taught by a teacher"""
         subject = Subject.objects.create(name='CS101', code='CS101')
@@ -657,6 +1069,64 @@ class StudentAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
 
+    def test_list_students_paginated_on_request(self):
+        """Test ?limit= switches the list to a paginated envelope"""
+        Student.objects.create(
+            student_id='S002',
+            first_name='John',
+            last_name='Smith',
+            email='john@test.com',
+            enrollment_date=date.today()
+        )
+
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get('/api/classes/students/?limit=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertFalse(response.data['count_is_estimate'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_search_students(self):
+        """Test ?search= filters students by name, ID or email"""
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get('/api/classes/students/?search=nomatch')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 0)
+
+        response = self.client.get(f'/api/classes/students/?search={self.student.student_id}')
+        self.assertEqual(len(response.data), 1)
+
+    def test_autocomplete_students(self):
+        """Test prefix autocomplete returns lightweight rows"""
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get(
+            '/api/classes/students/autocomplete/',
+            {'q': self.student.last_name[:2]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['student_id'], self.student.student_id)
+
+    def test_autocomplete_clamps_non_positive_limit(self):
+        """Test a zero or negative limit still returns the best match"""
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get(
+            '/api/classes/students/autocomplete/',
+            {'q': self.student.last_name[:2], 'limit': -5}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+    def test_autocomplete_rejects_invalid_class_id(self):
+        """Test a malformed class_id is a 400, not a server error"""
+        self.client.force_authenticate(user=self.teacher_user)
+        response = self.client.get(
+            '/api/classes/students/autocomplete/',
+            {'q': self.student.last_name[:2], 'class_id': 'not-a-uuid'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_student_as_admin(self):
         """Test admin can create student"""
         self.client.force_authenticate(user=self.admin_user)
@@ -1,6 +1,9 @@
+import uuid
+
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 
 from .models import Subject, Teacher, Class, Student, ClassStudent
@@ -13,9 +16,23 @@ from .serializers import (
     StudentSerializer,
     StudentListSerializer,
     ClassStudentSerializer,
-    EnrollmentSerializer
+    EnrollmentSerializer,
+    BulkEnrollmentSerializer
 )
 from .permissions import IsAdminOrReadOnly, IsTeacherOrAdmin, IsClassOwnerOrAdmin, CanManageEnrollment
+from .services import EnrollmentService
+from classroom_api.exports import get_export_format, stream_queryset
+from classroom_api.pagination import EstimatedCountPagination
+
+
+STUDENT_EXPORT_FIELDS = [
+    'id', 'student_id', 'first_name', 'last_name', 'email',
+    'major', 'enrollment_date'
+]
+ROSTER_EXPORT_FIELDS = [
+    'id', 'enrolled_at', 'student_id', 'student__student_id',
+    'student__first_name', 'student__last_name', 'student__email', 'student__major'
+]
 
 
 class SubjectViewSet(viewsets.ModelViewSet):
@@ -88,8 +105,27 @@ class ClassViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def students(self, request, pk=None):
-        """Get all students enrolled in this class"""
+        """
+        Get all students enrolled in this class
+        
+        Pass ?export=csv or ?export=jsonl to stream the list instead
+        """
         class_instance = self.get_object()
+        
+        try:
+            export_format = get_export_format(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if export_format:
+            queryset = Student.objects.filter(
+                enrolled_classes__class_instance_id=class_instance.id
+            ).order_by('student_id')
+            return stream_queryset(
+                queryset, STUDENT_EXPORT_FIELDS, export_format,
+                f'class_{class_instance.id}_students'
+            )
+        
         enrollments = class_instance.enrolled_students.select_related('student').all()
         students = [enrollment.student for enrollment in enrollments]
         serializer = StudentListSerializer(students, many=True)
@@ -104,26 +140,15 @@ class ClassViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             student = get_object_or_404(Student, id=serializer.validated_data['student_id'])
             
-            # Check if already enrolled
-            if ClassStudent.objects.filter(class_instance=class_instance, student=student).exists():
-                return Response(
-                    {'error': 'Student is already enrolled in this class'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Check if class is full
-            if class_instance.is_full:
+            # Capacity and duplicate checks happen under a row lock on the class
+            try:
+                enrollment = EnrollmentService.enroll(class_instance.id, student)
+            except ValueError as e:
                 return Response(
-                    {'error': 'Class is full'},
+                    {'error': str(e)},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Create enrollment
-            enrollment = ClassStudent.objects.create(
-                class_instance=class_instance,
-                student=student
-            )
-            
             return Response(
                 ClassStudentSerializer(enrollment).data,
                 status=status.HTTP_201_CREATED
@@ -140,19 +165,12 @@ class ClassViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             student = get_object_or_404(Student, id=serializer.validated_data['student_id'])
             
-            # Find and delete enrollment
-            enrollment = ClassStudent.objects.filter(
-                class_instance=class_instance,
-                student=student
-            ).first()
-            
-            if not enrollment:
+            if not EnrollmentService.unenroll(class_instance.id, student):
                 return Response(
                     {'error': 'Student is not enrolled in this class'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            enrollment.delete()
             return Response(
                 {'message': 'Student unenrolled successfully'},
                 status=status.HTTP_200_OK
@@ -160,10 +178,86 @@ class ClassViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=True, methods=['post'], url_path='bulk-enroll',
+            permission_classes=[CanManageEnrollment])
+    def bulk_enroll(self, request, pk=None):
+        """
+        Enroll many students in this class at once
+        
+        POST /api/classes/{id}/bulk-enroll/
+        Body: {"students": ["uuid-or-student-id", ...]}
+        or multipart upload with a CSV 'file'
+        
+        Returns per-row outcomes in input order
+        """
+        class_instance = self.get_object()
+        serializer = BulkEnrollmentSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = EnrollmentService.bulk_enroll(
+            class_instance.id,
+            serializer.validated_data['identifiers']
+        )
+        enrolled = sum(1 for row in results if row['status'] == 'enrolled')
+        
+        return Response({
+            'message': f'{enrolled} student(s) enrolled',
+            'enrolled_count': enrolled,
+            'results': results
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['post'], url_path='bulk-unenroll',
+            permission_classes=[CanManageEnrollment])
+    def bulk_unenroll(self, request, pk=None):
+        """
+        Remove many students from this class at once
+        
+        POST /api/classes/{id}/bulk-unenroll/
+        Same body formats as bulk-enroll
+        """
+        class_instance = self.get_object()
+        serializer = BulkEnrollmentSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        results = EnrollmentService.bulk_unenroll(
+            class_instance.id,
+            serializer.validated_data['identifiers']
+        )
+        unenrolled = sum(1 for row in results if row['status'] == 'unenrolled')
+        
+        return Response({
+            'message': f'{unenrolled} student(s) unenrolled',
+            'unenrolled_count': unenrolled,
+            'results': results
+        }, status=status.HTTP_200_OK)
+    
     @action(detail=True, methods=['get'])
     def roster(self, request, pk=None):
-        """Get detailed class roster with enrollment dates"""
+        """
+        Get detailed class roster with enrollment dates
+        
+        Pass ?export=csv or ?export=jsonl to stream the roster instead
+        """
         class_instance = self.get_object()
+        
+        try:
+            export_format = get_export_format(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if export_format:
+            queryset = ClassStudent.objects.filter(
+                class_instance_id=class_instance.id
+            ).order_by('enrolled_at')
+            return stream_queryset(
+                queryset, ROSTER_EXPORT_FIELDS, export_format,
+                f'class_{class_instance.id}_roster'
+            )
+        
         enrollments = class_instance.enrolled_students.select_related('student').all()
         serializer = ClassStudentSerializer(enrollments, many=True)
         return Response(serializer.data)
@@ -177,6 +271,7 @@ class StudentViewSet(viewsets.ModelViewSet):
     """
     queryset = Student.objects.all()
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = EstimatedCountPagination
     search_fields = ['student_id', 'first_name', 'last_name', 'email']
     filterset_fields = ['major', 'enrollment_date']
     ordering_fields = ['student_id', 'last_name', 'enrollment_date']
@@ -200,6 +295,83 @@ class StudentViewSet(viewsets.ModelViewSet):
             return StudentListSerializer
         return StudentSerializer
     
+    def list(self, request, *args, **kwargs):
+        """
+        List students
+        
+        Pass ?export=csv or ?export=jsonl to stream every matching student
+        """
+        try:
+            export_format = get_export_format(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if export_format:
+            queryset = self.filter_queryset(self.get_queryset()).order_by('student_id')
+            return stream_queryset(queryset, STUDENT_EXPORT_FIELDS, export_format, 'students')
+        
+        return super().list(request, *args, **kwargs)
+    
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Prefix search for roster pickers
+        
+        GET /api/classes/students/autocomplete/?q=jo&class_id=<uuid>&limit=10
+        
+        Matches the start of student_id, first name, last name or email.
+        "jane do" matches first name "Jane..." and last name "Do...".
+        Served by the Upper(...) text_pattern_ops / trigram indexes on students.
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response([])
+        
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 50))
+        except ValueError:
+            limit = 10
+        
+        terms = query.split()
+        if len(terms) > 1:
+            condition = (
+                Q(first_name__istartswith=terms[0]) &
+                Q(last_name__istartswith=' '.join(terms[1:]))
+            )
+        else:
+            condition = (
+                Q(student_id__istartswith=query) |
+                Q(first_name__istartswith=query) |
+                Q(last_name__istartswith=query) |
+                Q(email__istartswith=query)
+            )
+        
+        queryset = Student.objects.filter(condition)
+        
+        class_id = request.query_params.get('class_id')
+        if class_id:
+            try:
+                class_id = uuid.UUID(class_id)
+            except ValueError:
+                return Response(
+                    {'error': 'class_id must be a valid UUID'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            queryset = queryset.filter(enrolled_classes__class_instance_id=class_id)
+        
+        results = [
+            {
+                'id': row['id'],
+                'student_id': row['student_id'],
+                'full_name': f"{row['first_name']} {row['last_name']}",
+                'email': row['email'],
+            }
+            for row in queryset.order_by('last_name', 'first_name').values(
+                'id', 'student_id', 'first_name', 'last_name', 'email'
+            )[:limit]
+        ]
+        return Response(results)
+    
     @action(detail=True, methods=['get'])
     def classes(self, request, pk=None):
         """Get all classes this student is enrolled in"""
@@ -222,6 +394,7 @@ class ClassStudentViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = ClassStudent.objects.select_related('class_instance', 'student').all()
     serializer_class = ClassStudentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EstimatedCountPagination
     filterset_fields = ['class_instance', 'student']
     ordering_fields = ['enrolled_at']
     ordering = ['-enrolled_at']
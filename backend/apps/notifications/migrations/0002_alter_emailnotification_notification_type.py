@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailnotification',
+            name='notification_type',
+            field=models.CharField(choices=[('WEEKLY_REPORT', 'Weekly Attendance Report'), ('LOW_ATTENDANCE_ALERT', 'Low Attendance Alert'), ('SYSTEM_NOTIFICATION', 'System Notification'), ('REPORT_READY', 'Scheduled Report Ready')], help_text='Type of notification email', max_length=50),
+        ),
+    ]
@@ -21,6 +21,7 @@ class EmailNotification(models.Model):
         WEEKLY_REPORT = 'WEEKLY_REPORT', 'Weekly Attendance Report'
         LOW_ATTENDANCE_ALERT = 'LOW_ATTENDANCE_ALERT', 'Low Attendance Alert'
         SYSTEM_NOTIFICATION = 'SYSTEM_NOTIFICATION', 'System Notification'
+        REPORT_READY = 'REPORT_READY', 'Scheduled Report Ready'
     
     class DeliveryStatus(models.TextChoices):
         """Email delivery status."""
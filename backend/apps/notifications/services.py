@@ -5,10 +5,13 @@ Email service for sending notification emails.
 import logging
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-from django.core.mail import EmailMultiAlternatives
+from smtplib import SMTPServerDisconnected
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
+from django.db.models import Case, Count, F, FloatField, Q, Value, When, Window
+from django.db.models.functions import Cast, RowNumber
 from django.utils import timezone
 
 from apps.classes.models import Student, Teacher
@@ -17,6 +20,17 @@ from .models import EmailNotification
 
 logger = logging.getLogger(__name__)
 
+# Absences listed in a low attendance alert
+RECENT_ABSENCES_LIMIT = 10
+
+# HTML template (without .html) used for each notification type
+NOTIFICATION_TEMPLATES = {
+    EmailNotification.NotificationType.WEEKLY_REPORT: 'weekly_report',
+    EmailNotification.NotificationType.LOW_ATTENDANCE_ALERT: 'low_attendance_alert',
+    EmailNotification.NotificationType.SYSTEM_NOTIFICATION: 'system_notification',
+    EmailNotification.NotificationType.REPORT_READY: 'report_ready',
+}
+
 
 class EmailService:
     """
@@ -28,6 +42,49 @@ class EmailService:
     - Error handling and logging
     """
     
+    @staticmethod
+    def build_message(
+        recipient_email: str,
+        recipient_name: str,
+        subject: str,
+        template_name: str,
+        context: Dict,
+        connection=None
+    ) -> EmailMultiAlternatives:
+        """
+        Render an email from its template, with a plain text alternative.
+        
+        Args:
+            recipient_email: Email address of recipient
+            recipient_name: Name of recipient
+            subject: Email subject line
+            template_name: Name of HTML template (without .html)
+            context: Template context dictionary
+            connection: Optional email backend connection to send it over
+        
+        Returns:
+            Unsent EmailMultiAlternatives
+        """
+        # Add recipient name to context
+        context = {**context, 'recipient_name': recipient_name}
+        
+        # Render HTML content
+        html_content = render_to_string(
+            f'notifications/emails/{template_name}.html',
+            context
+        )
+        
+        # Create email message with a plain text version
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=strip_tags(html_content),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[recipient_email],
+            connection=connection
+        )
+        email.attach_alternative(html_content, "text/html")
+        return email
+    
     @staticmethod
     def send_email(
         notification_type: str,
@@ -54,29 +111,10 @@ class EmailService:
             True if email sent successfully, False otherwise
         """
         try:
-            # Add recipient name to context
-            context['recipient_name'] = recipient_name
-            
-            # Render HTML content
-            html_content = render_to_string(
-                f'notifications/emails/{template_name}.html',
-                context
+            email = EmailService.build_message(
+                recipient_email, recipient_name, subject, template_name, context
             )
             
-            # Create plain text version
-            text_content = strip_tags(html_content)
-            
-            # Create email message
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[recipient_email]
-            )
-            
-            # Attach HTML alternative
-            email.attach_alternative(html_content, "text/html")
-            
             # Send email
             email.send(fail_silently=False)
             
@@ -91,6 +129,63 @@ class EmailService:
             logger.error(error_msg)
             return False
     
+    @staticmethod
+    def send_batch(notifications: List[EmailNotification]) -> Dict[str, str]:
+        """
+        Send several notification emails over one SMTP session.
+        
+        Messages are rendered and sent one at a time so that a refused
+        recipient only fails its own message. If the server drops the
+        session, the connection is reopened for the remaining messages.
+        If it cannot be opened at all (server down, TLS or auth failure),
+        every notification fails with that error.
+        
+        Args:
+            notifications: EmailNotification objects to send
+        
+        Returns:
+            Error message per failed notification ID; the rest were sent
+        """
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"Could not open email connection for {len(notifications)} emails: {str(e)}")
+            return {str(notification.id): str(e) for notification in notifications}
+        
+        failures = {}
+        reconnect = False
+        try:
+            for notification in notifications:
+                try:
+                    if reconnect:
+                        connection.open()
+                        reconnect = False
+                    email = EmailService.build_message(
+                        notification.recipient_email,
+                        notification.recipient_name,
+                        notification.subject,
+                        NOTIFICATION_TEMPLATES.get(notification.notification_type, 'system_notification'),
+                        notification.context_data,
+                        connection=connection
+                    )
+                    email.send(fail_silently=False)
+                except Exception as e:
+                    failures[str(notification.id)] = str(e)
+                    logger.error(f"Failed to send email to {notification.recipient_email}: {str(e)}")
+                    if isinstance(e, SMTPServerDisconnected):
+                        connection.close()
+                        reconnect = True
+        finally:
+            # The messages are already sent; a failed QUIT must not fail them
+            try:
+                connection.close()
+            except Exception as e:
+                logger.warning(f"Error closing email connection: {str(e)}")
+        
+        logger.info(f"Sent {len(notifications) - len(failures)} of {len(notifications)} emails")
+        return failures
+    
     @staticmethod
     def prepare_weekly_report_context(student: Student) -> Dict:
         """
@@ -102,27 +197,58 @@ class EmailService:
         Returns:
             Dictionary with template context
         """
-        # Get attendance data for the past week
         end_date = timezone.now()
         start_date = end_date - timedelta(days=7)
         
+        return EmailService.prepare_weekly_report_contexts([student], start_date, end_date)[student.id]
+    
+    @staticmethod
+    def prepare_weekly_report_contexts(students: List[Student], start_date: datetime, end_date: datetime) -> Dict:
+        """
+        Prepare weekly report contexts for a batch of students.
+        
+        One query reads the period's attendance of every student in the
+        batch, ordered by student and session time; the per-student and
+        per-class statistics are then counted in memory.
+        
+        Args:
+            students: Student objects of the batch
+            start_date: Start of the reporting period
+            end_date: End of the reporting period
+        
+        Returns:
+            Dictionary of template contexts keyed by student ID
+        """
+        records_by_student = {student.id: [] for student in students}
+        
         records = Attendance.objects.filter(
-            student=student,
+            student_id__in=list(records_by_student),
             session__start_time__range=[start_date, end_date]
-        ).select_related('session', 'session__class_ref').order_by('session__start_time')
-        
-        # Calculate statistics
-        total_sessions = records.count()
-        present_count = records.filter(status='PRESENT').count()
-        absent_count = records.filter(status='ABSENT').count()
-        late_count = records.filter(status='LATE').count()
+        ).order_by('student_id', 'session__start_time').values_list(
+            'student_id',
+            'session__class_ref__name',
+            'session__start_time',
+            'status',
+            'marked_at'
+        )
+        for student_id, *record in records:
+            records_by_student[student_id].append(record)
         
-        attendance_rate = (present_count / total_sessions * 100) if total_sessions > 0 else 0
+        return {
+            student.id: EmailService._weekly_report_context(
+                student, records_by_student[student.id], start_date, end_date
+            )
+            for student in students
+        }
+    
+    @staticmethod
+    def _weekly_report_context(student: Student, records: List, start_date: datetime, end_date: datetime) -> Dict:
+        """Build one student's weekly report context from (class, start, status, marked_at) records"""
+        status_counts = {'PRESENT': 0, 'ABSENT': 0, 'LATE': 0}
         
         # Group records by class
         classes_data = {}
-        for record in records:
-            class_name = record.session.class_ref.name
+        for class_name, start_time, status, marked_at in records:
             if class_name not in classes_data:
                 classes_data[class_name] = {
                     'name': class_name,
@@ -133,17 +259,14 @@ class EmailService:
                 }
             
             classes_data[class_name]['sessions'].append({
-                'date': record.session.start_time.strftime('%Y-%m-%d'),
-                'status': record.status,
-                'marked_at': record.marked_at.strftime('%Y-%m-%d %H:%M:%S') if record.marked_at else None
+                'date': start_time.strftime('%Y-%m-%d'),
+                'status': status,
+                'marked_at': marked_at.strftime('%Y-%m-%d %H:%M:%S') if marked_at else None
             })
             
-            if record.status == 'PRESENT':
-                classes_data[class_name]['present'] += 1
-            elif record.status == 'ABSENT':
-                classes_data[class_name]['absent'] += 1
-            elif record.status == 'LATE':
-                classes_data[class_name]['late'] += 1
+            if status in status_counts:
+                status_counts[status] += 1
+                classes_data[class_name][status.lower()] += 1
         
         # Calculate per-class attendance rates
         for class_data in classes_data.values():
@@ -152,24 +275,65 @@ class EmailService:
                 class_data['present'] / total * 100
             ) if total > 0 else 0
         
+        total_sessions = len(records)
+        attendance_rate = (status_counts['PRESENT'] / total_sessions * 100) if total_sessions > 0 else 0
+        
         return {
             'student_name': student.get_full_name(),
             'start_date': start_date.strftime('%Y-%m-%d'),
             'end_date': end_date.strftime('%Y-%m-%d'),
             'total_sessions': total_sessions,
-            'present_count': present_count,
-            'absent_count': absent_count,
-            'late_count': late_count,
+            'present_count': status_counts['PRESENT'],
+            'absent_count': status_counts['ABSENT'],
+            'late_count': status_counts['LATE'],
             'attendance_rate': round(attendance_rate, 1),
             'classes': list(classes_data.values()),
             'low_attendance_warning': attendance_rate < 75.0
         }
     
+    @staticmethod
+    def create_weekly_report_notifications(
+        students: List[Student],
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[str]:
+        """
+        Create the WEEKLY_REPORT notifications of a batch of students.
+        
+        Args:
+            students: Student objects of the batch
+            start_date: Start of the reporting period
+            end_date: End of the reporting period
+        
+        Returns:
+            IDs of the new notifications, to queue for delivery
+        """
+        contexts = EmailService.prepare_weekly_report_contexts(students, start_date, end_date)
+        scheduled_at = timezone.now()
+        
+        notifications = EmailNotification.objects.bulk_create([
+            EmailNotification(
+                notification_type=EmailNotification.NotificationType.WEEKLY_REPORT,
+                recipient_email=student.email,
+                recipient_name=student.get_full_name(),
+                subject=(
+                    f"Your Weekly Attendance Report - "
+                    f"{contexts[student.id]['start_date']} to {contexts[student.id]['end_date']}"
+                ),
+                status=EmailNotification.DeliveryStatus.PENDING,
+                scheduled_at=scheduled_at,
+                context_data=contexts[student.id]
+            )
+            for student in students
+        ])
+        return [str(notification.id) for notification in notifications]
+    
     @staticmethod
     def prepare_low_attendance_alert_context(
         student: Student,
         attendance_rate: float,
-        threshold: float = 75.0
+        threshold: float = 75.0,
+        recent_absences: Optional[List[Dict]] = None
     ) -> Dict:
         """
         Prepare context data for low attendance alert email.
@@ -178,30 +342,14 @@ class EmailService:
             student: Student object
             attendance_rate: Current attendance percentage
             threshold: Threshold percentage that triggered the alert
+            recent_absences: Latest absences as returned by
+                get_students_with_low_attendance(); read here if omitted
         
         Returns:
             Dictionary with template context
         """
-        # Get recent absence data
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=30)
-        
-        absent_records = Attendance.objects.filter(
-            student=student,
-            session__start_time__range=[start_date, end_date],
-            status='ABSENT'
-        ).select_related(
-            'session',
-            'session__class_ref'
-        ).order_by('-session__start_time')[:10]
-        
-        recent_absences = [
-            {
-                'date': record.session.start_time.strftime('%Y-%m-%d'),
-                'class_name': record.session.class_ref.name,
-            }
-            for record in absent_records
-        ]
+        if recent_absences is None:
+            recent_absences = EmailService._recent_absences([student.id]).get(student.id, [])
         
         return {
             'student_name': student.get_full_name(),
@@ -217,24 +365,117 @@ class EmailService:
         """
         Get all students with attendance below the threshold.
         
+        One grouped query computes every student's rate and keeps those
+        below the threshold with HAVING (students without records count
+        as 0%); one windowed query then reads their latest absences.
+        
         Args:
             threshold: Minimum acceptable attendance percentage
         
         Returns:
-            List of dictionaries with student and attendance rate
+            List of dictionaries with student, attendance rate and recent absences
         """
-        from apps.analytics.services import StudentAnalyticsService
+        students = list(
+            Student.objects.annotate(
+                records_count=Count('attendance_records'),
+                present_count=Count('attendance_records', filter=Q(attendance_records__status='PRESENT'))
+            ).annotate(
+                attendance_rate=Case(
+                    When(records_count=0, then=Value(0.0)),
+                    default=Cast('present_count', FloatField()) * 100.0 / F('records_count'),
+                    output_field=FloatField()
+                )
+            ).filter(
+                attendance_rate__lt=threshold
+            ).order_by('last_name', 'first_name')
+        )
         
-        students_data = []
-        students = Student.objects.all()
+        absences = EmailService._recent_absences([student.id for student in students])
         
-        for student in students:
-            attendance_rate = StudentAnalyticsService.student_attendance_percentage(student.id)
-            
-            if attendance_rate < threshold:
-                students_data.append({
-                    'student': student,
-                    'attendance_rate': attendance_rate
-                })
+        return [
+            {
+                'student': student,
+                'attendance_rate': round(student.attendance_rate, 2),
+                'recent_absences': absences.get(student.id, [])
+            }
+            for student in students
+        ]
+    
+    @staticmethod
+    def _recent_absences(student_ids: List, days: int = 30, limit: int = RECENT_ABSENCES_LIMIT) -> Dict:
+        """
+        Latest absences of the last `days` days for many students in one query
+        
+        ROW_NUMBER() over each student's absences, newest first, keeps
+        the latest `limit` per student.
+        
+        Returns:
+            Dictionary of lists of {'date', 'class_name'}, keyed by student ID
+        """
+        if not student_ids:
+            return {}
+        
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=days)
         
-        return students_data
+        records = Attendance.objects.filter(
+            student_id__in=student_ids,
+            session__start_time__range=[start_date, end_date],
+            status='ABSENT'
+        ).annotate(
+            recency=Window(
+                RowNumber(),
+                partition_by=F('student_id'),
+                order_by=F('session__start_time').desc()
+            )
+        ).filter(
+            recency__lte=limit
+        ).order_by(
+            'student_id', 'recency'
+        ).values_list('student_id', 'session__start_time', 'session__class_ref__name')
+        
+        absences = {}
+        for student_id, start_time, class_name in records:
+            absences.setdefault(student_id, []).append({
+                'date': start_time.strftime('%Y-%m-%d'),
+                'class_name': class_name,
+            })
+        return absences
+    
+    @staticmethod
+    def create_low_attendance_notifications(threshold: float = 75.0) -> Dict:
+        """
+        Create LOW_ATTENDANCE_ALERT notifications for every student below the threshold.
+        
+        Args:
+            threshold: Minimum acceptable attendance percentage
+        
+        Returns:
+            Dictionary with notification_ids (to queue for delivery) and
+            students_data as from get_students_with_low_attendance()
+        """
+        students_data = EmailService.get_students_with_low_attendance(threshold)
+        scheduled_at = timezone.now()
+        
+        notifications = EmailNotification.objects.bulk_create([
+            EmailNotification(
+                notification_type=EmailNotification.NotificationType.LOW_ATTENDANCE_ALERT,
+                recipient_email=data['student'].email,
+                recipient_name=data['student'].get_full_name(),
+                subject=f"⚠️ Low Attendance Alert - Action Required ({data['attendance_rate']:.1f}%)",
+                status=EmailNotification.DeliveryStatus.PENDING,
+                scheduled_at=scheduled_at,
+                context_data=EmailService.prepare_low_attendance_alert_context(
+                    data['student'],
+                    data['attendance_rate'],
+                    threshold,
+                    data['recent_absences']
+                )
+            )
+            for data in students_data
+        ])
+        
+        return {
+            'notification_ids': [str(notification.id) for notification in notifications],
+            'students_data': students_data
+        }
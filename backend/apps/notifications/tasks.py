@@ -3,16 +3,24 @@ Celery tasks for asynchronous email delivery.
 """
 
 import logging
-from celery import shared_task
+from datetime import timedelta
+from typing import List
+from celery import group, shared_task
 from django.utils import timezone
 from django.conf import settings
 
 from .models import EmailNotification
-from .services import EmailService
+from .services import NOTIFICATION_TEMPLATES, EmailService
 from apps.classes.models import Student
 
 logger = logging.getLogger(__name__)
 
+# Students whose weekly reports are prepared per query
+WEEKLY_REPORT_BATCH_SIZE = 500
+
+# Notifications sent per send_email_batch_task, over one SMTP connection
+EMAIL_BATCH_SIZE = 100
+
 
 @shared_task(bind=True, max_retries=3)
 def send_email_task(self, notification_id: str):
@@ -34,13 +42,7 @@ def send_email_task(self, notification_id: str):
             return True
         
         # Determine template name based on notification type
-        template_map = {
-            EmailNotification.NotificationType.WEEKLY_REPORT: 'weekly_report',
-            EmailNotification.NotificationType.LOW_ATTENDANCE_ALERT: 'low_attendance_alert',
-            EmailNotification.NotificationType.SYSTEM_NOTIFICATION: 'system_notification',
-        }
-        
-        template_name = template_map.get(notification.notification_type, 'system_notification')
+        template_name = NOTIFICATION_TEMPLATES.get(notification.notification_type, 'system_notification')
         
         # Send email
         success = EmailService.send_email(
@@ -87,42 +89,115 @@ def send_email_task(self, notification_id: str):
         return False
 
 
+@shared_task
+def send_email_batch_task(notification_ids: List[str]):
+    """
+    Celery task to send a batch of email notifications over one SMTP connection.
+    
+    Notifications that are not PENDING or RETRYING are skipped, so a
+    duplicate delivery does not send them twice. Sent notifications are
+    marked with one UPDATE; failed ones follow increment_retry(): they
+    become RETRYING and are sent again as a new batch after
+    60 * retry_count seconds, or FAILED once max_retries is reached.
+    
+    Throughput can be measured without a real mail server by pointing
+    EMAIL_HOST/EMAIL_PORT at a local stand-in with EMAIL_USE_TLS=False,
+    e.g. ``python -m aiosmtpd -n -l localhost:1025``.
+    
+    Args:
+        notification_ids: UUIDs of the EmailNotifications
+    
+    Returns:
+        Counts of sent, retrying and failed notifications
+    """
+    notifications = list(EmailNotification.objects.filter(
+        id__in=notification_ids,
+        status__in=[EmailNotification.DeliveryStatus.PENDING, EmailNotification.DeliveryStatus.RETRYING]
+    ))
+    if not notifications:
+        return {'sent': 0, 'retrying': 0, 'failed': 0}
+    
+    failures = EmailService.send_batch(notifications)
+    now = timezone.now()
+    
+    sent_ids = [n.id for n in notifications if str(n.id) not in failures]
+    EmailNotification.objects.filter(id__in=sent_ids).update(
+        status=EmailNotification.DeliveryStatus.SENT,
+        sent_at=now,
+        updated_at=now
+    )
+    
+    failed = [n for n in notifications if str(n.id) in failures]
+    retry_batches = {}
+    for notification in failed:
+        notification.retry_count += 1
+        notification.error_message = failures[str(notification.id)]
+        notification.updated_at = now
+        if notification.retry_count < notification.max_retries:
+            notification.status = EmailNotification.DeliveryStatus.RETRYING
+            retry_batches.setdefault(notification.retry_count, []).append(str(notification.id))
+        else:
+            notification.status = EmailNotification.DeliveryStatus.FAILED
+            notification.failed_at = now
+            logger.error(f"Email {notification.id} failed after max retries")
+    EmailNotification.objects.bulk_update(
+        failed, ['retry_count', 'status', 'error_message', 'failed_at', 'updated_at']
+    )
+    
+    for retry_count, ids in retry_batches.items():
+        send_email_batch_task.apply_async((ids,), countdown=60 * retry_count)
+    
+    retrying = sum(len(ids) for ids in retry_batches.values())
+    return {
+        'sent': len(sent_ids),
+        'retrying': retrying,
+        'failed': len(failed) - retrying
+    }
+
+
+def queue_emails(notification_ids: List[str]):
+    """Enqueue send_email_batch_task for every EMAIL_BATCH_SIZE notifications, as one group"""
+    if notification_ids:
+        group(
+            send_email_batch_task.si(notification_ids[i:i + EMAIL_BATCH_SIZE])
+            for i in range(0, len(notification_ids), EMAIL_BATCH_SIZE)
+        ).apply_async()
+
+
 @shared_task
 def send_weekly_reports_task():
     """
     Celery task to send weekly attendance reports to all active students.
     
     This task should be scheduled to run weekly (e.g., every Sunday).
+    Students are processed in batches of WEEKLY_REPORT_BATCH_SIZE: one
+    query reads a batch's attendance, its notifications are bulk-created
+    and their sends are enqueued together.
     """
     logger.info("Starting weekly reports task")
     
-    students = Student.objects.all()
+    end_date = timezone.now()
+    start_date = end_date - timedelta(days=7)
     sent_count = 0
     failed_count = 0
+    last_id = None
     
-    for student in students:
+    while True:
+        students = Student.objects.only('id', 'first_name', 'last_name', 'email').order_by('id')
+        if last_id is not None:
+            students = students.filter(id__gt=last_id)
+        batch = list(students[:WEEKLY_REPORT_BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        
         try:
-            # Prepare email context
-            context = EmailService.prepare_weekly_report_context(student)
-            
-            # Create notification record
-            notification = EmailNotification.objects.create(
-                notification_type=EmailNotification.NotificationType.WEEKLY_REPORT,
-                recipient_email=student.email,
-                recipient_name=student.get_full_name(),
-                subject=f"Your Weekly Attendance Report - {context['start_date']} to {context['end_date']}",
-                status=EmailNotification.DeliveryStatus.PENDING,
-                scheduled_at=timezone.now(),
-                context_data=context
-            )
-            
-            # Queue email for delivery
-            send_email_task.delay(str(notification.id))
-            sent_count += 1
-            
+            notification_ids = EmailService.create_weekly_report_notifications(batch, start_date, end_date)
+            queue_emails(notification_ids)
+            sent_count += len(notification_ids)
         except Exception as e:
-            logger.error(f"Failed to queue weekly report for {student.email}: {str(e)}")
-            failed_count += 1
+            logger.error(f"Failed to queue weekly reports for a batch of {len(batch)} students: {str(e)}")
+            failed_count += len(batch)
     
     logger.info(
         f"Weekly reports task completed: {sent_count} queued, {failed_count} failed"
@@ -144,48 +219,16 @@ def send_low_attendance_alerts_task(threshold: float = 75.0):
     """
     logger.info(f"Starting low attendance alerts task (threshold: {threshold}%)")
     
-    students_data = EmailService.get_students_with_low_attendance(threshold)
-    sent_count = 0
-    failed_count = 0
-    
-    for data in students_data:
-        student = data['student']
-        attendance_rate = data['attendance_rate']
-        
-        try:
-            # Prepare email context
-            context = EmailService.prepare_low_attendance_alert_context(
-                student,
-                attendance_rate,
-                threshold
-            )
-            
-            # Create notification record
-            notification = EmailNotification.objects.create(
-                notification_type=EmailNotification.NotificationType.LOW_ATTENDANCE_ALERT,
-                recipient_email=student.email,
-                recipient_name=student.get_full_name(),
-                subject=f"⚠️ Low Attendance Alert - Action Required ({attendance_rate:.1f}%)",
-                status=EmailNotification.DeliveryStatus.PENDING,
-                scheduled_at=timezone.now(),
-                context_data=context
-            )
-            
-            # Queue email for delivery
-            send_email_task.delay(str(notification.id))
-            sent_count += 1
-            
-        except Exception as e:
-            logger.error(f"Failed to queue alert for {student.email}: {str(e)}")
-            failed_count += 1
+    notification_ids = EmailService.create_low_attendance_notifications(threshold)['notification_ids']
+    queue_emails(notification_ids)
     
     logger.info(
-        f"Low attendance alerts task completed: {sent_count} queued, {failed_count} failed"
+        f"Low attendance alerts task completed: {len(notification_ids)} queued"
     )
     
     return {
-        'queued': sent_count,
-        'failed': failed_count,
+        'queued': len(notification_ids),
+        'failed': 0,
         'threshold': threshold
     }
 
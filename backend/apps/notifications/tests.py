@@ -0,0 +1,361 @@
+"""
+Tests for email notifications
+"""
+from datetime import date, timedelta
+from smtplib import SMTPRecipientsRefused
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from apps.attendance.models import Attendance
+from apps.classes.models import Subject, Teacher, Class, Student, ClassStudent
+from apps.notifications.models import EmailNotification
+from apps.notifications.services import RECENT_ABSENCES_LIMIT, EmailService
+from apps.notifications.tasks import (
+    send_email_batch_task,
+    send_low_attendance_alerts_task,
+    send_weekly_reports_task,
+)
+from apps.sessions.models import ClassSession
+from apps.users.models import Role
+
+User = get_user_model()
+
+
+class AttendanceFixtureMixin:
+    """A class with enrolled students and helpers to record daily sessions"""
+
+    def setUp(self):
+        self.subject = Subject.objects.create(name='CS101', code='CS101')
+        self.teacher_user = User.objects.create_user(email='prof@test.com', password='test123')
+        self.teacher = Teacher.objects.create(
+            user=self.teacher_user,
+            employee_id='T001',
+            department='CS',
+            hire_date=date(2020, 1, 1)
+        )
+        self.cs_class = Class.objects.create(
+            subject=self.subject,
+            teacher=self.teacher,
+            name='CS101 A',
+            academic_year='2024-2025',
+            semester='FALL',
+            max_students=50
+        )
+
+    def _student(self, number):
+        student = Student.objects.create(
+            student_id=f'S{number:04d}',
+            first_name='Student',
+            last_name=f'{number:04d}',
+            email=f'student{number}@test.com',
+            enrollment_date=date(2024, 9, 1)
+        )
+        ClassStudent.objects.create(class_instance=self.cs_class, student=student)
+        return student
+
+    def _hold_daily_sessions(self, statuses_by_student, days, class_instance=None, hours_earlier=0):
+        """One session per day for the last `days` days, newest first"""
+        class_instance = class_instance or self.cs_class
+        now = timezone.now() - timedelta(hours=hours_earlier)
+        start_times = []
+        for day in range(days):
+            session = ClassSession.objects.create(
+                class_ref=class_instance,
+                subject=self.subject,
+                teacher=self.teacher,
+                status='ENDED',
+                end_time=now
+            )
+            # start_time is auto_now_add, so backdate it afterwards
+            ClassSession.objects.filter(id=session.id).update(start_time=now - timedelta(days=day))
+            start_times.append(now - timedelta(days=day))
+            Attendance.objects.bulk_create([
+                Attendance(session=session, student=student, status=record_status)
+                for student, record_status in statuses_by_student.items()
+            ])
+        return start_times
+
+
+class CountingBackend(LocmemBackend):
+    """locmem backend that counts sessions and refuses recipients at refused.test"""
+
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            refused = [to for to in message.to if to.endswith('@refused.test')]
+            if refused:
+                raise SMTPRecipientsRefused({to: (550, b'No such user') for to in refused})
+        return super().send_messages(messages)
+
+
+class UnreachableBackend(LocmemBackend):
+    """Backend whose server cannot be reached"""
+
+    def open(self):
+        raise ConnectionRefusedError('Connection refused')
+
+
+@override_settings(EMAIL_BACKEND='apps.notifications.tests.CountingBackend')
+class SendEmailBatchTaskTest(TestCase):
+    """Test batched sending over one connection with per-message retries"""
+
+    def setUp(self):
+        CountingBackend.opened = 0
+        patcher = mock.patch.object(send_email_batch_task, 'apply_async')
+        self.requeue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _notification(self, email, **fields):
+        return EmailNotification.objects.create(
+            notification_type=EmailNotification.NotificationType.REPORT_READY,
+            recipient_email=email,
+            recipient_name='Recipient',
+            subject='Your report is ready',
+            scheduled_at=timezone.now(),
+            context_data={'report_name': 'Weekly', 'download_url': 'http://testserver/r'},
+            **fields
+        )
+
+    def _run(self, notifications):
+        return send_email_batch_task.apply(args=[[str(n.id) for n in notifications]]).get()
+
+    def test_batch_sends_over_one_connection(self):
+        """Test every pending email goes out over a single session and is marked SENT"""
+        notifications = [self._notification(f'student{i}@test.com') for i in range(5)]
+        already_sent = self._notification(
+            'done@test.com', status=EmailNotification.DeliveryStatus.SENT
+        )
+
+        result = self._run(notifications + [already_sent])
+
+        self.assertEqual(result, {'sent': 5, 'retrying': 0, 'failed': 0})
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(
+            EmailNotification.objects.filter(
+                status=EmailNotification.DeliveryStatus.SENT, sent_at__isnull=False
+            ).count(),
+            5
+        )
+        self.requeue.assert_not_called()
+
+    def test_refused_recipient_is_retried_alone(self):
+        """Test a refused recipient moves to RETRYING and is re-queued without the others"""
+        sent = self._notification('student@test.com')
+        refused = self._notification('nobody@refused.test')
+
+        result = self._run([sent, refused])
+
+        self.assertEqual(result, {'sent': 1, 'retrying': 1, 'failed': 0})
+        sent.refresh_from_db()
+        refused.refresh_from_db()
+        self.assertEqual(sent.status, EmailNotification.DeliveryStatus.SENT)
+        self.assertEqual(refused.status, EmailNotification.DeliveryStatus.RETRYING)
+        self.assertEqual(refused.retry_count, 1)
+        self.assertIn('No such user', refused.error_message)
+        self.requeue.assert_called_once_with(([str(refused.id)],), countdown=60)
+
+    def test_last_attempt_marks_failed(self):
+        """Test a failure on the last allowed attempt is final"""
+        refused = self._notification(
+            'nobody@refused.test',
+            status=EmailNotification.DeliveryStatus.RETRYING,
+            retry_count=2
+        )
+
+        result = self._run([refused])
+
+        self.assertEqual(result, {'sent': 0, 'retrying': 0, 'failed': 1})
+        refused.refresh_from_db()
+        self.assertEqual(refused.status, EmailNotification.DeliveryStatus.FAILED)
+        self.assertEqual(refused.retry_count, 3)
+        self.assertIsNotNone(refused.failed_at)
+        self.requeue.assert_not_called()
+
+    @override_settings(EMAIL_BACKEND='apps.notifications.tests.UnreachableBackend')
+    def test_unreachable_server_retries_whole_batch(self):
+        """Test a connection failure counts against every email in the batch"""
+        notifications = [self._notification(f'student{i}@test.com') for i in range(3)]
+
+        result = self._run(notifications)
+
+        self.assertEqual(result, {'sent': 0, 'retrying': 3, 'failed': 0})
+        self.assertEqual(
+            EmailNotification.objects.filter(
+                status=EmailNotification.DeliveryStatus.RETRYING, retry_count=1
+            ).count(),
+            3
+        )
+        self.requeue.assert_called_once()
+        ((ids,),), kwargs = self.requeue.call_args
+        self.assertEqual(sorted(ids), sorted(str(n.id) for n in notifications))
+        self.assertEqual(kwargs, {'countdown': 60})
+
+
+class WeeklyReportBatchTest(AttendanceFixtureMixin, TestCase):
+    """Test weekly report contexts and notifications are built per batch"""
+
+    def _per_student_context(self, student, start_date, end_date):
+        """The per-student computation the batched contexts replace"""
+        records = Attendance.objects.filter(
+            student=student,
+            session__start_time__range=[start_date, end_date]
+        ).select_related('session', 'session__class_ref').order_by('session__start_time')
+
+        total_sessions = records.count()
+        present_count = records.filter(status='PRESENT').count()
+        classes_data = {}
+        for record in records:
+            class_data = classes_data.setdefault(record.session.class_ref.name, {
+                'name': record.session.class_ref.name,
+                'sessions': [],
+                'present': 0,
+                'absent': 0,
+                'late': 0
+            })
+            class_data['sessions'].append({
+                'date': record.session.start_time.strftime('%Y-%m-%d'),
+                'status': record.status,
+                'marked_at': record.marked_at.strftime('%Y-%m-%d %H:%M:%S') if record.marked_at else None
+            })
+            class_data[record.status.lower()] += 1
+        for class_data in classes_data.values():
+            class_data['attendance_rate'] = class_data['present'] / len(class_data['sessions']) * 100
+
+        attendance_rate = (present_count / total_sessions * 100) if total_sessions > 0 else 0
+        return {
+            'student_name': student.get_full_name(),
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d'),
+            'total_sessions': total_sessions,
+            'present_count': present_count,
+            'absent_count': records.filter(status='ABSENT').count(),
+            'late_count': records.filter(status='LATE').count(),
+            'attendance_rate': round(attendance_rate, 1),
+            'classes': list(classes_data.values()),
+            'low_attendance_warning': attendance_rate < 75.0
+        }
+
+    def test_batched_contexts_match_per_student_contexts(self):
+        """Test one query yields the same numbers as the per-student queries, records or not"""
+        lab = Class.objects.create(
+            subject=self.subject,
+            teacher=self.teacher,
+            name='CS101 Lab',
+            academic_year='2024-2025',
+            semester='FALL',
+            max_students=50
+        )
+        regular = self._student(1)
+        mixed = self._student(2)
+        unrecorded = self._student(3)
+        self._hold_daily_sessions({regular: 'PRESENT', mixed: 'LATE'}, days=3)
+        self._hold_daily_sessions({regular: 'ABSENT', mixed: 'PRESENT'}, days=2, class_instance=lab, hours_earlier=2)
+        # Outside the week
+        self._hold_daily_sessions({regular: 'ABSENT'}, days=1, hours_earlier=24 * 9)
+
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=7)
+        students = [regular, mixed, unrecorded]
+
+        with self.assertNumQueries(1):
+            contexts = EmailService.prepare_weekly_report_contexts(students, start_date, end_date)
+
+        for student in students:
+            self.assertEqual(
+                contexts[student.id],
+                self._per_student_context(student, start_date, end_date)
+            )
+        self.assertEqual(contexts[regular.id]['total_sessions'], 5)
+        self.assertEqual(contexts[unrecorded.id]['total_sessions'], 0)
+        self.assertEqual(contexts[unrecorded.id]['classes'], [])
+
+    def test_task_creates_and_queues_once_per_batch(self):
+        """Test each batch of students costs one bulk_create and one queue_emails"""
+        for number in range(5):
+            self._student(number)
+
+        with mock.patch('apps.notifications.tasks.WEEKLY_REPORT_BATCH_SIZE', 2), \
+                mock.patch('apps.notifications.tasks.queue_emails') as queue_emails, \
+                mock.patch.object(
+                    EmailNotification.objects, 'bulk_create', wraps=EmailNotification.objects.bulk_create
+                ) as bulk_create:
+            result = send_weekly_reports_task.apply().get()
+
+        self.assertEqual(result, {'queued': 5, 'failed': 0})
+        self.assertEqual(bulk_create.call_count, 3)
+        self.assertEqual(
+            [len(call.args[0]) for call in queue_emails.call_args_list],
+            [2, 2, 1]
+        )
+        self.assertEqual(
+            EmailNotification.objects.filter(
+                notification_type=EmailNotification.NotificationType.WEEKLY_REPORT
+            ).count(),
+            5
+        )
+
+class LowAttendanceDetectionTest(AttendanceFixtureMixin, TestCase):
+    """Test the grouped low attendance query and its windowed absences"""
+
+    def test_students_without_records_count_as_zero(self):
+        """Test students with no attendance are alerted at 0% and regular attendees are not"""
+        regular = self._student(1)
+        absent = self._student(2)
+        unrecorded = self._student(3)
+        self._hold_daily_sessions({regular: 'PRESENT', absent: 'ABSENT'}, days=4)
+
+        with self.assertNumQueries(2):
+            results = EmailService.get_students_with_low_attendance(75.0)
+
+        rates = {data['student'].id: data['attendance_rate'] for data in results}
+        self.assertEqual(rates, {absent.id: 0.0, unrecorded.id: 0.0})
+        by_student = {data['student'].id: data for data in results}
+        self.assertEqual(by_student[unrecorded.id]['recent_absences'], [])
+
+    def test_only_newest_absences_are_listed(self):
+        """Test each student's absences are cut to the newest RECENT_ABSENCES_LIMIT"""
+        absent = self._student(1)
+        session_times = self._hold_daily_sessions({absent: 'ABSENT'}, days=RECENT_ABSENCES_LIMIT + 3)
+
+        results = EmailService.get_students_with_low_attendance(75.0)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(
+            [absence['date'] for absence in results[0]['recent_absences']],
+            [start.strftime('%Y-%m-%d') for start in session_times[:RECENT_ABSENCES_LIMIT]]
+        )
+
+
+class TriggerLowAttendanceAlertAPITest(APITestCase):
+    """Test the low attendance trigger endpoint"""
+
+    def setUp(self):
+        self.admin_user = User.objects.create_user(email='admin@test.com', password='admin123')
+        Role.objects.create(name='ADMIN').users.add(self.admin_user)
+
+    def test_trigger_queues_the_task(self):
+        """Test detection is left to the task and its id is returned"""
+        self.client.force_authenticate(user=self.admin_user)
+        with mock.patch.object(send_low_attendance_alerts_task, 'delay') as delay:
+            delay.return_value.id = 'task-1'
+            response = self.client.post(
+                '/api/notifications/trigger-low-attendance-alert/',
+                {'threshold': 60},
+                format='json'
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['task_id'], 'task-1')
+        delay.assert_called_once_with(threshold=60.0)
+        self.assertFalse(EmailNotification.objects.exists())
@@ -3,6 +3,7 @@ Views for email notification API endpoints.
 """
 
 import logging
+from datetime import timedelta
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -18,7 +19,7 @@ from .serializers import (
     TriggerWeeklyReportSerializer,
     TriggerLowAttendanceAlertSerializer
 )
-from .tasks import send_weekly_reports_task, send_low_attendance_alerts_task, send_email_task
+from .tasks import queue_emails, send_low_attendance_alerts_task, send_weekly_reports_task
 from .services import EmailService
 
 logger = logging.getLogger(__name__)
@@ -60,39 +61,23 @@ class TriggerWeeklyReportView(APIView):
                 }, status=status.HTTP_202_ACCEPTED)
             else:
                 # Send reports to specific students
-                students = Student.objects.filter(
+                students = list(Student.objects.filter(
                     email__in=student_emails
-                )
+                ))
                 
-                if not students.exists():
+                if not students:
                     return Response({
                         'error': 'No students found with provided emails'
                     }, status=status.HTTP_404_NOT_FOUND)
                 
-                sent_count = 0
+                end_date = timezone.now()
+                notification_ids = EmailService.create_weekly_report_notifications(
+                    students, end_date - timedelta(days=7), end_date
+                )
+                queue_emails(notification_ids)
+                sent_count = len(notification_ids)
                 failed_count = 0
                 
-                for student in students:
-                    try:
-                        context = EmailService.prepare_weekly_report_context(student)
-                        
-                        notification = EmailNotification.objects.create(
-                            notification_type=EmailNotification.NotificationType.WEEKLY_REPORT,
-                            recipient_email=student.email,
-                            recipient_name=student.get_full_name(),
-                            subject=f"Your Weekly Attendance Report - {context['start_date']} to {context['end_date']}",
-                            status=EmailNotification.DeliveryStatus.PENDING,
-                            scheduled_at=timezone.now(),
-                            context_data=context
-                        )
-                        
-                        send_email_task.delay(str(notification.id))
-                        sent_count += 1
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to queue report for {student.email}: {str(e)}")
-                        failed_count += 1
-                
                 return Response({
                     'message': f'Weekly reports queued for {sent_count} students',
                     'sent_count': sent_count,
@@ -183,7 +168,7 @@ class ListNotificationsView(APIView):
             # Teachers see notifications for their students
             from apps.classes.models import Teacher
             try:
-                teacher = Teacher.objects.get(user=user)
+                teacher = Teacher.objects.get(user_id=user.pk)
                 # Get emails of students enrolled in teacher's classes
                 student_emails = Student.objects.filter(
                     enrolled_classes__class_instance__teacher=teacher
@@ -241,7 +226,7 @@ class NotificationDetailView(APIView):
                 elif user.has_role('TEACHER'):
                     from apps.classes.models import Teacher
                     try:
-                        teacher = Teacher.objects.get(user=user)
+                        teacher = Teacher.objects.get(user_id=user.pk)
                         student_emails = Student.objects.filter(
                             enrolled_classes__teacher=teacher
                         ).values_list('email', flat=True)
@@ -2,7 +2,7 @@
 Report Admin Configuration
 """
 from django.contrib import admin
-from apps.reports.models import Report
+from apps.reports.models import Report, ReportSubscription
 
 
 @admin.register(Report)
@@ -40,8 +40,48 @@ class ReportAdmin(admin.ModelAdmin):
         'id',
         'file_path',
         'file_size',
+        'cache_key',
+        'source',
+        'subscription',
         'created_at',
         'completed_at'
     ]
     
     ordering = ['-created_at']
+
+
+@admin.register(ReportSubscription)
+class ReportSubscriptionAdmin(admin.ModelAdmin):
+    """Admin interface for ReportSubscription model"""
+    
+    list_display = [
+        'id',
+        'report_type',
+        'format',
+        'frequency',
+        'class_instance',
+        'student',
+        'created_by',
+        'is_active',
+        'next_run_at',
+        'last_run_at'
+    ]
+    
+    list_filter = [
+        'report_type',
+        'frequency',
+        'is_active'
+    ]
+    
+    search_fields = [
+        'class_instance__name',
+        'created_by__email'
+    ]
+    
+    readonly_fields = [
+        'id',
+        'last_run_at',
+        'created_at'
+    ]
+    
+    ordering = ['next_run_at']
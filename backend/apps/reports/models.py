@@ -14,24 +14,33 @@ class Report(models.Model):
     Business Rules:
     - Teachers can only generate reports for their own classes
     - Students can only generate their own reports
-    - Admins can generate any report
-    - Reports are generated asynchronously and stored
+    - Admins can generate any report, including institution-wide extracts
+      and bundles of class reports
+    - Reports are generated asynchronously and stored until they expire;
+      an expired report is regenerated when it is downloaded again
     """
     
     REPORT_TYPES = [
         ('STUDENT', 'Student Report'),
         ('CLASS', 'Class Report'),
+        ('INSTITUTION', 'Institution Attendance Extract'),
+        ('MATRIX', 'Attendance Register'),
+        ('BUNDLE', 'Class Report Bundle'),
     ]
     
     FORMATS = [
         ('CSV', 'CSV'),
+        ('PARQUET', 'Parquet'),
+        ('XLSX', 'Excel'),
         ('PDF', 'PDF'),  # Future enhancement
     ]
     
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
+        ('PROCESSING', 'Processing'),
         ('COMPLETED', 'Completed'),
         ('FAILED', 'Failed'),
+        ('EXPIRED', 'Expired'),
     ]
     
     id = models.UUIDField(
@@ -60,6 +69,11 @@ class Report(models.Model):
         help_text='Report generation status'
     )
     
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        help_text='Generation progress in percent (0-100)'
+    )
+    
     # Filter parameters
     class_instance = models.ForeignKey(
         'classes.Class',
@@ -109,6 +123,49 @@ class Report(models.Model):
         help_text='User who requested the report'
     )
     
+    # Bundles: the selection that was requested, and the class reports in it
+    filters = models.JSONField(
+        null=True,
+        blank=True,
+        help_text='Class filters for bundle reports'
+    )
+    
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='children',
+        null=True,
+        blank=True,
+        help_text='Bundle this class report belongs to'
+    )
+    
+    # Identical requests share output instead of regenerating it
+    cache_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text='Hash of the report parameters and the data version they were generated from'
+    )
+    
+    source = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        related_name='followers',
+        null=True,
+        blank=True,
+        help_text='In-flight report whose output this report is waiting for'
+    )
+    
+    subscription = models.ForeignKey(
+        'ReportSubscription',
+        on_delete=models.SET_NULL,
+        related_name='reports',
+        null=True,
+        blank=True,
+        help_text='Subscription this report was generated for'
+    )
+    
     error_message = models.TextField(
         null=True,
         blank=True,
@@ -121,21 +178,44 @@ class Report(models.Model):
         blank=True,
         help_text='When report generation completed'
     )
+    expires_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='When the report file is deleted (see REPORT_RETENTION_DAYS)'
+    )
     
     class Meta:
         db_table = 'reports'
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['generated_by', '-created_at']),
-            models.Index(fields=['status']),
+            models.Index(fields=['student', '-created_at']),
+            models.Index(fields=['status', 'created_at']),
             models.Index(fields=['report_type']),
+            # Admin report list: top-level reports, newest first
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(parent__isnull=True),
+                name='reports_top_level_idx'
+            ),
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(status='COMPLETED'),
+                name='reports_expiring_idx'
+            ),
         ]
     
     def __str__(self):
         if self.report_type == 'STUDENT' and self.student:
-            return f"Student Report: {self.student.full_name} ({self.start_date} to {self.end_date})"
+            return f"Student Report: {self.student.get_full_name()} ({self.start_date} to {self.end_date})"
         elif self.report_type == 'CLASS' and self.class_instance:
             return f"Class Report: {self.class_instance.name} ({self.start_date} to {self.end_date})"
+        elif self.report_type == 'MATRIX' and self.class_instance:
+            return f"Attendance Register: {self.class_instance.name} ({self.start_date} to {self.end_date})"
+        elif self.report_type == 'INSTITUTION':
+            return f"Attendance Extract ({self.start_date} to {self.end_date})"
+        elif self.report_type == 'BUNDLE':
+            return f"Report Bundle ({self.start_date} to {self.end_date})"
         return f"Report {self.id}"
     
     def clean(self):
@@ -145,8 +225,136 @@ class Report(models.Model):
         if self.report_type == 'STUDENT' and not self.student:
             raise ValidationError("Student is required for student reports")
         
-        if self.report_type == 'CLASS' and not self.class_instance:
+        if self.report_type in ('CLASS', 'MATRIX') and not self.class_instance:
             raise ValidationError("Class is required for class reports")
         
         if self.start_date and self.end_date and self.start_date > self.end_date:
             raise ValidationError("Start date must be before or equal to end date")
+
+
+class ReportSubscription(models.Model):
+    """
+    A report generated on a schedule and emailed to its recipients
+    
+    Subscriptions are generated overnight (see REPORT_SUBSCRIPTION_HOUR)
+    over a rolling window of the window_days days before the run, so the
+    reports people need on Monday morning are ready before they arrive.
+    """
+    
+    REPORT_TYPES = [
+        ('STUDENT', 'Student Report'),
+        ('CLASS', 'Class Report'),
+        ('MATRIX', 'Attendance Register'),
+        ('INSTITUTION', 'Institution Attendance Extract'),
+    ]
+    
+    FREQUENCIES = [
+        ('DAILY', 'Daily'),
+        ('WEEKLY', 'Weekly'),
+    ]
+    
+    WEEKDAYS = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False
+    )
+    
+    report_type = models.CharField(
+        max_length=20,
+        choices=REPORT_TYPES,
+        help_text='Type of report to generate'
+    )
+    
+    format = models.CharField(
+        max_length=10,
+        choices=Report.FORMATS,
+        default='CSV',
+        help_text='Export format'
+    )
+    
+    class_instance = models.ForeignKey(
+        'classes.Class',
+        on_delete=models.CASCADE,
+        related_name='report_subscriptions',
+        null=True,
+        blank=True,
+        help_text='Class for class and matrix reports'
+    )
+    
+    student = models.ForeignKey(
+        'classes.Student',
+        on_delete=models.CASCADE,
+        related_name='report_subscriptions',
+        null=True,
+        blank=True,
+        help_text='Student for student reports'
+    )
+    
+    window_days = models.PositiveSmallIntegerField(
+        default=7,
+        help_text='Each report covers this many days, ending the day before it is generated'
+    )
+    
+    frequency = models.CharField(
+        max_length=10,
+        choices=FREQUENCIES,
+        default='WEEKLY'
+    )
+    
+    weekday = models.PositiveSmallIntegerField(
+        choices=WEEKDAYS,
+        default=0,
+        help_text='Morning the weekly report should be ready by'
+    )
+    
+    recipients = models.JSONField(
+        default=list,
+        help_text='Email addresses the download link is sent to'
+    )
+    
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='report_subscriptions',
+        help_text='Owner; reports are generated on their behalf'
+    )
+    
+    is_active = models.BooleanField(default=True)
+    
+    next_run_at = models.DateTimeField(
+        help_text='When the next report is generated'
+    )
+    
+    last_run_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'report_subscriptions'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_by', '-created_at']),
+            models.Index(
+                fields=['next_run_at'],
+                condition=models.Q(is_active=True),
+                name='report_subscriptions_due_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        target = self.class_instance or self.student
+        label = self.get_report_type_display()
+        return f"{self.get_frequency_display()} {label}: {target}" if target else f"{self.get_frequency_display()} {label}"
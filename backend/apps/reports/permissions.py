@@ -3,7 +3,27 @@ Report Permissions
 Controls who can generate and download reports
 """
 from rest_framework import permissions
-from apps.classes.models import Teacher, Student, ClassStudent
+from apps.classes.models import Class, ClassStudent
+from apps.reports.services import ReportSubscriptionService
+
+
+def teaches_student(user, student_id):
+    """Check whether the user teaches a class the student is enrolled in"""
+    teacher_id = user.authz.teacher_id
+    if not teacher_id:
+        return False
+    return ClassStudent.objects.filter(
+        student_id=student_id,
+        class_instance__teacher_id=teacher_id
+    ).exists()
+
+
+def teaches_class(user, class_id):
+    """Check whether the user is the class's teacher"""
+    teacher_id = user.authz.teacher_id
+    if not teacher_id:
+        return False
+    return Class.objects.filter(id=class_id, teacher_id=teacher_id).exists()
 
 
 class CanGenerateReport(permissions.BasePermission):
@@ -32,29 +52,17 @@ class CanGenerateReport(permissions.BasePermission):
         if obj.report_type == 'STUDENT':
             # Teachers can access reports for students in their classes
             if user.has_role('TEACHER'):
-                teacher = Teacher.objects.get(user=user)
-                # Check if student is in any of teacher's classes
-                student_classes = ClassStudent.objects.filter(
-                    student_id=obj.student_id
-                ).values_list('class_instance_id', flat=True)
-                
-                teacher_classes = teacher.classes.values_list('id', flat=True)
-                
-                return bool(set(student_classes) & set(teacher_classes))
+                return teaches_student(user, obj.student_id)
             
             # Students can access their own reports (linked by email)
             if user.has_role('STUDENT'):
-                try:
-                    student = Student.objects.get(email=user.email)
-                    return obj.student_id == student.id
-                except Student.DoesNotExist:
-                    return False
+                student_id = user.authz.student_id
+                return bool(student_id) and obj.student_id == student_id
         
-        elif obj.report_type == 'CLASS':
+        elif obj.report_type in ('CLASS', 'MATRIX'):
             # Teachers can access reports for their own classes
             if user.has_role('TEACHER'):
-                teacher = Teacher.objects.get(user=user)
-                return obj.class_instance.teacher_id == teacher.id
+                return teaches_class(user, obj.class_instance_id)
             
             # Students cannot access class reports
             return False
@@ -81,37 +89,34 @@ class CanDownloadReport(permissions.BasePermission):
         if obj.report_type == 'STUDENT':
             # Teachers can download reports for students in their classes
             if user.has_role('TEACHER'):
-                try:
-                    teacher = Teacher.objects.get(user=user)
-                    # Check if student is in any of teacher's classes
-                    student_classes = ClassStudent.objects.filter(
-                        student_id=obj.student_id
-                    ).values_list('class_instance_id', flat=True)
-                    
-                    teacher_classes = teacher.classes.values_list('id', flat=True)
-                    
-                    return bool(set(student_classes) & set(teacher_classes))
-                except Teacher.DoesNotExist:
-                    return False
+                return teaches_student(user, obj.student_id)
             
             # Students can download their own reports (linked by email)
             if user.has_role('STUDENT'):
-                try:
-                    student = Student.objects.get(email=user.email)
-                    return obj.student_id == student.id
-                except Student.DoesNotExist:
-                    return False
+                student_id = user.authz.student_id
+                return bool(student_id) and obj.student_id == student_id
         
-        elif obj.report_type == 'CLASS':
+        elif obj.report_type in ('CLASS', 'MATRIX'):
             # Teachers can download reports for their own classes
             if user.has_role('TEACHER'):
-                try:
-                    teacher = Teacher.objects.get(user=user)
-                    return obj.class_instance.teacher_id == teacher.id
-                except Teacher.DoesNotExist:
-                    return False
+                return teaches_class(user, obj.class_instance_id)
             
             # Students cannot download class reports
             return False
         
         return False
+
+
+class HasDownloadLink(permissions.BasePermission):
+    """
+    Permission to download a report through an emailed link
+    
+    Subscription emails carry a signed ?token= for one report, valid for
+    its retention period; no login is needed
+    """
+    
+    def has_permission(self, request, view):
+        return bool(request.query_params.get('token'))
+    
+    def has_object_permission(self, request, view, obj):
+        return ReportSubscriptionService.link_is_valid(request.query_params['token'], obj)
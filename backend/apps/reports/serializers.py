@@ -2,15 +2,49 @@
 Report Serializers
 Handles validation and serialization for report requests and responses
 """
+from django.utils import timezone
 from rest_framework import serializers
-from apps.reports.models import Report
+from apps.classes.models import Class, Student
+from apps.reports.models import Report, ReportSubscription
+from apps.reports.services import ReportSubscriptionService
+
+
+def validate_report_options(report_type, report_format, class_id=None, student_id=None):
+    """Check that a report's target and format fit its (lowercase) type"""
+    # Validate student report
+    if report_type == 'student':
+        if not student_id:
+            raise serializers.ValidationError({
+                'student_id': 'Student ID is required for student reports'
+            })
+    
+    # Validate class report
+    if report_type in ('class', 'matrix'):
+        if not class_id:
+            raise serializers.ValidationError({
+                'class_id': f'Class ID is required for {report_type} reports'
+            })
+    
+    # Validate format
+    if report_type == 'matrix' and report_format not in ('csv', 'xlsx'):
+        raise serializers.ValidationError({
+            'format': 'Matrix reports are available as CSV or XLSX'
+        })
+    if report_type != 'matrix' and report_format == 'xlsx':
+        raise serializers.ValidationError({
+            'format': 'XLSX is only available for matrix reports'
+        })
+    if report_format == 'pdf':
+        raise serializers.ValidationError({
+            'format': 'PDF format is not yet supported. Please use CSV.'
+        })
 
 
 class ReportRequestSerializer(serializers.Serializer):
     """Serializer for report generation request"""
     
     report_type = serializers.ChoiceField(
-        choices=['student', 'class'],
+        choices=['student', 'class', 'matrix', 'institution'],
         required=True,
         help_text='Type of report to generate'
     )
@@ -18,7 +52,7 @@ class ReportRequestSerializer(serializers.Serializer):
     class_id = serializers.UUIDField(
         required=False,
         allow_null=True,
-        help_text='Required for class reports'
+        help_text='Required for class and matrix reports'
     )
     
     student_id = serializers.UUIDField(
@@ -38,28 +72,19 @@ class ReportRequestSerializer(serializers.Serializer):
     )
     
     format = serializers.ChoiceField(
-        choices=['csv', 'pdf'],
+        choices=['csv', 'parquet', 'xlsx', 'pdf'],
         default='csv',
-        help_text='Export format (csv or pdf)'
+        help_text='Export format (csv, parquet, xlsx or pdf)'
     )
     
     def validate(self, data):
         """Validate report request"""
-        report_type = data.get('report_type')
-        
-        # Validate student report
-        if report_type == 'student':
-            if not data.get('student_id'):
-                raise serializers.ValidationError({
-                    'student_id': 'Student ID is required for student reports'
-                })
-        
-        # Validate class report
-        if report_type == 'class':
-            if not data.get('class_id'):
-                raise serializers.ValidationError({
-                    'class_id': 'Class ID is required for class reports'
-                })
+        validate_report_options(
+            data.get('report_type'),
+            data.get('format', 'csv'),
+            class_id=data.get('class_id'),
+            student_id=data.get('student_id')
+        )
         
         # Validate date range
         if data['start_date'] > data['end_date']:
@@ -67,13 +92,70 @@ class ReportRequestSerializer(serializers.Serializer):
                 'end_date': 'End date must be after or equal to start date'
             })
         
-        # Validate format
-        if data.get('format', 'csv') == 'pdf':
+        return data
+
+
+class ReportBundleRequestSerializer(serializers.Serializer):
+    """Serializer for bundle requests: class reports for every matching class"""
+    
+    academic_year = serializers.CharField(
+        required=False,
+        max_length=20,
+        help_text='e.g. 2024-2025'
+    )
+    
+    semester = serializers.ChoiceField(
+        choices=[code for code, label in Class.SEMESTER_CHOICES],
+        required=False
+    )
+    
+    department = serializers.CharField(
+        required=False,
+        max_length=100,
+        help_text="Department of the class's teacher"
+    )
+    
+    subject_id = serializers.UUIDField(
+        required=False
+    )
+    
+    start_date = serializers.DateField(
+        required=True,
+        help_text='Report start date (inclusive)'
+    )
+    
+    end_date = serializers.DateField(
+        required=True,
+        help_text='Report end date (inclusive)'
+    )
+    
+    format = serializers.ChoiceField(
+        choices=['csv', 'parquet'],
+        default='csv',
+        help_text='Format of the class reports in the bundle'
+    )
+    
+    def validate(self, data):
+        """Validate bundle request"""
+        if not any(data.get(name) for name in ('academic_year', 'semester', 'department', 'subject_id')):
+            raise serializers.ValidationError(
+                'Provide at least one of academic_year, semester, department or subject_id'
+            )
+        
+        if data['start_date'] > data['end_date']:
             raise serializers.ValidationError({
-                'format': 'PDF format is not yet supported. Please use CSV.'
+                'end_date': 'End date must be after or equal to start date'
             })
         
         return data
+    
+    def get_filters(self):
+        """The class filters as stored on the bundle Report"""
+        return {
+            name: str(self.validated_data[name])
+            for name in ('academic_year', 'semester', 'department', 'subject_id')
+            if self.validated_data.get(name)
+        }
 
 
 class ReportResponseSerializer(serializers.ModelSerializer):
@@ -93,12 +175,14 @@ class ReportResponseSerializer(serializers.ModelSerializer):
             'report_type',
             'format',
             'status',
+            'progress',
             'class_id',
             'class_name',
             'student_id',
             'student_name',
             'start_date',
             'end_date',
+            'filters',
             'file_size',
             'generated_by_name',
             'download_url',
@@ -120,8 +204,8 @@ class ReportResponseSerializer(serializers.ModelSerializer):
         return None
     
     def get_download_url(self, obj):
-        """Get download URL for the report"""
-        if obj.status == 'COMPLETED' and obj.file_path:
+        """Get download URL for the report (expired reports regenerate on download)"""
+        if (obj.status == 'COMPLETED' and obj.file_path) or obj.status == 'EXPIRED':
             return f"/api/reports/{obj.id}/download/"
         return None
     
@@ -155,6 +239,7 @@ class ReportListSerializer(serializers.ModelSerializer):
             'report_type',
             'format',
             'status',
+            'progress',
             'class_name',
             'student_name',
             'start_date',
@@ -173,3 +258,94 @@ class ReportListSerializer(serializers.ModelSerializer):
         if obj.student:
             return obj.student.get_full_name()
         return None
+
+
+class ReportSubscriptionSerializer(serializers.ModelSerializer):
+    """Serializer for creating and listing report subscriptions"""
+    
+    report_type = serializers.ChoiceField(
+        choices=['student', 'class', 'matrix', 'institution'],
+        help_text='Type of report to generate'
+    )
+    
+    format = serializers.ChoiceField(
+        choices=['csv', 'parquet', 'xlsx'],
+        default='csv'
+    )
+    
+    class_id = serializers.UUIDField(
+        source='class_instance_id',
+        required=False,
+        allow_null=True,
+        help_text='Required for class and matrix reports'
+    )
+    
+    student_id = serializers.UUIDField(
+        required=False,
+        allow_null=True,
+        help_text='Required for student reports'
+    )
+    
+    window_days = serializers.IntegerField(
+        min_value=1,
+        max_value=366,
+        default=7,
+        help_text='Days covered by each report, ending the day before it is generated'
+    )
+    
+    recipients = serializers.ListField(
+        child=serializers.EmailField(),
+        min_length=1,
+        max_length=50
+    )
+    
+    class Meta:
+        model = ReportSubscription
+        fields = [
+            'id',
+            'report_type',
+            'format',
+            'class_id',
+            'student_id',
+            'window_days',
+            'frequency',
+            'weekday',
+            'recipients',
+            'is_active',
+            'next_run_at',
+            'last_run_at',
+            'created_at'
+        ]
+        read_only_fields = ['id', 'next_run_at', 'last_run_at', 'created_at']
+    
+    def validate(self, data):
+        """Validate the target and store type and format as on Report"""
+        class_id = data.get('class_instance_id')
+        student_id = data.get('student_id')
+        validate_report_options(
+            data['report_type'],
+            data.get('format', 'csv'),
+            class_id=class_id,
+            student_id=student_id
+        )
+        
+        if data['report_type'] == 'student' and not Student.objects.filter(id=student_id).exists():
+            raise serializers.ValidationError({'student_id': 'Student not found'})
+        if data['report_type'] in ('class', 'matrix') and not Class.objects.filter(id=class_id).exists():
+            raise serializers.ValidationError({'class_id': 'Class not found'})
+        
+        # Only the target of the report type is kept
+        data['student_id'] = student_id if data['report_type'] == 'student' else None
+        data['class_instance_id'] = class_id if data['report_type'] in ('class', 'matrix') else None
+        data['report_type'] = data['report_type'].upper()
+        data['format'] = data.get('format', 'csv').upper()
+        return data
+    
+    def create(self, validated_data):
+        """Create the subscription, scheduling its first run"""
+        subscription = ReportSubscription(**validated_data)
+        subscription.next_run_at = ReportSubscriptionService.next_run_at(
+            subscription.frequency, subscription.weekday, timezone.now()
+        )
+        subscription.save()
+        return subscription
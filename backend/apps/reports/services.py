@@ -3,13 +3,52 @@ Report Generation Services
 Handles the logic for generating attendance reports in various formats
 """
 import csv
+import gzip
+import hashlib
+import json
 import os
-from datetime import datetime
+import shutil
+import uuid
+import zipfile
+from datetime import datetime, timedelta
 from django.conf import settings
-from django.db.models import Q, Count, F
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q, Count, F, Max, Sum
+from django.utils import timezone
 from apps.attendance.models import Attendance
 from apps.sessions.models import ClassSession
 from apps.classes.models import ClassStudent, Student, Class
+from apps.notifications.models import EmailNotification
+from apps.reports.models import Report, ReportSubscription
+
+
+# Rows fetched per round trip of the server-side cursor
+REPORT_CHUNK_SIZE = 2000
+
+# Bytes per streamed response chunk or file copy
+CSV_BUFFER_SIZE = 64 * 1024
+
+# CSV reports are stored gzip-compressed; downloads send them as-is
+CSV_GZIP_LEVEL = 6
+
+# Rows per Parquet row group; bounds memory while writing columnar files
+PARQUET_ROW_GROUP_SIZE = 100000
+
+REPORT_FILE_EXTENSIONS = {
+    'CSV': 'csv',
+    'PARQUET': 'parquet',
+    'XLSX': 'xlsx',
+    'ZIP': 'zip',
+}
+
+# Attendance register cell codes
+MATRIX_CODES = {
+    'PRESENT': 'P',
+    'ABSENT': 'A',
+    'LATE': 'L',
+}
 
 
 class ReportGenerationService:
@@ -24,7 +63,50 @@ class ReportGenerationService:
         os.makedirs(cls.REPORTS_DIR, exist_ok=True)
     
     @classmethod
-    def generate_student_report(cls, student_id, start_date, end_date, format='CSV'):
+    def generate(cls, report, progress_callback=None):
+        """
+        Generate the file for a Report row
+        
+        Args:
+            report: Report instance
+            progress_callback: Optional callable(done, total) invoked as rows are written
+        
+        Returns:
+            dict: Same as generate_student_report / generate_class_report
+        """
+        if report.report_type == 'INSTITUTION':
+            return cls.generate_institution_report(
+                start_date=report.start_date,
+                end_date=report.end_date,
+                format=report.format,
+                progress_callback=progress_callback
+            )
+        if report.report_type == 'MATRIX':
+            return cls.generate_matrix_report(
+                class_id=report.class_instance_id,
+                start_date=report.start_date,
+                end_date=report.end_date,
+                format=report.format,
+                progress_callback=progress_callback
+            )
+        if report.report_type == 'STUDENT':
+            return cls.generate_student_report(
+                student_id=report.student_id,
+                start_date=report.start_date,
+                end_date=report.end_date,
+                format=report.format,
+                progress_callback=progress_callback
+            )
+        return cls.generate_class_report(
+            class_id=report.class_instance_id,
+            start_date=report.start_date,
+            end_date=report.end_date,
+            format=report.format,
+            progress_callback=progress_callback
+        )
+    
+    @classmethod
+    def generate_student_report(cls, student_id, start_date, end_date, format='CSV', progress_callback=None):
         """
         Generate attendance report for a specific student
         
@@ -32,7 +114,8 @@ class ReportGenerationService:
             student_id: UUID of the student
             start_date: Start date for the report
             end_date: End date for the report
-            format: Report format (CSV or PDF)
+            format: Report format (CSV or PARQUET)
+            progress_callback: Optional callable(done, total) invoked as rows are written
         
         Returns:
             dict: {
@@ -49,26 +132,24 @@ class ReportGenerationService:
         except Student.DoesNotExist:
             raise ValueError(f"Student with ID {student_id} not found")
         
-        # Query attendance records within date range
-        attendance_records = Attendance.objects.filter(
-            student_id=student_id,
-            session__start_time__date__gte=start_date,
-            session__start_time__date__lte=end_date
-        ).select_related(
-            'session',
-            'session__class_ref',
-            'session__subject',
-            'session__teacher',
-            'marked_by'
-        ).order_by('session__start_time')
-        
         if format == 'CSV':
-            return cls._generate_student_csv(student, attendance_records, start_date, end_date)
+            return cls._generate_student_csv(student, start_date, end_date, progress_callback)
+        elif format == 'PARQUET':
+            columns, rows = cls.student_report_columns(student, start_date, end_date)
+            return cls._write_parquet(
+                cls._report_filename(f"student_{student.id}", format),
+                columns,
+                rows,
+                progress_callback,
+                cls._count_for_progress(
+                    cls._student_attendance(student.id, start_date, end_date), progress_callback
+                )
+            )
         else:
             raise NotImplementedError(f"Format {format} not yet supported")
     
     @classmethod
-    def generate_class_report(cls, class_id, start_date, end_date, format='CSV'):
+    def generate_class_report(cls, class_id, start_date, end_date, format='CSV', progress_callback=None):
         """
         Generate attendance report for an entire class
         
@@ -76,7 +157,8 @@ class ReportGenerationService:
             class_id: UUID of the class
             start_date: Start date for the report
             end_date: End date for the report
-            format: Report format (CSV or PDF)
+            format: Report format (CSV or PARQUET)
+            progress_callback: Optional callable(done, total) invoked as rows are written
         
         Returns:
             dict: {
@@ -93,159 +175,1310 @@ class ReportGenerationService:
         except Class.DoesNotExist:
             raise ValueError(f"Class with ID {class_id} not found")
         
-        # Get all enrolled students
-        enrollments = ClassStudent.objects.filter(
-            class_instance_id=class_id
-        ).select_related('student')
+        if format == 'CSV':
+            return cls._generate_class_csv(class_instance, start_date, end_date, progress_callback)
+        elif format == 'PARQUET':
+            columns, rows = cls.class_report_columns(class_instance, start_date, end_date)
+            return cls._write_parquet(
+                cls._report_filename(f"class_{class_instance.id}", format),
+                columns,
+                rows,
+                progress_callback,
+                class_instance.enrolled_count
+            )
+        else:
+            raise NotImplementedError(f"Format {format} not yet supported")
+    
+    @classmethod
+    def generate_matrix_report(cls, class_id, start_date, end_date, format='CSV', progress_callback=None):
+        """
+        Generate the attendance register for a class: one row per enrolled
+        student, one column per session, P/A/L cells
         
-        # Get all sessions in date range
-        sessions = ClassSession.objects.filter(
-            class_ref_id=class_id,
-            start_time__date__gte=start_date,
-            start_time__date__lte=end_date
-        ).order_by('start_time')
+        Args:
+            class_id: UUID of the class
+            start_date: Start date for the report
+            end_date: End date for the report
+            format: Report format (CSV or XLSX)
+            progress_callback: Optional callable(done, total) invoked as rows are written
         
-        # Get all attendance records for this class in date range
-        attendance_records = Attendance.objects.filter(
-            session__class_ref_id=class_id,
-            session__start_time__date__gte=start_date,
-            session__start_time__date__lte=end_date
-        ).select_related('student', 'session')
+        Returns:
+            dict: Same as generate_student_report
+        """
+        cls._ensure_reports_directory()
+        
+        try:
+            class_instance = Class.objects.get(id=class_id)
+        except Class.DoesNotExist:
+            raise ValueError(f"Class with ID {class_id} not found")
         
         if format == 'CSV':
-            return cls._generate_class_csv(
-                class_instance, 
-                enrollments, 
-                sessions, 
-                attendance_records,
+            header_rows, data_rows = cls.matrix_report_csv(class_instance, start_date, end_date)
+            return cls._write_csv(
+                cls._report_filename(f"matrix_{class_instance.id}", format),
+                header_rows,
+                data_rows,
+                progress_callback,
+                class_instance.enrolled_count
+            )
+        elif format == 'XLSX':
+            return cls._write_matrix_xlsx(
+                cls._report_filename(f"matrix_{class_instance.id}", format),
+                class_instance,
                 start_date,
-                end_date
+                end_date,
+                *cls.attendance_matrix(class_instance.id, start_date, end_date)
             )
         else:
             raise NotImplementedError(f"Format {format} not yet supported")
     
     @classmethod
-    def _generate_student_csv(cls, student, attendance_records, start_date, end_date):
-        """Generate CSV report for a student"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"student_{student.id}_{timestamp}.csv"
+    def generate_institution_report(cls, start_date, end_date, format='CSV', progress_callback=None):
+        """
+        Generate a raw extract of every attendance record in the date range
+        
+        One row per record, for loading into BI tools. Parquet is the
+        intended format; CSV is kept for ad-hoc use.
+        
+        Args:
+            start_date: Start date for the report
+            end_date: End date for the report
+            format: Report format (CSV or PARQUET)
+            progress_callback: Optional callable(done, total) invoked as rows are written
+        
+        Returns:
+            dict: Same as generate_student_report
+        """
+        cls._ensure_reports_directory()
+        
+        columns, rows = cls.institution_report_columns(start_date, end_date)
+        total_rows = cls._count_for_progress(
+            cls._institution_attendance(start_date, end_date), progress_callback
+        )
+        filename = cls._report_filename('institution', format)
+        
+        if format == 'CSV':
+            return cls._write_csv(
+                filename, [[name for name, kind in columns]], rows, progress_callback, total_rows
+            )
+        elif format == 'PARQUET':
+            return cls._write_parquet(filename, columns, rows, progress_callback, total_rows)
+        else:
+            raise NotImplementedError(f"Format {format} not yet supported")
+    
+    @staticmethod
+    def class_student_stats(class_id, start_date, end_date, limit=None):
+        """
+        Per-student attendance counts for a class in one grouped query
+        
+        Enrolled students are the driving table and attendance is LEFT
+        JOINed, so students with no records in the period come back with
+        zero counts. With a limit, only the first `limit` students (in
+        report order) are aggregated.
+        
+        Returns:
+            QuerySet of dicts: student_id, first_name, last_name, email,
+            total, present, absent, late
+        """
+        in_period = Q(
+            attendance_records__session__class_ref_id=class_id,
+            attendance_records__session__start_time__date__gte=start_date,
+            attendance_records__session__start_time__date__lte=end_date
+        )
+        
+        students = Student.objects.filter(enrolled_classes__class_instance_id=class_id)
+        if limit is not None:
+            first_students = students.order_by('last_name', 'first_name', 'student_id').values('id')[:limit]
+            students = students.filter(id__in=first_students)
+        
+        return students.values(
+            'id', 'student_id', 'first_name', 'last_name', 'email'
+        ).annotate(
+            total=Count('attendance_records', filter=in_period),
+            present=Count('attendance_records', filter=in_period & Q(attendance_records__status='PRESENT')),
+            absent=Count('attendance_records', filter=in_period & Q(attendance_records__status='ABSENT')),
+            late=Count('attendance_records', filter=in_period & Q(attendance_records__status='LATE')),
+        ).order_by('last_name', 'first_name', 'student_id')
+    
+    @classmethod
+    def student_report_csv(cls, student, start_date, end_date):
+        """
+        CSV content of a student report
+        
+        Returns:
+            tuple: (header_rows, data_rows) where data_rows is a lazy
+            iterator over a server-side cursor. Nothing is read until it
+            is consumed, and at most REPORT_CHUNK_SIZE records are held
+            in memory at a time.
+        """
+        header_rows = [[
+            'Student Name',
+            'Student Email',
+            'Session Date',
+            'Session Time',
+            'Class',
+            'Subject',
+            'Status',
+            'Marked By',
+            'Marked At'
+        ]]
+        
+        records = cls._student_attendance(student.id, start_date, end_date).values_list(
+            'session__start_time',
+            'session__class_ref__name',
+            'session__subject__name',
+            'status',
+            'marked_by__first_name',
+            'marked_by__last_name',
+            'marked_at'
+        )
+        
+        def data_rows():
+            full_name = student.get_full_name()
+            for (start_time, class_name, subject_name, status,
+                    marked_by_first, marked_by_last, marked_at) in records.iterator(chunk_size=REPORT_CHUNK_SIZE):
+                marked_by = f"{marked_by_first or ''} {marked_by_last or ''}".strip()
+                yield [
+                    full_name,
+                    student.email,
+                    start_time.date() if start_time else '',
+                    start_time.strftime('%H:%M') if start_time else '',
+                    class_name or '',
+                    subject_name or '',
+                    status,
+                    marked_by,
+                    marked_at.strftime('%Y-%m-%d %H:%M') if marked_at else ''
+                ]
+        
+        return header_rows, data_rows()
+    
+    @classmethod
+    def class_report_csv(cls, class_instance, start_date, end_date):
+        """
+        CSV content of a class report
+        
+        Returns:
+            tuple: (header_rows, data_rows), as for student_report_csv()
+        """
+        total_sessions = ClassSession.objects.filter(
+            class_ref_id=class_instance.id,
+            start_time__date__gte=start_date,
+            start_time__date__lte=end_date
+        ).count()
+        
+        header_rows = [
+            [f"Class Attendance Report: {class_instance.name}"],
+            [f"Period: {start_date} to {end_date}"],
+            [f"Total Sessions in Period: {total_sessions}"],
+            [],  # Empty row
+            [
+                'Student ID',
+                'Student Name',
+                'Email',
+                'Sessions Marked',
+                'Present',
+                'Absent',
+                'Late',
+                'Attendance Rate (%)'
+            ]
+        ]
+        
+        stats = cls.class_student_stats(class_instance.id, start_date, end_date)
+        
+        def data_rows():
+            for row in stats.iterator(chunk_size=REPORT_CHUNK_SIZE):
+                total = row['total']
+                attendance_rate = round((row['present'] / total * 100), 2) if total > 0 else 0.0
+                yield [
+                    row['student_id'],
+                    f"{row['first_name']} {row['last_name']}",
+                    row['email'],
+                    total,
+                    row['present'],
+                    row['absent'],
+                    row['late'],
+                    attendance_rate
+                ]
+        
+        return header_rows, data_rows()
+    
+    @classmethod
+    def student_report_columns(cls, student, start_date, end_date, limit=None):
+        """
+        Columnar content of a student report
+        
+        Args:
+            limit: Optional number of leading rows to read
+        
+        Returns:
+            tuple: (columns, rows) where columns is a list of (name, kind)
+            pairs as understood by _write_parquet() and rows is a lazy
+            iterator of tuples read from a server-side cursor
+        """
+        columns = [
+            ('student_id', 'category'),
+            ('student_name', 'category'),
+            ('session_start', 'timestamp'),
+            ('class', 'category'),
+            ('subject', 'category'),
+            ('status', 'category'),
+            ('marked_by', 'category'),
+            ('marked_at', 'timestamp'),
+        ]
+        records = cls._student_attendance(student.id, start_date, end_date).values_list(
+            'session__start_time',
+            'session__class_ref__name',
+            'session__subject__name',
+            'status',
+            'marked_by__email',
+            'marked_at'
+        )[:limit]
+        
+        def rows():
+            full_name = student.get_full_name()
+            for record in records.iterator(chunk_size=REPORT_CHUNK_SIZE):
+                yield (student.student_id, full_name) + record
+        
+        return columns, rows()
+    
+    @classmethod
+    def class_report_columns(cls, class_instance, start_date, end_date, limit=None):
+        """Columnar content of a class report, as for student_report_columns()"""
+        columns = [
+            ('student_id', 'string'),
+            ('student_name', 'string'),
+            ('email', 'string'),
+            ('sessions_marked', 'int'),
+            ('present', 'int'),
+            ('absent', 'int'),
+            ('late', 'int'),
+            ('attendance_rate', 'float'),
+        ]
+        stats = cls.class_student_stats(class_instance.id, start_date, end_date, limit)
+        
+        def rows():
+            for row in stats.iterator(chunk_size=REPORT_CHUNK_SIZE):
+                total = row['total']
+                yield (
+                    row['student_id'],
+                    f"{row['first_name']} {row['last_name']}",
+                    row['email'],
+                    total,
+                    row['present'],
+                    row['absent'],
+                    row['late'],
+                    round((row['present'] / total * 100), 2) if total > 0 else 0.0
+                )
+        
+        return columns, rows()
+    
+    @classmethod
+    def institution_report_columns(cls, start_date, end_date, limit=None):
+        """Columnar content of the institution extract, as for student_report_columns()"""
+        columns = [
+            ('attendance_id', 'string'),
+            ('session_id', 'string'),
+            ('session_start', 'timestamp'),
+            ('class', 'category'),
+            ('subject_code', 'category'),
+            ('teacher_employee_id', 'category'),
+            ('student_id', 'string'),
+            ('status', 'category'),
+            ('marked_by', 'category'),
+            ('marked_at', 'timestamp'),
+        ]
+        records = cls._institution_attendance(start_date, end_date).values_list(
+            'id',
+            'session_id',
+            'session__start_time',
+            'session__class_ref__name',
+            'session__subject__code',
+            'session__teacher__employee_id',
+            'student__student_id',
+            'status',
+            'marked_by__email',
+            'marked_at'
+        )[:limit]
+        
+        def rows():
+            for record in records.iterator(chunk_size=REPORT_CHUNK_SIZE):
+                yield (str(record[0]), str(record[1])) + record[2:]
+        
+        return columns, rows()
+    
+    @staticmethod
+    def attendance_matrix(class_id, start_date, end_date, limit=None):
+        """
+        Pivot a class's attendance into a students × sessions grid
+        
+        Reads sessions, enrolled students and every (student, session,
+        status) triple in the range, one query each, and fills a
+        preallocated grid by index lookups. With a limit, only the first
+        `limit` students and their records are read.
+        
+        Returns:
+            tuple: (sessions, students, grid) where sessions is a list of
+            (id, start_time), students a list of (id, student_id, name)
+            and grid[i][j] the P/A/L code of students[i] in sessions[j],
+            or '' if unmarked
+        """
+        sessions = list(
+            ClassSession.objects.filter(
+                class_ref_id=class_id,
+                start_time__date__gte=start_date,
+                start_time__date__lte=end_date
+            ).order_by('start_time', 'id').values_list('id', 'start_time')
+        )
+        students = [
+            (pk, student_id, f"{first_name} {last_name}")
+            for pk, student_id, first_name, last_name in Student.objects.filter(
+                enrolled_classes__class_instance_id=class_id
+            ).order_by('last_name', 'first_name', 'student_id').values_list(
+                'id', 'student_id', 'first_name', 'last_name'
+            )[:limit]
+        ]
+        
+        session_index = {session_id: j for j, (session_id, start_time) in enumerate(sessions)}
+        student_index = {pk: i for i, (pk, student_id, name) in enumerate(students)}
+        grid = [[''] * len(sessions) for _ in students]
+        
+        records = Attendance.objects.filter(
+            session__class_ref_id=class_id,
+            session__start_time__date__gte=start_date,
+            session__start_time__date__lte=end_date
+        )
+        if limit is not None:
+            records = records.filter(student_id__in=list(student_index))
+        records = records.values_list('student_id', 'session_id', 'status')
+        
+        for student_pk, session_id, status in records.iterator(chunk_size=REPORT_CHUNK_SIZE):
+            i = student_index.get(student_pk)
+            # Records of students who have since left the class are not shown
+            if i is not None:
+                grid[i][session_index[session_id]] = MATRIX_CODES[status]
+        
+        return sessions, students, grid
+    
+    @staticmethod
+    def _matrix_summary(cells):
+        """Present, absent, late counts and attendance rate for one register row"""
+        present, absent, late = cells.count('P'), cells.count('A'), cells.count('L')
+        total = present + absent + late
+        attendance_rate = round((present / total * 100), 2) if total > 0 else 0.0
+        return [present, absent, late, attendance_rate]
+    
+    @classmethod
+    def matrix_report_csv(cls, class_instance, start_date, end_date):
+        """
+        CSV content of an attendance register
+        
+        Returns:
+            tuple: (header_rows, data_rows), as for student_report_csv()
+        """
+        sessions, students, grid = cls.attendance_matrix(class_instance.id, start_date, end_date)
+        
+        header_rows = [
+            [f"Attendance Register: {class_instance.name}"],
+            [f"Period: {start_date} to {end_date}"],
+            [],  # Empty row
+            ['Student ID', 'Student Name']
+            + [start_time.strftime('%Y-%m-%d %H:%M') for session_id, start_time in sessions]
+            + ['Present', 'Absent', 'Late', 'Attendance Rate (%)']
+        ]
+        
+        def data_rows():
+            for (pk, student_id, name), cells in zip(students, grid):
+                yield [student_id, name] + cells + cls._matrix_summary(cells)
+        
+        return header_rows, data_rows()
+    
+    @classmethod
+    def _write_matrix_xlsx(cls, filename, class_instance, start_date, end_date, sessions, students, grid):
+        """
+        Write an attendance register to REPORTS_DIR as XLSX
+        
+        Uses XlsxWriter's constant_memory mode, which flushes each row as
+        it is written. Names and session dates stay visible when scrolling.
+        
+        Returns:
+            dict: {'file_path', 'file_size', 'records_count'}
+        """
+        try:
+            import xlsxwriter
+        except ImportError:
+            raise ValueError("XLSX export requires the XlsxWriter package")
+        
         file_path = os.path.join(cls.REPORTS_DIR, filename)
+        workbook = xlsxwriter.Workbook(file_path, {'constant_memory': True})
+        sheet = workbook.add_worksheet('Register')
+        bold = workbook.add_format({'bold': True})
+        header = workbook.add_format({'bold': True, 'rotation': 90, 'align': 'center'})
+        centered = workbook.add_format({'align': 'center'})
+        code_colors = {'P': '#C6EFCE', 'A': '#FFC7CE', 'L': '#FFEB9C'}
+        
+        first_cell = 2
+        summary_col = first_cell + len(sessions)
+        sheet.set_column(0, 0, 12)
+        sheet.set_column(1, 1, 28)
+        if sessions:
+            sheet.set_column(first_cell, summary_col - 1, 4, centered)
+        sheet.freeze_panes(3, first_cell)
+        
+        sheet.write_row(0, 0, [f"Attendance Register: {class_instance.name}"], bold)
+        sheet.write_row(1, 0, [f"Period: {start_date} to {end_date}"])
+        sheet.write_row(2, 0, ['Student ID', 'Student Name'], bold)
+        sheet.write_row(
+            2, first_cell,
+            [start_time.strftime('%Y-%m-%d %H:%M') for session_id, start_time in sessions],
+            header
+        )
+        sheet.write_row(2, summary_col, ['Present', 'Absent', 'Late', 'Attendance Rate (%)'], bold)
+        
+        row = 3
+        for (pk, student_id, name), cells in zip(students, grid):
+            sheet.write_row(row, 0, [student_id, name])
+            sheet.write_row(row, first_cell, cells)
+            sheet.write_row(row, summary_col, cls._matrix_summary(cells))
+            row += 1
+        
+        # Colour the cells by code with one rule per code rather than a
+        # format per cell
+        if sessions and students:
+            for code, color in code_colors.items():
+                sheet.conditional_format(3, first_cell, row - 1, summary_col - 1, {
+                    'type': 'cell',
+                    'criteria': '==',
+                    'value': f'"{code}"',
+                    'format': workbook.add_format({'bg_color': color}),
+                })
+        
+        workbook.close()
+        
+        return {
+            'file_path': file_path,
+            'file_size': os.path.getsize(file_path),
+            'records_count': len(students)
+        }
+    
+    @staticmethod
+    def _institution_attendance(start_date, end_date):
+        """Every attendance record within the date range"""
+        return Attendance.objects.filter(
+            session__start_time__date__gte=start_date,
+            session__start_time__date__lte=end_date
+        ).order_by('session__start_time', 'session_id')
+    
+    @staticmethod
+    def _count_for_progress(queryset, progress_callback):
+        """Row total for progress reporting; skipped when nobody is listening"""
+        return queryset.count() if progress_callback else None
+    
+    @staticmethod
+    def _report_filename(prefix, format):
+        """Timestamped file name for a generated report"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # Reports of one target can finish within the same second, and the
+        # retention cleanup must never see two reports writing one file
+        suffix = uuid.uuid4().hex[:8]
+        return f"{prefix}_{timestamp}_{suffix}.{REPORT_FILE_EXTENSIONS[format]}"
+    
+    @staticmethod
+    def _student_attendance(student_id, start_date, end_date):
+        """Attendance records for a student within the date range"""
+        return Attendance.objects.filter(
+            student_id=student_id,
+            session__start_time__date__gte=start_date,
+            session__start_time__date__lte=end_date
+        ).order_by('session__start_time')
+    
+    @classmethod
+    def _generate_student_csv(cls, student, start_date, end_date, progress_callback=None):
+        """Generate CSV report file for a student"""
+        total_records = cls._count_for_progress(
+            cls._student_attendance(student.id, start_date, end_date), progress_callback
+        )
+        header_rows, data_rows = cls.student_report_csv(student, start_date, end_date)
+        return cls._write_csv(
+            cls._report_filename(f"student_{student.id}", 'CSV'),
+            header_rows,
+            data_rows,
+            progress_callback,
+            total_records
+        )
+    
+    @classmethod
+    def _generate_class_csv(cls, class_instance, start_date, end_date, progress_callback=None):
+        """Generate CSV report file for a class"""
+        header_rows, data_rows = cls.class_report_csv(class_instance, start_date, end_date)
+        # enrolled_count is the number of stats rows, so progress needs no COUNT query
+        return cls._write_csv(
+            cls._report_filename(f"class_{class_instance.id}", 'CSV'),
+            header_rows,
+            data_rows,
+            progress_callback,
+            class_instance.enrolled_count
+        )
+    
+    @classmethod
+    def _write_csv(cls, filename, header_rows, data_rows, progress_callback=None, total_rows=None):
+        """
+        Write report rows to REPORTS_DIR as a gzip-compressed CSV
+        
+        The file is named filename + '.gz'; file_size is the compressed size.
+        
+        Returns:
+            dict: {'file_path', 'file_size', 'records_count'}
+        """
+        file_path = os.path.join(cls.REPORTS_DIR, f"{filename}.gz")
+        records_count = 0
         
-        with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
+        with gzip.open(file_path, 'wt', newline='', encoding='utf-8', compresslevel=CSV_GZIP_LEVEL) as csvfile:
             writer = csv.writer(csvfile)
+            writer.writerows(header_rows)
             
-            # Write header
-            writer.writerow([
-                'Student Name',
-                'Student Email',
-                'Session Date',
-                'Session Time',
-                'Class',
-                'Subject',
-                'Status',
-                'Marked By',
-                'Marked At'
-            ])
-            
-            # Write data rows
-            for record in attendance_records:
-                session_date = record.session.start_time.date() if record.session.start_time else ''
-                session_time = record.session.start_time.strftime('%H:%M') if record.session.start_time else ''
-                marked_at = record.marked_at.strftime('%Y-%m-%d %H:%M') if record.marked_at else ''
+            for records_count, row in enumerate(data_rows, start=1):
+                writer.writerow(row)
                 
-                writer.writerow([
-                    student.get_full_name(),
-                    student.email,
-                    session_date,
-                    session_time,
-                    record.session.class_ref.name if record.session.class_ref else '',
-                    record.session.subject.name if record.session.subject else '',
-                    record.status,
-                    record.marked_by.get_full_name() if record.marked_by else '',
-                    marked_at
-                ])
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
+                if progress_callback:
+                    progress_callback(records_count, total_rows)
         
         return {
             'file_path': file_path,
-            'file_size': file_size,
-            'records_count': attendance_records.count()
+            'file_size': os.path.getsize(file_path),
+            'records_count': records_count
         }
     
     @classmethod
-    def _generate_class_csv(cls, class_instance, enrollments, sessions, attendance_records, start_date, end_date):
-        """Generate CSV report for a class"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"class_{class_instance.id}_{timestamp}.csv"
+    def _write_parquet(cls, filename, columns, rows, progress_callback=None, total_rows=None):
+        """
+        Write report rows to REPORTS_DIR as Parquet
+        
+        Rows are collected into row groups of PARQUET_ROW_GROUP_SIZE and
+        written column by column, so only one row group is held in memory.
+        'category' columns are dictionary-encoded.
+        
+        Returns:
+            dict: {'file_path', 'file_size', 'records_count'}
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export requires the pyarrow package")
+        
+        arrow_types = {
+            'string': pa.string(),
+            'category': pa.dictionary(pa.int32(), pa.string()),
+            'timestamp': pa.timestamp('us', tz='UTC'),
+            'int': pa.int64(),
+            'float': pa.float64(),
+        }
+        schema = pa.schema([(name, arrow_types[kind]) for name, kind in columns])
         file_path = os.path.join(cls.REPORTS_DIR, filename)
+        records_count = 0
         
-        # Calculate statistics per student
-        student_stats = {}
-        total_sessions = sessions.count()
+        def write_row_group(batch):
+            arrays = [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*batch), schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
         
-        for enrollment in enrollments:
-            student = enrollment.student
-            student_attendance = attendance_records.filter(student_id=student.id)
+        with pq.ParquetWriter(file_path, schema, compression='zstd') as writer:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= PARQUET_ROW_GROUP_SIZE:
+                    write_row_group(batch)
+                    records_count += len(batch)
+                    batch = []
+                    
+                    if progress_callback:
+                        progress_callback(records_count, total_rows)
             
-            total = student_attendance.count()
-            present = student_attendance.filter(status='PRESENT').count()
-            absent = student_attendance.filter(status='ABSENT').count()
-            late = student_attendance.filter(status='LATE').count()
-            
-            attendance_rate = round((present / total * 100), 2) if total > 0 else 0.0
+            if batch:
+                write_row_group(batch)
+                records_count += len(batch)
+        
+        return {
+            'file_path': file_path,
+            'file_size': os.path.getsize(file_path),
+            'records_count': records_count
+        }
+
+
+# Salt of the signed download links emailed to subscription recipients
+DOWNLOAD_LINK_SALT = 'reports.download'
+
+IN_FLIGHT_STATUSES = ('PENDING', 'PROCESSING')
+
+
+class ReportPreviewService:
+    """
+    First rows and totals of a report, without writing a file
+    
+    Rows come from the ReportGenerationService row sources with a LIMIT,
+    and totals from aggregate queries over the same filters.
+    """
+    
+    DEFAULT_ROWS = 20
+    MAX_ROWS = 100
+    
+    @staticmethod
+    def _status_totals(records):
+        """Record counts by status and the attendance rate of an Attendance queryset"""
+        totals = records.order_by().aggregate(
+            records=Count('id'),
+            present=Count('id', filter=Q(status='PRESENT')),
+            absent=Count('id', filter=Q(status='ABSENT')),
+            late=Count('id', filter=Q(status='LATE'))
+        )
+        totals['attendance_rate'] = (
+            round(totals['present'] / totals['records'] * 100, 2) if totals['records'] else 0.0
+        )
+        return totals
+    
+    @classmethod
+    def preview(cls, report_type, subject, start_date, end_date, limit=DEFAULT_ROWS):
+        """
+        Preview a report
+        
+        Args:
+            report_type: STUDENT, CLASS, MATRIX or INSTITUTION
+            subject: The Student or Class the report is about (None for INSTITUTION)
+            start_date: Start date for the report
+            end_date: End date for the report
+            limit: Number of leading rows to return
+        
+        Returns:
+            dict: {'columns', 'rows', 'row_count', 'totals'}; row_count is
+            the number of rows the full report would have
+        """
+        service = ReportGenerationService
+        
+        if report_type == 'STUDENT':
+            columns, rows = service.student_report_columns(subject, start_date, end_date, limit)
+            totals = cls._status_totals(service._student_attendance(subject.id, start_date, end_date))
+            row_count = totals['records']
+        elif report_type == 'INSTITUTION':
+            columns, rows = service.institution_report_columns(start_date, end_date, limit)
+            totals = cls._status_totals(service._institution_attendance(start_date, end_date))
+            row_count = totals['records']
+        else:
+            totals = cls._status_totals(Attendance.objects.filter(
+                session__class_ref_id=subject.id,
+                session__start_time__date__gte=start_date,
+                session__start_time__date__lte=end_date
+            ))
+            totals['sessions'] = ClassSession.objects.filter(
+                class_ref_id=subject.id,
+                start_time__date__gte=start_date,
+                start_time__date__lte=end_date
+            ).count()
+            totals['enrolled'] = row_count = subject.enrolled_count
             
-            student_stats[student.id] = {
-                'name': student.get_full_name(),
-                'email': student.email,
-                'student_id': student.student_id,
-                'total_sessions': total,
-                'present': present,
-                'absent': absent,
-                'late': late,
-                'attendance_rate': attendance_rate
-            }
+            if report_type == 'MATRIX':
+                sessions, students, grid = service.attendance_matrix(subject.id, start_date, end_date, limit)
+                columns = (
+                    [('student_id', 'string'), ('student_name', 'string')]
+                    + [(start_time.strftime('%Y-%m-%d %H:%M'), 'string') for session_id, start_time in sessions]
+                )
+                rows = (
+                    [student_id, name] + cells
+                    for (pk, student_id, name), cells in zip(students, grid)
+                )
+            else:
+                columns, rows = service.class_report_columns(subject, start_date, end_date, limit)
         
-        with open(file_path, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
+        return {
+            'columns': [name for name, kind in columns],
+            'rows': [list(row) for row in rows],
+            'row_count': row_count,
+            'totals': totals,
+        }
+
+
+class ReportCache:
+    """
+    Reuse of report output between identical requests
+    
+    A report's cache_key hashes its parameters together with a data
+    version built from the attendance, sessions and enrollments the report
+    reads. Any change to that data produces a new key, so stale output is
+    never matched and there is nothing to invalidate explicitly.
+    """
+    
+    @staticmethod
+    def data_version(report_type, target_id, start_date, end_date):
+        """Fingerprint of the data a report over this range would read"""
+        if report_type == 'INSTITUTION':
+            parts = Attendance.objects.filter(
+                session__start_time__date__gte=start_date,
+                session__start_time__date__lte=end_date
+            ).aggregate(
+                records=Count('id'),
+                records_updated=Max('updated_at')
+            )
+        elif report_type == 'STUDENT':
+            parts = Attendance.objects.filter(
+                student_id=target_id,
+                session__start_time__date__gte=start_date,
+                session__start_time__date__lte=end_date
+            ).aggregate(
+                records=Count('id'),
+                records_updated=Max('updated_at')
+            )
+        else:
+            # CLASS and MATRIX; sessions without attendance still count
+            parts = ClassSession.objects.filter(
+                class_ref_id=target_id,
+                start_time__date__gte=start_date,
+                start_time__date__lte=end_date
+            ).aggregate(
+                sessions=Count('id', distinct=True),
+                sessions_updated=Max('updated_at'),
+                records=Count('attendance_records'),
+                records_updated=Max('attendance_records__updated_at')
+            )
+            parts.update(ClassStudent.objects.filter(
+                class_instance_id=target_id
+            ).aggregate(
+                enrolled=Count('id'),
+                enrolled_updated=Max('enrolled_at')
+            ))
+        
+        return ';'.join(f"{name}={value}" for name, value in sorted(parts.items()))
+    
+    @classmethod
+    def key_for(cls, report_type, target_id, start_date, end_date, format):
+        """cache_key for a report request against the current data"""
+        version = cls.data_version(report_type, target_id, start_date, end_date)
+        raw = f"{report_type}:{target_id}:{start_date}:{end_date}:{format}:{version}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+    
+    @staticmethod
+    def create_report(**fields):
+        """
+        Create a Report, attaching it to matching output if there is any
+        
+        The new report either copies a completed report's file, follows an
+        in-flight report until its task finishes, or is generated itself.
+        
+        Args:
+            **fields: Report fields, including cache_key
+        
+        Returns:
+            tuple: (report, needs_generation)
+        """
+        cache_key = fields['cache_key']
+        
+        with transaction.atomic():
+            # Lock the leader first. Its task updates the leader row before
+            # its followers, so a follower committed while this lock is held
+            # is always seen by that second update.
+            leader = Report.objects.select_for_update().filter(
+                cache_key=cache_key,
+                source__isnull=True,
+                status__in=IN_FLIGHT_STATUSES
+            ).first()
+            if leader is not None:
+                report = Report.objects.create(
+                    **fields,
+                    source=leader,
+                    status=leader.status,
+                    progress=leader.progress
+                )
+                return report, False
             
-            # Write header with class info
-            writer.writerow([f"Class Attendance Report: {class_instance.name}"])
-            writer.writerow([f"Period: {start_date} to {end_date}"])
-            writer.writerow([f"Total Sessions in Period: {total_sessions}"])
-            writer.writerow([])  # Empty row
+            completed = Report.objects.filter(
+                cache_key=cache_key,
+                status='COMPLETED',
+                file_path__isnull=False
+            ).order_by('-completed_at').first()
+            if completed is not None and os.path.exists(completed.file_path):
+                completed_at = timezone.now()
+                report = Report.objects.create(
+                    **fields,
+                    status='COMPLETED',
+                    progress=100,
+                    file_path=completed.file_path,
+                    file_size=completed.file_size,
+                    completed_at=completed_at,
+                    expires_at=ReportRetentionService.expires_at(fields['report_type'], completed_at)
+                )
+                return report, False
             
-            # Write student data header
-            writer.writerow([
-                'Student ID',
-                'Student Name',
-                'Email',
-                'Sessions Marked',
-                'Present',
-                'Absent',
-                'Late',
-                'Attendance Rate (%)'
-            ])
+            return Report.objects.create(**fields, status='PENDING'), True
+
+
+class ReportRetentionService:
+    """Expiry of stored report files, per-user quotas and pruning of old rows"""
+    
+    CLEANUP_BATCH_SIZE = 500
+    
+    @staticmethod
+    def expires_at(report_type, completed_at):
+        """When a report completed at completed_at should expire"""
+        return completed_at + timedelta(days=settings.REPORT_RETENTION_DAYS[report_type])
+    
+    @staticmethod
+    def expire(report_ids):
+        """
+        Mark completed reports EXPIRED and delete their files
+        
+        A file that another completed report still points to (reports share
+        files through ReportCache) is kept until that report expires too.
+        
+        Returns:
+            int: Number of reports expired
+        """
+        reports = list(
+            Report.objects.filter(id__in=report_ids, status='COMPLETED').values_list('id', 'file_path')
+        )
+        if not reports:
+            return 0
+        
+        ids = [report_id for report_id, file_path in reports]
+        paths = {file_path for report_id, file_path in reports if file_path}
+        still_used = set(
+            Report.objects.filter(file_path__in=paths, status='COMPLETED').exclude(
+                id__in=ids
+            ).values_list('file_path', flat=True)
+        )
+        
+        # Rows first, so a concurrent download sees EXPIRED, not a missing file
+        expired = Report.objects.filter(id__in=ids, status='COMPLETED').update(
+            status='EXPIRED',
+            progress=0,
+            file_path=None,
+            file_size=None
+        )
+        for file_path in paths - still_used:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+        
+        return expired
+    
+    @classmethod
+    def enforce_quota(cls, user_id, keep_id=None):
+        """
+        Expire the user's oldest reports while their stored bytes exceed
+        REPORT_STORAGE_QUOTA_BYTES
+        
+        Args:
+            user_id: Owner of the reports
+            keep_id: Report that must not be expired (usually the one just completed)
+        
+        Returns:
+            int: Number of reports expired
+        """
+        quota = settings.REPORT_STORAGE_QUOTA_BYTES
+        reports = Report.objects.filter(
+            generated_by_id=user_id,
+            status='COMPLETED',
+            file_size__isnull=False
+        ).exclude(id=keep_id)
+        
+        usage = reports.aggregate(total=Sum('file_size'))['total'] or 0
+        if keep_id:
+            usage += Report.objects.filter(id=keep_id).values_list('file_size', flat=True).first() or 0
+        if usage <= quota:
+            return 0
+        
+        to_expire = []
+        for report_id, file_size in reports.order_by('completed_at').values_list('id', 'file_size'):
+            if usage <= quota:
+                break
+            to_expire.append(report_id)
+            usage -= file_size
+        
+        return cls.expire(to_expire)
+    
+    @classmethod
+    def cleanup(cls, batch_size=CLEANUP_BATCH_SIZE):
+        """
+        Expire reports past their expires_at, then delete expired and failed
+        rows older than REPORT_ROW_RETENTION_DAYS, batch_size rows at a time
+        
+        Returns:
+            dict: {'expired_count', 'deleted_count'}
+        """
+        now = timezone.now()
+        expired_count = 0
+        while True:
+            ids = list(
+                Report.objects.filter(status='COMPLETED', expires_at__lte=now).order_by(
+                    'expires_at'
+                ).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            expired_count += cls.expire(ids)
+        
+        # Class reports inside a bundle go with the bundle
+        cutoff = now - timedelta(days=settings.REPORT_ROW_RETENTION_DAYS)
+        deleted_count = 0
+        while True:
+            ids = list(
+                Report.objects.filter(
+                    status__in=('EXPIRED', 'FAILED'),
+                    created_at__lt=cutoff,
+                    parent__isnull=True
+                ).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted, _ = Report.objects.filter(id__in=ids).delete()
+            deleted_count += deleted
+        
+        return {'expired_count': expired_count, 'deleted_count': deleted_count}
+    
+    @classmethod
+    def reset_for_regeneration(cls, report):
+        """
+        Put an expired report back to PENDING under its original ID
+        
+        Also covers completed reports whose file has gone missing. The caller
+        dispatches the generation task.
+        
+        Returns:
+            bool: False if another request already reset it
+        """
+        if report.report_type == 'BUNDLE':
+            # The bundle task creates its class reports afresh
+            children = list(report.children.values_list('id', flat=True))
+            cls.expire(children)
+            Report.objects.filter(id__in=children).delete()
+            cache_key = None
+        else:
+            target_id = {
+                'STUDENT': report.student_id,
+                'CLASS': report.class_instance_id,
+                'MATRIX': report.class_instance_id,
+            }.get(report.report_type)
+            cache_key = ReportCache.key_for(
+                report.report_type, target_id, report.start_date, report.end_date, report.format
+            )
+        
+        return bool(Report.objects.filter(
+            id=report.id,
+            status__in=('EXPIRED', 'COMPLETED')
+        ).update(
+            status='PENDING',
+            progress=0,
+            file_path=None,
+            file_size=None,
+            completed_at=None,
+            expires_at=None,
+            error_message=None,
+            cache_key=cache_key,
+            source=None
+        ))
+
+
+class ReportBundleService:
+    """Service for bundling class reports selected by a filter into one zip"""
+    
+    # Request field -> Class lookup
+    FILTERS = {
+        'academic_year': 'academic_year',
+        'semester': 'semester',
+        'department': 'teacher__department__iexact',
+        'subject_id': 'subject_id',
+    }
+    
+    @classmethod
+    def matching_classes(cls, filters):
+        """Classes selected by a bundle's filters"""
+        lookups = {
+            cls.FILTERS[name]: value
+            for name, value in filters.items()
+            if name in cls.FILTERS and value
+        }
+        return Class.objects.filter(**lookups).order_by('name', 'id')
+    
+    @classmethod
+    def create_class_reports(cls, bundle):
+        """
+        Create the bundle's class reports
+        
+        Each goes through ReportCache, so classes whose report is already
+        completed or in flight are not generated again.
+        
+        Returns:
+            list: IDs of the class reports that still need generating
+        
+        Raises:
+            ValueError: If no class matches the filters
+        """
+        class_ids = list(cls.matching_classes(bundle.filters).values_list('id', flat=True))
+        if not class_ids:
+            raise ValueError("No classes match the bundle filters")
+        
+        to_generate = []
+        for class_id in class_ids:
+            report, needs_generation = ReportCache.create_report(
+                report_type='CLASS',
+                format=bundle.format,
+                class_instance_id=class_id,
+                start_date=bundle.start_date,
+                end_date=bundle.end_date,
+                generated_by_id=bundle.generated_by_id,
+                parent=bundle,
+                cache_key=ReportCache.key_for(
+                    'CLASS', class_id, bundle.start_date, bundle.end_date, bundle.format
+                )
+            )
+            if needs_generation:
+                to_generate.append(str(report.id))
+        
+        return to_generate
+    
+    @staticmethod
+    def update_progress(bundle_id):
+        """Set the bundle's progress from its finished class reports"""
+        counts = Report.objects.filter(parent_id=bundle_id).aggregate(
+            total=Count('id'),
+            finished=Count('id', filter=~Q(status__in=IN_FLIGHT_STATUSES))
+        )
+        if counts['total']:
+            # The last percent is left for assembling the zip
+            progress = min(99, counts['finished'] * 100 // counts['total'])
+            Report.objects.filter(id=bundle_id, status='PROCESSING').update(progress=progress)
+    
+    @classmethod
+    def assemble(cls, bundle):
+        """
+        Zip the bundle's completed class reports with a manifest.json
+        
+        Class reports that failed or did not finish are listed in the
+        manifest with their error instead of a file.
+        
+        Returns:
+            dict: {'file_path', 'file_size', 'records_count', 'failed_count'}
+        """
+        ReportGenerationService._ensure_reports_directory()
+        
+        filename = ReportGenerationService._report_filename(f"bundle_{bundle.id}", 'ZIP')
+        file_path = os.path.join(ReportGenerationService.REPORTS_DIR, filename)
+        extension = REPORT_FILE_EXTENSIONS[bundle.format]
+        # Parquet is already compressed
+        compress_type = zipfile.ZIP_STORED if bundle.format == 'PARQUET' else zipfile.ZIP_DEFLATED
+        
+        children = bundle.children.select_related('class_instance').order_by(
+            'class_instance__name', 'class_instance_id'
+        )
+        entries = []
+        
+        with zipfile.ZipFile(file_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for child in children:
+                class_instance = child.class_instance
+                entry = {
+                    'report_id': child.id,
+                    'class_id': child.class_instance_id,
+                    'class_name': class_instance.name if class_instance else None,
+                    'status': child.status,
+                }
+                
+                if child.status == 'COMPLETED' and child.file_path and os.path.exists(child.file_path):
+                    name = class_instance.name.replace(' ', '_').replace('/', '_')
+                    entry['file'] = f"{name}_{str(child.class_instance_id)[:8]}.{extension}"
+                    if child.file_path.endswith('.gz'):
+                        # Stored gzipped; the bundle holds the plain file
+                        with gzip.open(child.file_path, 'rb') as source, \
+                                archive.open(entry['file'], 'w', force_zip64=True) as target:
+                            shutil.copyfileobj(source, target, CSV_BUFFER_SIZE)
+                    else:
+                        archive.write(child.file_path, entry['file'], compress_type=compress_type)
+                    entry['file_size'] = archive.getinfo(entry['file']).file_size
+                else:
+                    entry['error'] = child.error_message or 'Report did not finish'
+                
+                entries.append(entry)
             
-            # Write student data rows
-            for stats in student_stats.values():
-                writer.writerow([
-                    stats['student_id'],
-                    stats['name'],
-                    stats['email'],
-                    stats['total_sessions'],
-                    stats['present'],
-                    stats['absent'],
-                    stats['late'],
-                    stats['attendance_rate']
-                ])
-        
-        # Get file size
-        file_size = os.path.getsize(file_path)
+            manifest = {
+                'bundle_id': bundle.id,
+                'filters': bundle.filters,
+                'start_date': bundle.start_date,
+                'end_date': bundle.end_date,
+                'format': bundle.format,
+                'generated_at': timezone.now(),
+                'reports': entries,
+            }
+            archive.writestr('manifest.json', json.dumps(manifest, indent=2, cls=DjangoJSONEncoder))
         
+        failed_count = sum(1 for entry in entries if 'error' in entry)
         return {
             'file_path': file_path,
-            'file_size': file_size,
-            'records_count': len(student_stats)
+            'file_size': os.path.getsize(file_path),
+            'records_count': len(entries) - failed_count,
+            'failed_count': failed_count
+        }
+
+
+class ReportSubscriptionService:
+    """Scheduling, generation and delivery of subscribed reports"""
+    
+    @staticmethod
+    def next_run_at(frequency, weekday, after):
+        """
+        First generation time after `after`
+        
+        Runs are at REPORT_SUBSCRIPTION_HOUR local time; weekly ones on the
+        morning of their weekday.
+        """
+        local = timezone.localtime(after)
+        run_at = local.replace(hour=settings.REPORT_SUBSCRIPTION_HOUR, minute=0, second=0, microsecond=0)
+        if run_at <= local:
+            run_at += timedelta(days=1)
+        if frequency == 'WEEKLY':
+            run_at += timedelta(days=(weekday - run_at.weekday()) % 7)
+        return run_at
+    
+    @staticmethod
+    def window(subscription, run_at):
+        """(start_date, end_date) of the window_days days before run_at"""
+        end_date = timezone.localtime(run_at).date() - timedelta(days=1)
+        return end_date - timedelta(days=subscription.window_days - 1), end_date
+    
+    @staticmethod
+    def in_flight_count():
+        """Subscription reports currently queued or being generated"""
+        return Report.objects.filter(
+            subscription__isnull=False,
+            status__in=IN_FLIGHT_STATUSES
+        ).count()
+    
+    @classmethod
+    def claim_due(cls, limit, now=None):
+        """
+        Create the reports of up to `limit` due subscriptions
+        
+        Due rows are locked with SKIP LOCKED, so concurrent runs claim
+        different subscriptions. Each claimed subscription is moved to its
+        next run; missed runs are not made up.
+        
+        Returns:
+            list: (report, needs_generation) pairs, as from ReportCache.create_report()
+        """
+        now = now or timezone.now()
+        claimed = []
+        
+        with transaction.atomic():
+            due = ReportSubscription.objects.select_for_update(skip_locked=True).filter(
+                is_active=True,
+                next_run_at__lte=now
+            ).order_by('next_run_at')[:limit]
+            
+            for subscription in due:
+                start_date, end_date = cls.window(subscription, subscription.next_run_at)
+                target_id = (
+                    subscription.student_id if subscription.report_type == 'STUDENT'
+                    else subscription.class_instance_id
+                )
+                claimed.append(ReportCache.create_report(
+                    report_type=subscription.report_type,
+                    format=subscription.format,
+                    class_instance_id=subscription.class_instance_id,
+                    student_id=subscription.student_id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    generated_by_id=subscription.created_by_id,
+                    subscription=subscription,
+                    cache_key=ReportCache.key_for(
+                        subscription.report_type, target_id, start_date, end_date, subscription.format
+                    )
+                ))
+                
+                subscription.last_run_at = now
+                subscription.next_run_at = cls.next_run_at(subscription.frequency, subscription.weekday, now)
+                subscription.save(update_fields=['last_run_at', 'next_run_at'])
+        
+        return claimed
+    
+    @staticmethod
+    def download_link(report):
+        """Absolute download URL that works without logging in"""
+        token = signing.dumps(str(report.id), salt=DOWNLOAD_LINK_SALT)
+        return f"{settings.SITE_URL.rstrip('/')}/api/reports/{report.id}/download/?token={token}"
+    
+    @staticmethod
+    def link_is_valid(token, report):
+        """Whether token was issued for report and is within its retention period"""
+        max_age = timedelta(days=settings.REPORT_RETENTION_DAYS[report.report_type])
+        try:
+            return signing.loads(token, salt=DOWNLOAD_LINK_SALT, max_age=max_age) == str(report.id)
+        except signing.BadSignature:
+            return False
+    
+    @classmethod
+    def notify(cls, report):
+        """
+        Create REPORT_READY notifications for the subscription's recipients
+        
+        Returns:
+            list: IDs of the new EmailNotification rows, to queue for delivery
+        """
+        subscription = report.subscription
+        context = {
+            'report_name': str(report),
+            'start_date': str(report.start_date),
+            'end_date': str(report.end_date),
+            'format': report.format,
+            'download_url': cls.download_link(report),
+            'expires_at': report.expires_at.strftime('%Y-%m-%d') if report.expires_at else None,
         }
+        scheduled_at = timezone.now()
+        
+        notifications = EmailNotification.objects.bulk_create([
+            EmailNotification(
+                notification_type=EmailNotification.NotificationType.REPORT_READY,
+                recipient_email=email,
+                subject=f"Your scheduled report is ready - {context['report_name']}",
+                status=EmailNotification.DeliveryStatus.PENDING,
+                scheduled_at=scheduled_at,
+                context_data=context
+            )
+            for email in subscription.recipients
+        ])
+        return [notification.id for notification in notifications]
+
+
+class _LineBuffer:
+    """csv.writer target that collects lines until they are taken"""
+    
+    def __init__(self):
+        self.lines = []
+        self.size = 0
+    
+    def write(self, value):
+        self.lines.append(value)
+        self.size += len(value)
+    
+    def take(self):
+        chunk = ''.join(self.lines)
+        self.lines = []
+        self.size = 0
+        return chunk
+
+
+def stream_csv_rows(header_rows, data_rows, buffer_size=CSV_BUFFER_SIZE):
+    """
+    Encode report rows as CSV text chunks for StreamingHttpResponse
+    
+    Rows are batched into chunks of roughly buffer_size characters so the
+    response is not flushed one short line at a time.
+    """
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer)
+    writer.writerows(header_rows)
+    
+    for row in data_rows:
+        writer.writerow(row)
+        if buffer.size >= buffer_size:
+            yield buffer.take()
+    
+    if buffer.lines:
+        yield buffer.take()
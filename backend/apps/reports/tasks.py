@@ -0,0 +1,281 @@
+"""
+Celery tasks for asynchronous report generation.
+"""
+
+import logging
+import os
+from celery import chain, chord, shared_task
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.notifications.tasks import queue_emails
+from .models import Report
+from .services import (
+    IN_FLIGHT_STATUSES,
+    ReportBundleService,
+    ReportGenerationService,
+    ReportRetentionService,
+    ReportSubscriptionService,
+)
+
+logger = logging.getLogger(__name__)
+
+# Only write Report.progress when it moved by at least this many points
+PROGRESS_STEP = 5
+
+# How long tasks wait for reports they did not dispatch (bundle class
+# reports, subscription reports following another report)
+WAIT_RETRY_DELAY = 15
+WAIT_MAX_RETRIES = 40
+
+
+def _progress_writer(report_id: str):
+    """Build a progress_callback that persists throttled percentages"""
+    last_written = {'value': 0}
+
+    def write(done, total):
+        percent = min(99, int(done * 100 / total)) if total else 99
+        if percent - last_written['value'] >= PROGRESS_STEP:
+            Report.objects.filter(
+                Q(id=report_id) | Q(source_id=report_id)
+            ).update(progress=percent)
+            last_written['value'] = percent
+
+    return write
+
+
+def _finish(report_id: str, **fields):
+    """
+    Update the report, then every report following it
+
+    Two statements on purpose: ReportCache.create_report() locks the leader
+    row, so the followers update runs after any follower it created commits.
+    """
+    Report.objects.filter(id=report_id).update(**fields)
+    Report.objects.filter(source_id=report_id, status__in=IN_FLIGHT_STATUSES).update(**fields)
+
+
+@shared_task(bind=True, max_retries=0)
+def generate_report_task(self, report_id: str):
+    """
+    Celery task to generate a report file.
+
+    Moves the Report from PENDING to PROCESSING to COMPLETED (or FAILED),
+    updating its progress as rows are written. Reports that were attached
+    to it by ReportCache follow along and share the same file.
+
+    Args:
+        report_id: UUID of the Report
+
+    Returns:
+        Final report status
+    """
+    # Claim the report so a duplicate delivery does not generate it twice
+    claimed = Report.objects.filter(id=report_id, status='PENDING').update(
+        status='PROCESSING',
+        progress=0
+    )
+    if not claimed:
+        logger.info(f"Report {report_id} is not pending, skipping")
+        return None
+    Report.objects.filter(source_id=report_id, status='PENDING').update(status='PROCESSING')
+
+    report = Report.objects.get(id=report_id)
+
+    try:
+        result = ReportGenerationService.generate(
+            report,
+            progress_callback=_progress_writer(report_id)
+        )
+    except Exception as exc:
+        logger.error(f"Error generating report {report_id}: {str(exc)}")
+        _finish(report_id, status='FAILED', error_message=str(exc))
+        if report.parent_id:
+            ReportBundleService.update_progress(report.parent_id)
+        return 'FAILED'
+
+    completed_at = timezone.now()
+    _finish(
+        report_id,
+        file_path=result['file_path'],
+        file_size=result['file_size'],
+        status='COMPLETED',
+        progress=100,
+        completed_at=completed_at,
+        expires_at=ReportRetentionService.expires_at(report.report_type, completed_at)
+    )
+    ReportRetentionService.enforce_quota(report.generated_by_id, keep_id=report_id)
+    if report.parent_id:
+        ReportBundleService.update_progress(report.parent_id)
+    logger.info(f"Report {report_id} generated ({result['records_count']} rows)")
+    return 'COMPLETED'
+
+
+@shared_task(bind=True, max_retries=0)
+def generate_bundle_task(self, report_id: str):
+    """
+    Celery task to fan out a bundle's class reports.
+
+    Creates one class report per matching class and generates them in
+    parallel as a chord whose callback zips the results.
+
+    Args:
+        report_id: UUID of the BUNDLE Report
+
+    Returns:
+        Bundle status after dispatching
+    """
+    claimed = Report.objects.filter(id=report_id, status='PENDING').update(
+        status='PROCESSING',
+        progress=0
+    )
+    if not claimed:
+        logger.info(f"Bundle {report_id} is not pending, skipping")
+        return None
+
+    bundle = Report.objects.get(id=report_id)
+
+    try:
+        to_generate = ReportBundleService.create_class_reports(bundle)
+    except ValueError as exc:
+        _finish(report_id, status='FAILED', error_message=str(exc))
+        return 'FAILED'
+
+    assemble = assemble_bundle_task.si(report_id)
+    if to_generate:
+        chord([generate_report_task.si(child_id) for child_id in to_generate])(assemble)
+    else:
+        assemble.delay()
+
+    logger.info(f"Bundle {report_id} dispatched {len(to_generate)} class reports")
+    return 'PROCESSING'
+
+
+@shared_task(bind=True, max_retries=WAIT_MAX_RETRIES, default_retry_delay=WAIT_RETRY_DELAY)
+def assemble_bundle_task(self, report_id: str):
+    """
+    Celery task to zip a bundle's class reports.
+
+    Runs once every dispatched class report has finished. Class reports
+    that were attached to another in-flight report are waited for by
+    retrying; after WAIT_MAX_RETRIES they are listed as unfinished.
+
+    Args:
+        report_id: UUID of the BUNDLE Report
+
+    Returns:
+        Final bundle status
+    """
+    bundle = Report.objects.get(id=report_id)
+
+    waiting = bundle.children.filter(status__in=IN_FLIGHT_STATUSES).exists()
+    if waiting and self.request.retries < self.max_retries:
+        raise self.retry()
+
+    try:
+        result = ReportBundleService.assemble(bundle)
+    except Exception as exc:
+        logger.error(f"Error assembling bundle {report_id}: {str(exc)}")
+        _finish(report_id, status='FAILED', error_message=str(exc))
+        return 'FAILED'
+
+    total = result['records_count'] + result['failed_count']
+    if not result['records_count']:
+        # Failed reports cannot be downloaded, so do not keep the zip around
+        os.remove(result['file_path'])
+        _finish(report_id, status='FAILED', error_message=f"All {total} class reports failed")
+        return 'FAILED'
+
+    completed_at = timezone.now()
+    _finish(
+        report_id,
+        file_path=result['file_path'],
+        file_size=result['file_size'],
+        status='COMPLETED',
+        progress=100,
+        error_message=(
+            f"{result['failed_count']} of {total} class reports failed; see manifest.json"
+            if result['failed_count'] else None
+        ),
+        completed_at=completed_at,
+        expires_at=ReportRetentionService.expires_at('BUNDLE', completed_at)
+    )
+    ReportRetentionService.enforce_quota(bundle.generated_by_id, keep_id=report_id)
+    logger.info(f"Bundle {report_id} assembled ({result['records_count']} of {total} class reports)")
+    return 'COMPLETED'
+
+
+@shared_task
+def generate_subscribed_reports_task():
+    """
+    Celery task to generate the reports of due subscriptions.
+    
+    Keeps at most REPORT_SUBSCRIPTION_CONCURRENCY subscription reports in
+    flight: it fills the free slots, and every delivered report runs it
+    again to take the next one. Celery beat starts it every 15 minutes.
+    
+    Returns:
+        Number of subscriptions claimed
+    """
+    slots = settings.REPORT_SUBSCRIPTION_CONCURRENCY - ReportSubscriptionService.in_flight_count()
+    if slots <= 0:
+        return 0
+    
+    claimed = ReportSubscriptionService.claim_due(slots)
+    for report, needs_generation in claimed:
+        deliver = deliver_subscription_report_task.si(str(report.id))
+        if needs_generation:
+            chain(generate_report_task.si(str(report.id)), deliver).delay()
+        else:
+            deliver.delay()
+    
+    if claimed:
+        logger.info(f"Claimed {len(claimed)} subscription reports")
+    return len(claimed)
+
+
+@shared_task(bind=True, max_retries=WAIT_MAX_RETRIES, default_retry_delay=WAIT_RETRY_DELAY)
+def deliver_subscription_report_task(self, report_id: str):
+    """
+    Celery task to email a subscription report's download link.
+    
+    Reports that follow another in-flight report are waited for by
+    retrying. Either way the report's slot is then free, so the next due
+    subscription is started.
+    
+    Args:
+        report_id: UUID of the subscription's Report
+    
+    Returns:
+        Number of emails queued
+    """
+    report = Report.objects.select_related('subscription', 'student', 'class_instance').get(id=report_id)
+    
+    if report.status in IN_FLIGHT_STATUSES and self.request.retries < self.max_retries:
+        raise self.retry()
+    
+    notification_ids = []
+    if report.status == 'COMPLETED' and report.subscription:
+        notification_ids = ReportSubscriptionService.notify(report)
+        queue_emails([str(notification_id) for notification_id in notification_ids])
+    else:
+        logger.error(f"Subscription report {report_id} not delivered: {report.status}")
+    
+    generate_subscribed_reports_task.delay()
+    return len(notification_ids)
+
+
+@shared_task
+def cleanup_expired_reports_task():
+    """
+    Celery task to delete expired report files and prune old report rows.
+
+    Scheduled hourly by Celery beat; see REPORT_RETENTION_DAYS and
+    REPORT_ROW_RETENTION_DAYS.
+    """
+    result = ReportRetentionService.cleanup()
+    logger.info(
+        f"Expired {result['expired_count']} reports, deleted {result['deleted_count']} report rows"
+    )
+    return result
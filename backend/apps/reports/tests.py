@@ -0,0 +1,672 @@
+"""
+Tests for Module 5: Reports
+"""
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from apps.attendance.models import Attendance
+from apps.classes.models import Subject, Teacher, Class, Student, ClassStudent
+from apps.classes.services import EnrollmentService
+from apps.sessions.models import ClassSession
+from apps.reports.models import Report, ReportSubscription
+from apps.reports.services import (
+    ReportBundleService,
+    ReportGenerationService,
+    ReportRetentionService,
+    ReportSubscriptionService,
+)
+from apps.reports.tasks import assemble_bundle_task, generate_report_task
+from apps.users.models import Role
+
+User = get_user_model()
+
+
+class ReportFixtureMixin:
+    """Class with enrolled students and attendance, writing reports to a temp dir"""
+
+    def setUp(self):
+        self.reports_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.reports_dir, ignore_errors=True)
+        original_dir = ReportGenerationService.REPORTS_DIR
+        ReportGenerationService.REPORTS_DIR = self.reports_dir
+        self.addCleanup(setattr, ReportGenerationService, 'REPORTS_DIR', original_dir)
+
+        self.subject = Subject.objects.create(name='CS101', code='CS101')
+        user = User.objects.create_user(email='prof@test.com', password='test123')
+        self.teacher = Teacher.objects.create(
+            user=user,
+            employee_id='T001',
+            department='CS',
+            hire_date=date(2020, 1, 1)
+        )
+        self.cs_class = Class.objects.create(
+            subject=self.subject,
+            teacher=self.teacher,
+            name='CS101 A',
+            academic_year='2024-2025',
+            semester='FALL',
+            max_students=500
+        )
+        self.today = timezone.localdate()
+
+    def _enroll(self, count, offset=0):
+        students = Student.objects.bulk_create([
+            Student(
+                student_id=f'S{offset + i:04d}',
+                first_name='Student',
+                last_name=f'{offset + i:04d}',
+                email=f'student{offset + i}@test.com',
+                enrollment_date=date(2024, 9, 1)
+            )
+            for i in range(count)
+        ])
+        ClassStudent.objects.bulk_create([
+            ClassStudent(class_instance=self.cs_class, student=student)
+            for student in students
+        ])
+        # bulk_create skips the signals that maintain the counter
+        EnrollmentService._sync_enrolled_count(self.cs_class.id)
+        return students
+
+    def _hold_sessions(self, students, count):
+        sessions = ClassSession.objects.bulk_create([
+            ClassSession(
+                class_ref=self.cs_class,
+                subject=self.subject,
+                teacher=self.teacher,
+                status='ENDED',
+                end_time=timezone.now()
+            )
+            for _ in range(count)
+        ])
+        statuses = ['PRESENT', 'ABSENT', 'LATE']
+        Attendance.objects.bulk_create([
+            Attendance(session=session, student=student, status=statuses[i % 3])
+            for session in sessions
+            for i, student in enumerate(students)
+        ])
+
+
+class ClassReportTest(ReportFixtureMixin, TestCase):
+    """Test class report generation"""
+
+    def _generate(self):
+        return ReportGenerationService.generate_class_report(
+            self.cs_class.id,
+            self.today - timedelta(days=1),
+            self.today
+        )
+
+    def test_class_report_query_count_is_constant(self):
+        """Class, session count and one grouped aggregate, whatever the class size"""
+        students = self._enroll(5)
+        self._hold_sessions(students, 2)
+        with self.assertNumQueries(3):
+            self._generate()
+
+        more = self._enroll(60, offset=5)
+        self._hold_sessions(students + more, 3)
+        with self.assertNumQueries(3):
+            result = self._generate()
+
+        self.assertEqual(result['records_count'], 65)
+
+    def test_class_report_keeps_students_without_attendance(self):
+        """Enrolled students with no records are reported with zero counts"""
+        attending = self._enroll(3)
+        self._enroll(2, offset=3)
+        self._hold_sessions(attending, 2)
+
+        result = self._generate()
+        with gzip.open(result['file_path'], 'rt', newline='', encoding='utf-8') as f:
+            lines = list(csv.reader(f))
+        rows = lines[5:]
+
+        self.assertEqual(lines[2], ['Total Sessions in Period: 2'])
+        self.assertEqual(len(rows), 5)
+        by_id = {row[0]: row for row in rows}
+        # Student 0 was PRESENT in both sessions, student 1 ABSENT in both
+        self.assertEqual(by_id['S0000'][3:], ['2', '2', '0', '0', '100.0'])
+        self.assertEqual(by_id['S0001'][3:], ['2', '0', '2', '0', '0.0'])
+        self.assertEqual(by_id['S0004'][3:], ['0', '0', '0', '0', '0.0'])
+
+
+class MatrixReportTest(ReportFixtureMixin, TestCase):
+    """Test the students × sessions attendance register"""
+
+    def _generate(self, format='CSV'):
+        return ReportGenerationService.generate_matrix_report(
+            self.cs_class.id,
+            self.today,
+            self.today,
+            format=format
+        )
+
+    def test_matrix_query_count_is_constant(self):
+        """Class, sessions, students and one attendance query, whatever the grid size"""
+        students = self._enroll(40)
+        self._hold_sessions(students, 15)
+        with self.assertNumQueries(4):
+            result = self._generate()
+
+        self.assertEqual(result['records_count'], 40)
+
+    def test_matrix_has_one_cell_per_student_and_session(self):
+        """Cells hold P/A/L codes; students without records get empty cells"""
+        attending = self._enroll(3)
+        self._enroll(1, offset=3)
+        self._hold_sessions(attending, 2)
+
+        result = self._generate()
+        with gzip.open(result['file_path'], 'rt', newline='', encoding='utf-8') as f:
+            lines = list(csv.reader(f))
+        header, rows = lines[3], lines[4:]
+
+        self.assertEqual(len(header), 2 + 2 + 4)
+        self.assertEqual([row[0] for row in rows], ['S0000', 'S0001', 'S0002', 'S0003'])
+        self.assertEqual(rows[0][2:], ['P', 'P', '2', '0', '0', '100.0'])
+        self.assertEqual(rows[1][2:], ['A', 'A', '0', '2', '0', '0.0'])
+        self.assertEqual(rows[2][2:], ['L', 'L', '0', '0', '2', '0.0'])
+        self.assertEqual(rows[3][2:], ['', '', '0', '0', '0', '0.0'])
+
+    def test_matrix_xlsx(self):
+        """XLSX registers are written as a workbook"""
+        students = self._enroll(3)
+        self._hold_sessions(students, 2)
+
+        result = self._generate(format='XLSX')
+
+        self.assertEqual(result['records_count'], 3)
+        self.assertTrue(zipfile.is_zipfile(result['file_path']))
+
+
+class InstitutionReportTest(ReportFixtureMixin, TestCase):
+    """Test the institution-wide raw attendance extract"""
+
+    def test_parquet_extract_has_one_row_per_record(self):
+        """Every record is written, with dictionary-encoded status and class"""
+        import pyarrow.parquet as pq
+
+        students = self._enroll(4)
+        self._hold_sessions(students, 2)
+
+        result = ReportGenerationService.generate_institution_report(
+            self.today, self.today, format='PARQUET'
+        )
+
+        table = pq.read_table(result['file_path'])
+        self.assertEqual(result['records_count'], 8)
+        self.assertEqual(table.num_rows, 8)
+        self.assertTrue(str(table.schema.field('status').type).startswith('dictionary'))
+        self.assertTrue(str(table.schema.field('class').type).startswith('dictionary'))
+        self.assertEqual(set(table.column('class').to_pylist()), {'CS101 A'})
+
+
+class ReportBundleTest(ReportFixtureMixin, TestCase):
+    """Test bundles of class reports"""
+
+    def setUp(self):
+        super().setUp()
+        self.students = self._enroll(3)
+        self._hold_sessions(self.students, 1)
+        self.other_class = Class.objects.create(
+            subject=self.subject,
+            teacher=self.teacher,
+            name='CS101 B',
+            academic_year='2024-2025',
+            semester='FALL'
+        )
+        Class.objects.create(
+            subject=self.subject,
+            teacher=self.teacher,
+            name='CS101 Spring',
+            academic_year='2024-2025',
+            semester='SPRING'
+        )
+        self.bundle = Report.objects.create(
+            report_type='BUNDLE',
+            format='CSV',
+            filters={'academic_year': '2024-2025', 'semester': 'FALL'},
+            start_date=self.today,
+            end_date=self.today,
+            generated_by=self.teacher.user,
+            status='PROCESSING'
+        )
+
+    def test_bundle_zips_class_reports_and_records_failures(self):
+        """Matching classes are zipped with a manifest; a failed class is listed, not fatal"""
+        child_ids = ReportBundleService.create_class_reports(self.bundle)
+        self.assertEqual(len(child_ids), 2)
+
+        failed = Report.objects.get(id__in=child_ids, class_instance=self.other_class)
+        Report.objects.filter(id=failed.id).update(status='FAILED', error_message='boom')
+        for child_id in child_ids:
+            generate_report_task.apply(args=[child_id])
+
+        self.assertEqual(assemble_bundle_task.apply(args=[str(self.bundle.id)]).get(), 'COMPLETED')
+
+        self.bundle.refresh_from_db()
+        self.assertEqual(self.bundle.progress, 100)
+        self.assertIn('1 of 2', self.bundle.error_message)
+        with zipfile.ZipFile(self.bundle.file_path) as archive:
+            manifest = json.loads(archive.read('manifest.json'))
+            files = [entry['file'] for entry in manifest['reports'] if 'file' in entry]
+            self.assertEqual(len(files), 1)
+            self.assertIn(files[0], archive.namelist())
+        errors = [entry['error'] for entry in manifest['reports'] if 'error' in entry]
+        self.assertEqual(errors, ['boom'])
+
+
+class DownloadReportAPITest(ReportFixtureMixin, APITestCase):
+    """Test report downloads"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create_user(email='admin@test.com', password='test123')
+        Role.objects.create(name='ADMIN').users.add(self.admin_user)
+        self.client.force_authenticate(user=self.admin_user)
+
+        self._enroll(3)
+        result = ReportGenerationService.generate_class_report(self.cs_class.id, self.today, self.today)
+        self.report = Report.objects.create(
+            report_type='CLASS',
+            class_instance=self.cs_class,
+            start_date=self.today,
+            end_date=self.today,
+            generated_by=self.admin_user,
+            status='COMPLETED',
+            file_path=result['file_path'],
+            file_size=result['file_size']
+        )
+        self.url = f'/api/reports/{self.report.id}/download/'
+
+    def test_download_sends_stored_gzip(self):
+        """Stored gzip is sent as-is with an ETag, and revalidates to 304"""
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertTrue(body.startswith('Class Attendance Report'))
+
+        cached = self.client.get(
+            self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_download_range(self):
+        """Range requests return the requested bytes with 206"""
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(len(b''.join(response.streaming_content)), 10)
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{self.report.file_size}')
+
+    def test_download_decompresses_for_clients_without_gzip(self):
+        """Clients that do not accept gzip get plain CSV"""
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'Class Attendance Report'))
+
+
+class ReportRetentionTest(ReportFixtureMixin, APITestCase):
+    """Test report expiry, quotas and regeneration"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create_user(email='admin@test.com', password='test123')
+        Role.objects.create(name='ADMIN').users.add(self.admin_user)
+        self.client.force_authenticate(user=self.admin_user)
+        self._enroll(2)
+
+    def _completed_report(self, days_old=0, **fields):
+        result = ReportGenerationService.generate_class_report(self.cs_class.id, self.today, self.today)
+        completed_at = timezone.now() - timedelta(days=days_old)
+        fields.setdefault('file_path', result['file_path'])
+        return Report.objects.create(
+            report_type='CLASS',
+            class_instance=self.cs_class,
+            start_date=self.today,
+            end_date=self.today,
+            generated_by=self.admin_user,
+            status='COMPLETED',
+            file_size=result['file_size'],
+            completed_at=completed_at,
+            expires_at=ReportRetentionService.expires_at('CLASS', completed_at),
+            **fields
+        )
+
+    def test_cleanup_expires_files_but_keeps_shared_ones(self):
+        """Expired files are deleted unless a live report still shares them"""
+        old = self._completed_report(days_old=60)
+        shared = self._completed_report(days_old=60)
+        live_copy = self._completed_report(file_path=shared.file_path)
+
+        result = ReportRetentionService.cleanup()
+
+        self.assertEqual(result['expired_count'], 2)
+        old.refresh_from_db()
+        self.assertEqual(old.status, 'EXPIRED')
+        self.assertIsNone(old.file_path)
+        self.assertTrue(os.path.exists(live_copy.file_path))
+
+    def test_cleanup_deletes_old_failed_rows(self):
+        """Failed rows past the row retention period are deleted"""
+        failed = Report.objects.create(
+            report_type='CLASS',
+            class_instance=self.cs_class,
+            start_date=self.today,
+            end_date=self.today,
+            generated_by=self.admin_user,
+            status='FAILED'
+        )
+        Report.objects.filter(id=failed.id).update(created_at=timezone.now() - timedelta(days=365))
+
+        ReportRetentionService.cleanup()
+
+        self.assertFalse(Report.objects.filter(id=failed.id).exists())
+
+    def test_quota_expires_oldest_reports(self):
+        """Going over the storage quota expires the oldest files first"""
+        oldest = self._completed_report(days_old=3)
+        middle = self._completed_report(days_old=2)
+        newest = self._completed_report(days_old=1)
+
+        with override_settings(REPORT_STORAGE_QUOTA_BYTES=newest.file_size + middle.file_size):
+            expired = ReportRetentionService.enforce_quota(self.admin_user.id, keep_id=newest.id)
+
+        self.assertEqual(expired, 1)
+        statuses = dict(Report.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[oldest.id], 'EXPIRED')
+        self.assertEqual(statuses[middle.id], 'COMPLETED')
+
+    def test_download_regenerates_expired_report(self):
+        """Downloading an expired report queues it again under the same ID"""
+        report = self._completed_report(days_old=60)
+        ReportRetentionService.cleanup()
+
+        response = self.client.get(f'/api/reports/{report.id}/download/')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status_url'], f'/api/reports/{report.id}/status/')
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'PENDING')
+        self.assertIsNotNone(report.cache_key)
+
+
+class ExportReportAPITest(ReportFixtureMixin, APITestCase):
+    """Test streaming report export"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create_user(email='admin@test.com', password='test123')
+        Role.objects.create(name='ADMIN').users.add(self.admin_user)
+        self.client.force_authenticate(user=self.admin_user)
+
+    def test_export_streams_student_report(self):
+        """Student report is streamed as CSV rows"""
+        students = self._enroll(2)
+        self._hold_sessions(students, 3)
+
+        response = self.client.get('/api/reports/export/', {
+            'report_type': 'student',
+            'student_id': str(students[0].id),
+            'start_date': str(self.today),
+            'end_date': str(self.today),
+        })
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'Student Name')
+        self.assertEqual(len(lines), 4)
+        self.assertIn('PRESENT', lines[1])
+
+    def test_export_class_report_requires_class_id(self):
+        """Class exports are validated like queued reports"""
+        response = self.client.get('/api/reports/export/', {
+            'report_type': 'class',
+            'start_date': str(self.today),
+            'end_date': str(self.today),
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('class_id', response.data)
+
+
+class PreviewReportAPITest(ReportFixtureMixin, APITestCase):
+    """Test report previews"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create_user(email='admin@test.com', password='test123')
+        Role.objects.create(name='ADMIN').users.add(self.admin_user)
+        self.client.force_authenticate(user=self.admin_user)
+
+        self.students = self._enroll(30)
+        self._hold_sessions(self.students, 2)
+
+    def _preview(self, **params):
+        return self.client.get('/api/reports/preview/', {
+            'start_date': str(self.today),
+            'end_date': str(self.today),
+            **params
+        })
+
+    def test_class_preview_returns_first_rows_and_totals(self):
+        """Only the requested rows are returned, totals cover the whole class"""
+        report_count = Report.objects.count()
+        response = self._preview(report_type='class', class_id=str(self.cs_class.id), rows=5)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['rows']), 5)
+        self.assertEqual(response.data['rows'][0][0], 'S0000')
+        self.assertEqual(response.data['row_count'], 30)
+        self.assertEqual(response.data['totals']['sessions'], 2)
+        self.assertEqual(response.data['totals']['records'], 60)
+        self.assertEqual(response.data['totals']['present'], 20)
+        self.assertEqual(Report.objects.count(), report_count)
+        self.assertEqual(os.listdir(self.reports_dir), [])
+
+    def test_matrix_preview_has_a_column_per_session(self):
+        """Matrix previews return the register cells of the first students"""
+        response = self._preview(report_type='matrix', class_id=str(self.cs_class.id), rows=3)
+
+        self.assertEqual(len(response.data['columns']), 2 + 2)
+        self.assertEqual([row[2:] for row in response.data['rows']], [['P', 'P'], ['A', 'A'], ['L', 'L']])
+
+
+class ReportCacheAPITest(ReportFixtureMixin, APITestCase):
+    """Test reuse of report output between identical requests"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create_user(email='admin@test.com', password='test123')
+        Role.objects.create(name='ADMIN').users.add(self.admin_user)
+        self.client.force_authenticate(user=self.admin_user)
+        self.students = self._enroll(3)
+        self._hold_sessions(self.students, 2)
+
+    def _request(self):
+        return self.client.post('/api/reports/generate/', {
+            'report_type': 'class',
+            'class_id': str(self.cs_class.id),
+            'start_date': str(self.today),
+            'end_date': str(self.today),
+        })
+
+    def test_identical_requests_share_output(self):
+        """Requests follow an in-flight report, then reuse its completed file"""
+        first = self._request()
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        leader = Report.objects.get(id=first.data['id'])
+
+        second = self._request()
+        follower = Report.objects.get(id=second.data['id'])
+        self.assertEqual(follower.source_id, leader.id)
+        self.assertEqual(follower.cache_key, leader.cache_key)
+
+        result = ReportGenerationService.generate(leader)
+        Report.objects.filter(id__in=[leader.id, follower.id]).update(
+            status='COMPLETED', file_path=result['file_path'], file_size=result['file_size']
+        )
+
+        third = self._request()
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        self.assertEqual(third.data['status'], 'COMPLETED')
+        self.assertEqual(Report.objects.get(id=third.data['id']).file_path, result['file_path'])
+
+    def test_attendance_change_misses_cache(self):
+        """Marking attendance changes the data version and the cache key"""
+        first = Report.objects.get(id=self._request().data['id'])
+
+        self._hold_sessions(self.students, 1)
+
+        second = Report.objects.get(id=self._request().data['id'])
+        self.assertNotEqual(second.cache_key, first.cache_key)
+        self.assertIsNone(second.source_id)
+
+
+class ListReportsAPITest(ReportFixtureMixin, APITestCase):
+    """Test the report list"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin_user = User.objects.create_user(email='admin@test.com', password='test123')
+        Role.objects.create(name='ADMIN').users.add(self.admin_user)
+        self.client.force_authenticate(user=self.admin_user)
+
+        students = self._enroll(5)
+        Report.objects.bulk_create([
+            Report(
+                report_type='STUDENT',
+                student=student,
+                status='COMPLETED' if i % 2 else 'FAILED',
+                start_date=self.today,
+                end_date=self.today,
+                generated_by=self.admin_user
+            )
+            for i, student in enumerate(students)
+        ] + [
+            Report(
+                report_type='CLASS',
+                class_instance=self.cs_class,
+                status='COMPLETED',
+                start_date=self.today,
+                end_date=self.today,
+                generated_by=self.admin_user
+            )
+            for _ in range(3)
+        ])
+
+    def test_cursor_pages_cover_every_report(self):
+        """page_size returns cursor pages in one query each"""
+        response = self.client.get('/api/reports/', {'page_size': 3})
+        self.assertEqual(len(response.data['results']), 3)
+
+        seen = [report['id'] for report in response.data['results']]
+        while response.data['next']:
+            with self.assertNumQueries(1):
+                response = self.client.get(response.data['next'])
+            seen += [report['id'] for report in response.data['results']]
+        self.assertEqual(len(set(seen)), 8)
+
+    def test_unpaged_list_is_unchanged(self):
+        """Without page_size the full list is returned"""
+        response = self.client.get('/api/reports/')
+        self.assertEqual(len(response.data), 8)
+
+    def test_status_and_type_filters(self):
+        """Filters combine and are case-insensitive"""
+        response = self.client.get('/api/reports/', {'status': 'completed', 'report_type': 'student'})
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual({report['status'] for report in response.data}, {'COMPLETED'})
+
+
+class ReportSubscriptionTest(ReportFixtureMixin, APITestCase):
+    """Test scheduled report subscriptions"""
+
+    def setUp(self):
+        super().setUp()
+        Role.objects.create(name='TEACHER').users.add(self.teacher.user)
+        self.client.force_authenticate(user=self.teacher.user)
+        self._enroll(3)
+
+    def _subscribe(self, **data):
+        return self.client.post('/api/reports/subscriptions/', {
+            'report_type': 'class',
+            'class_id': str(self.cs_class.id),
+            'recipients': ['head@test.com'],
+            **data
+        }, format='json')
+
+    def test_subscription_is_scheduled_overnight(self):
+        """New weekly subscriptions first run at REPORT_SUBSCRIPTION_HOUR on their weekday"""
+        response = self._subscribe(frequency='WEEKLY', weekday=0)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        subscription = ReportSubscription.objects.get(id=response.data['id'])
+        next_run = timezone.localtime(subscription.next_run_at)
+        self.assertEqual((next_run.weekday(), next_run.hour), (0, 1))
+        self.assertGreater(subscription.next_run_at, timezone.now())
+
+    def test_subscription_for_other_class_is_denied(self):
+        """Teachers subscribe only to reports they may generate"""
+        other = Class.objects.create(
+            subject=self.subject,
+            teacher=Teacher.objects.create(
+                user=User.objects.create_user(email='other@test.com', password='test123'),
+                employee_id='T002',
+                department='CS',
+                hire_date=date(2020, 1, 1)
+            ),
+            name='CS101 B',
+            academic_year='2024-2025',
+            semester='FALL'
+        )
+        response = self._subscribe(class_id=str(other.id))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_claim_due_respects_limit_and_window(self):
+        """Due subscriptions get a report over their window and move to the next run"""
+        for _ in range(3):
+            self._subscribe(window_days=7)
+        ReportSubscription.objects.update(next_run_at=timezone.now() - timedelta(minutes=1))
+
+        claimed = ReportSubscriptionService.claim_due(limit=2)
+
+        self.assertEqual(len(claimed), 2)
+        report = claimed[0][0]
+        self.assertEqual((report.end_date - report.start_date).days, 6)
+        self.assertEqual(report.end_date, timezone.localdate() - timedelta(days=1))
+        self.assertEqual(ReportSubscription.objects.filter(next_run_at__gt=timezone.now()).count(), 2)
+
+    def test_signed_link_downloads_without_login(self):
+        """Emailed links work for their report only"""
+        result = ReportGenerationService.generate_class_report(self.cs_class.id, self.today, self.today)
+        report = Report.objects.create(
+            report_type='CLASS',
+            class_instance=self.cs_class,
+            start_date=self.today,
+            end_date=self.today,
+            generated_by=self.teacher.user,
+            status='COMPLETED',
+            file_path=result['file_path'],
+            file_size=result['file_size']
+        )
+        link = ReportSubscriptionService.download_link(report)
+        token = link.split('token=')[1]
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(f'/api/reports/{report.id}/download/', {'token': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(f'/api/reports/{report.id}/download/', {'token': token + 'x'})
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
@@ -5,11 +5,27 @@ from django.urls import path
 from apps.reports.views import (
     GenerateReportView,
     DownloadReportView,
-    ListReportsView
+    ExportReportView,
+    GenerateBundleView,
+    ListReportsView,
+    PreviewReportView,
+    ReportStatusView,
+    ReportSubscriptionDetailView,
+    ReportSubscriptionListView
 )
 
 urlpatterns = [
     path('generate/', GenerateReportView.as_view(), name='generate-report'),
+    path('bundles/', GenerateBundleView.as_view(), name='generate-bundle'),
+    path('export/', ExportReportView.as_view(), name='export-report'),
+    path('preview/', PreviewReportView.as_view(), name='preview-report'),
+    path('subscriptions/', ReportSubscriptionListView.as_view(), name='report-subscriptions'),
+    path(
+        'subscriptions/<uuid:subscription_id>/',
+        ReportSubscriptionDetailView.as_view(),
+        name='report-subscription'
+    ),
+    path('<uuid:report_id>/status/', ReportStatusView.as_view(), name='report-status'),
     path('<uuid:report_id>/download/', DownloadReportView.as_view(), name='download-report'),
     path('', ListReportsView.as_view(), name='list-reports'),
 ]
@@ -4,28 +4,158 @@ Handles report generation and download requests
 """
 import os
 from datetime import datetime
-from django.http import FileResponse, Http404
-from django.utils import timezone
-from rest_framework import status
+from django.http import Http404, StreamingHttpResponse
+from django.db import transaction
+from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
-from apps.reports.models import Report
+from classroom_api.downloads import file_download_response
+from classroom_api.pagination import CreatedAtCursorPagination
+from apps.reports.models import Report, ReportSubscription
 from apps.reports.serializers import (
+    ReportBundleRequestSerializer,
     ReportRequestSerializer,
     ReportResponseSerializer,
-    ReportListSerializer
+    ReportListSerializer,
+    ReportSubscriptionSerializer
 )
-from apps.reports.services import ReportGenerationService
-from apps.reports.permissions import CanGenerateReport, CanDownloadReport
-from apps.classes.models import Teacher, Student, Class
+from apps.reports.services import (
+    REPORT_FILE_EXTENSIONS,
+    ReportCache,
+    ReportGenerationService,
+    ReportPreviewService,
+    ReportRetentionService,
+    stream_csv_rows,
+)
+from apps.reports.tasks import generate_bundle_task, generate_report_task
+from apps.reports.permissions import (
+    CanGenerateReport,
+    CanDownloadReport,
+    HasDownloadLink,
+    teaches_class,
+    teaches_student,
+)
+from apps.classes.models import Student, Class
+
+
+def _check_report_access(user, report_type, data):
+    """
+    Check that the user may request this report
+    
+    Returns:
+        Response: Error response if access is denied, otherwise None
+    """
+    if user.has_role('ADMIN'):
+        return None
+    
+    # Institution-wide extracts are admin only
+    if report_type == 'INSTITUTION':
+        return Response(
+            {'error': 'Only admins can generate institution reports'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    if report_type == 'STUDENT':
+        student_id = data['student_id']
+        
+        # Teachers can request reports for students in their classes
+        if user.has_role('TEACHER'):
+            if not teaches_student(user, student_id):
+                return Response(
+                    {'error': 'You can only generate reports for students in your classes'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            return None
+        
+        # Students can only request their own reports (linked by email)
+        if user.has_role('STUDENT'):
+            if not user.authz.student_id:
+                return Response(
+                    {'error': 'Student profile not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            if user.authz.student_id != student_id:
+                return Response(
+                    {'error': 'You can only generate reports for yourself'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            return None
+        
+        return Response(
+            {'error': 'You do not have permission to generate student reports'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    # Students cannot request class reports
+    if user.has_role('STUDENT'):
+        return Response(
+            {'error': 'Students cannot generate class reports'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    # Teachers can only request reports for their own classes
+    if user.has_role('TEACHER') and not teaches_class(user, data['class_id']):
+        return Response(
+            {'error': 'You can only generate reports for your own classes'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    return None
+
+
+REPORT_CONTENT_TYPES = {
+    'CSV': 'text/csv',
+    'PARQUET': 'application/vnd.apache.parquet',
+    'XLSX': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'ZIP': 'application/zip',
+}
+
+
+def _report_filename(report_type, subject, start_date, end_date, format='CSV'):
+    """Download filename for a Student, Class, Matrix or Institution report"""
+    extension = REPORT_FILE_EXTENSIONS[format]
+    if report_type == 'STUDENT' and subject:
+        return f"student_report_{subject.get_full_name().replace(' ', '_')}_{start_date}_to_{end_date}.{extension}"
+    if report_type == 'CLASS' and subject:
+        return f"class_report_{subject.name.replace(' ', '_')}_{start_date}_to_{end_date}.{extension}"
+    if report_type == 'MATRIX' and subject:
+        return f"attendance_register_{subject.name.replace(' ', '_')}_{start_date}_to_{end_date}.{extension}"
+    if report_type == 'INSTITUTION':
+        return f"attendance_extract_{start_date}_to_{end_date}.{extension}"
+    if report_type == 'BUNDLE':
+        return f"class_reports_{start_date}_to_{end_date}.zip"
+    return None
+
+
+def _regenerate(report):
+    """Queue an expired report again and answer 202 with its status URL"""
+    with transaction.atomic():
+        if ReportRetentionService.reset_for_regeneration(report):
+            task = generate_bundle_task if report.report_type == 'BUNDLE' else generate_report_task
+            report_id = str(report.id)
+            transaction.on_commit(lambda: task.delay(report_id))
+    
+    return Response(
+        {
+            'id': str(report.id),
+            'status': 'PENDING',
+            'message': 'Report expired and is being generated again',
+            'status_url': f'/api/reports/{report.id}/status/'
+        },
+        status=status.HTTP_202_ACCEPTED
+    )
 
 
 class GenerateReportView(APIView):
     """
     POST /api/reports/generate/
-    Generate a new attendance report
+    Queue a new attendance report
+    
+    Returns 202 with the report ID; poll /api/reports/{id}/status/ until
+    the status is COMPLETED or FAILED. An identical request over unchanged
+    data shares the earlier report's file and may return 200 at once.
     """
     permission_classes = [IsAuthenticated]
     
@@ -42,135 +172,141 @@ class GenerateReportView(APIView):
         data = serializer.validated_data
         user = request.user
         
-        # Validate permissions
         report_type = data['report_type'].upper()
         
-        # Check if user can generate this type of report
-        if report_type == 'STUDENT':
-            student_id = data['student_id']
-            
-            # Admins can generate any report
-            if not user.has_role('ADMIN'):
-                # Teachers can generate reports for students in their classes
-                if user.has_role('TEACHER'):
-                    teacher = Teacher.objects.get(user=user)
-                    from apps.classes.models import ClassStudent
-                    
-                    # Check if student is in any of teacher's classes
-                    student_in_teacher_class = ClassStudent.objects.filter(
-                        student_id=student_id,
-                        class_instance__teacher_id=teacher.id
-                    ).exists()
-                    
-                    if not student_in_teacher_class:
-                        return Response(
-                            {'error': 'You can only generate reports for students in your classes'},
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                
-                # Students can only generate their own reports
-                elif user.has_role('STUDENT'):
-                    # Students are linked by email, not user FK
-                    try:
-                        student = Student.objects.get(email=user.email)
-                        if student.id != student_id:
-                            return Response(
-                                {'error': 'You can only generate reports for yourself'},
-                                status=status.HTTP_403_FORBIDDEN
-                            )
-                    except Student.DoesNotExist:
-                        return Response(
-                            {'error': 'Student profile not found'},
-                            status=status.HTTP_404_NOT_FOUND
-                        )
-                else:
-                    return Response(
-                        {'error': 'You do not have permission to generate student reports'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-        
-        elif report_type == 'CLASS':
-            class_id = data['class_id']
-            
-            # Students cannot generate class reports
-            if user.has_role('STUDENT'):
-                return Response(
-                    {'error': 'Students cannot generate class reports'},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            # Teachers can only generate reports for their own classes
-            if user.has_role('TEACHER'):
-                teacher = Teacher.objects.get(user=user)
-                class_instance = Class.objects.get(id=class_id)
-                
-                if class_instance.teacher_id != teacher.id:
-                    return Response(
-                        {'error': 'You can only generate reports for your own classes'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-        
-        # Create report record
-        report = Report.objects.create(
+        denied = _check_report_access(user, report_type, data)
+        if denied:
+            return denied
+        
+        # Create the report, reusing output of an identical request
+        report_format = data.get('format', 'csv').upper()
+        target_id = {
+            'STUDENT': data.get('student_id'),
+            'CLASS': data.get('class_id'),
+            'MATRIX': data.get('class_id'),
+        }.get(report_type)
+        report, needs_generation = ReportCache.create_report(
             report_type=report_type,
-            format=data.get('format', 'csv').upper(),
+            format=report_format,
             class_instance_id=data.get('class_id'),
             student_id=data.get('student_id'),
             start_date=data['start_date'],
             end_date=data['end_date'],
-            generated_by=user,
-            status='PENDING'
+            generated_by_id=user.pk,
+            cache_key=ReportCache.key_for(
+                report_type, target_id, data['start_date'], data['end_date'], report_format
+            )
         )
         
-        # Generate report synchronously (for now)
-        try:
-            if report_type == 'STUDENT':
-                result = ReportGenerationService.generate_student_report(
-                    student_id=data['student_id'],
-                    start_date=data['start_date'],
-                    end_date=data['end_date'],
-                    format=data.get('format', 'csv').upper()
-                )
-            else:  # CLASS
-                result = ReportGenerationService.generate_class_report(
-                    class_id=data['class_id'],
-                    start_date=data['start_date'],
-                    end_date=data['end_date'],
-                    format=data.get('format', 'csv').upper()
-                )
-            
-            # Update report with results
-            report.file_path = result['file_path']
-            report.file_size = result['file_size']
-            report.status = 'COMPLETED'
-            report.completed_at = timezone.now()
-            report.save()
-            
-        except Exception as e:
-            # Mark report as failed
-            report.status = 'FAILED'
-            report.error_message = str(e)
-            report.save()
-            
+        # Generate in the background once the row is committed
+        if needs_generation:
+            report_id = str(report.id)
+            transaction.on_commit(lambda: generate_report_task.delay(report_id))
+        
+        response_serializer = ReportResponseSerializer(report)
+        return Response(
+            {
+                **response_serializer.data,
+                'status_url': f'/api/reports/{report.id}/status/'
+            },
+            status=status.HTTP_200_OK if report.status == 'COMPLETED' else status.HTTP_202_ACCEPTED
+        )
+
+
+class GenerateBundleView(APIView):
+    """
+    POST /api/reports/bundles/
+    Queue class reports for every class matching a filter, zipped together
+    
+    Admin only. Returns 202 with the bundle's report ID; its progress is the
+    share of class reports finished, and failures of individual classes
+    are listed in the bundle's manifest.json.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        """Queue a report bundle"""
+        if not request.user.has_role('ADMIN'):
             return Response(
-                {'error': f'Failed to generate report: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Only admins can generate report bundles'},
+                status=status.HTTP_403_FORBIDDEN
             )
         
-        # Return response
-        response_serializer = ReportResponseSerializer(report)
+        serializer = ReportBundleRequestSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        bundle = Report.objects.create(
+            report_type='BUNDLE',
+            format=data['format'].upper(),
+            filters=serializer.get_filters(),
+            start_date=data['start_date'],
+            end_date=data['end_date'],
+            generated_by_id=request.user.pk,
+            status='PENDING'
+        )
+        
+        bundle_id = str(bundle.id)
+        transaction.on_commit(lambda: generate_bundle_task.delay(bundle_id))
+        
+        response_serializer = ReportResponseSerializer(bundle)
         return Response(
-            response_serializer.data,
-            status=status.HTTP_201_CREATED
+            {
+                **response_serializer.data,
+                'status_url': f'/api/reports/{bundle.id}/status/'
+            },
+            status=status.HTTP_202_ACCEPTED
         )
 
 
+class ReportStatusView(APIView):
+    """
+    GET /api/reports/{id}/status/
+    Lightweight polling endpoint for report generation progress
+    """
+    permission_classes = [IsAuthenticated, CanDownloadReport]
+    
+    def get(self, request, report_id):
+        """Return status and progress without loading related objects"""
+        report = Report.objects.filter(id=report_id).only(
+            'id', 'report_type', 'status', 'progress', 'error_message',
+            'student_id', 'class_instance_id', 'file_path', 'completed_at'
+        ).first()
+        if report is None:
+            raise Http404("Report not found")
+        
+        self.check_object_permissions(request, report)
+        
+        return Response({
+            'id': str(report.id),
+            'status': report.status,
+            'progress': report.progress,
+            'error_message': report.error_message,
+            'completed_at': report.completed_at,
+            'download_url': (
+                f'/api/reports/{report.id}/download/'
+                if (report.status == 'COMPLETED' and report.file_path) or report.status == 'EXPIRED'
+                else None
+            ),
+        })
+
+
 class DownloadReportView(APIView):
     """
     GET /api/reports/{id}/download/
     Download a generated report
+    
+    Supports ETag/Range requests, and hands the transfer to the front proxy
+    when SENDFILE_BACKEND is configured. Expired reports answer 202 and are
+    generated again. Links from subscription emails authenticate with a
+    signed ?token= instead of a login.
     """
-    permission_classes = [IsAuthenticated, CanDownloadReport]
+    permission_classes = [(IsAuthenticated & CanDownloadReport) | HasDownloadLink]
     
     def get(self, request, report_id):
         """Download report file"""
@@ -182,6 +318,14 @@ class DownloadReportView(APIView):
         # Check permissions
         self.check_object_permissions(request, report)
         
+        # Expired reports, or ones whose file is gone, are generated again
+        # under the same ID; the client polls the status URL as for new ones
+        if report.status == 'EXPIRED' or (
+            report.status == 'COMPLETED'
+            and (not report.file_path or not os.path.exists(report.file_path))
+        ):
+            return _regenerate(report)
+        
         # Check if report is ready
         if report.status != 'COMPLETED':
             return Response(
@@ -189,56 +333,240 @@ class DownloadReportView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if file exists
-        if not report.file_path or not os.path.exists(report.file_path):
+        # Generate filename
+        subject = report.student if report.report_type == 'STUDENT' else report.class_instance
+        filename = _report_filename(
+            report.report_type, subject, report.start_date, report.end_date, report.format
+        ) or f"report_{report.id}.{REPORT_FILE_EXTENSIONS[report.format]}"
+        
+        # Bundles are always zipped, whatever their reports' format
+        file_format = 'ZIP' if report.report_type == 'BUNDLE' else report.format
+        return file_download_response(
+            request,
+            report.file_path,
+            filename,
+            REPORT_CONTENT_TYPES[file_format]
+        )
+
+
+class ExportReportView(APIView):
+    """
+    GET /api/reports/export/?report_type=student|class|matrix|institution&student_id|class_id=...&start_date=...&end_date=...
+    Stream a report straight to the client without storing it
+    
+    Rows are read from a server-side cursor and written to the response as
+    they arrive, so memory use does not grow with the date range.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        """Stream an on-demand CSV report"""
+        serializer = ReportRequestSerializer(data=request.query_params)
+        
+        if not serializer.is_valid():
             return Response(
-                {'error': 'Report file not found'},
-                status=status.HTTP_404_NOT_FOUND
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Generate filename
-        if report.report_type == 'STUDENT' and report.student:
-            filename = f"student_report_{report.student.get_full_name().replace(' ', '_')}_{report.start_date}_to_{report.end_date}.csv"
-        elif report.report_type == 'CLASS' and report.class_instance:
-            filename = f"class_report_{report.class_instance.name.replace(' ', '_')}_{report.start_date}_to_{report.end_date}.csv"
+        data = serializer.validated_data
+        report_type = data['report_type'].upper()
+        
+        if data.get('format', 'csv') != 'csv':
+            return Response(
+                {'format': 'Streaming export supports CSV only. Generate a report for other formats.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        denied = _check_report_access(request.user, report_type, data)
+        if denied:
+            return denied
+        
+        if report_type == 'INSTITUTION':
+            subject = None
+            columns, data_rows = ReportGenerationService.institution_report_columns(
+                data['start_date'], data['end_date']
+            )
+            header_rows = [[name for name, kind in columns]]
+        elif report_type == 'STUDENT':
+            subject = Student.objects.filter(id=data['student_id']).first()
+            if subject is None:
+                return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
+            header_rows, data_rows = ReportGenerationService.student_report_csv(
+                subject, data['start_date'], data['end_date']
+            )
         else:
-            filename = f"report_{report.id}.csv"
+            subject = Class.objects.filter(id=data['class_id']).first()
+            if subject is None:
+                return Response({'error': 'Class not found'}, status=status.HTTP_404_NOT_FOUND)
+            source = (
+                ReportGenerationService.matrix_report_csv if report_type == 'MATRIX'
+                else ReportGenerationService.class_report_csv
+            )
+            header_rows, data_rows = source(subject, data['start_date'], data['end_date'])
         
-        # Return file
-        file_handle = open(report.file_path, 'rb')
-        response = FileResponse(file_handle, content_type='text/csv')
+        response = StreamingHttpResponse(
+            stream_csv_rows(header_rows, data_rows),
+            content_type='text/csv'
+        )
+        filename = _report_filename(report_type, subject, data['start_date'], data['end_date'])
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
+        response['X-Accel-Buffering'] = 'no'
         return response
 
 
-class ListReportsView(APIView):
+class PreviewReportView(APIView):
     """
-    GET /api/reports/
-    List user's reports
+    GET /api/reports/preview/?report_type=...&student_id|class_id=...&start_date=...&end_date=...&rows=20
+    Preview a report as JSON without generating it
+    
+    Returns the first rows (up to ReportPreviewService.MAX_ROWS) and the
+    report's totals, read with LIMIT and aggregate queries; no file is
+    written.
     """
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        """List reports for current user"""
-        user = request.user
+        """Return the first rows and totals of a report"""
+        serializer = ReportRequestSerializer(data=request.query_params)
+        
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            rows = int(request.query_params.get('rows', ReportPreviewService.DEFAULT_ROWS))
+        except ValueError:
+            return Response(
+                {'rows': 'rows must be a number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        rows = max(0, min(rows, ReportPreviewService.MAX_ROWS))
+        
+        data = serializer.validated_data
+        report_type = data['report_type'].upper()
+        
+        denied = _check_report_access(request.user, report_type, data)
+        if denied:
+            return denied
+        
+        if report_type == 'INSTITUTION':
+            subject = None
+        elif report_type == 'STUDENT':
+            subject = Student.objects.filter(id=data['student_id']).first()
+            if subject is None:
+                return Response({'error': 'Student not found'}, status=status.HTTP_404_NOT_FOUND)
+        else:
+            subject = Class.objects.filter(id=data['class_id']).first()
+            if subject is None:
+                return Response({'error': 'Class not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        preview = ReportPreviewService.preview(
+            report_type, subject, data['start_date'], data['end_date'], rows
+        )
+        return Response({
+            'report_type': report_type,
+            'start_date': data['start_date'],
+            'end_date': data['end_date'],
+            **preview
+        })
+
+
+class ListReportsView(generics.ListAPIView):
+    """
+    GET /api/reports/?status=...&report_type=...
+    List user's reports, newest first
+    
+    Send ?page_size= (then follow `next`) for cursor pages; without it the
+    full list is returned as before.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ReportListSerializer
+    pagination_class = CreatedAtCursorPagination
+    
+    def get_queryset(self):
+        """Reports visible to the current user, filtered by status and type"""
+        user = self.request.user
         
         # Filter reports based on user role
         if user.has_role('ADMIN'):
-            # Admins can see all reports
-            reports = Report.objects.all()
+            # Admins can see all reports; class reports inside bundles are
+            # reached through the bundle
+            reports = Report.objects.filter(parent__isnull=True)
         elif user.has_role('TEACHER'):
             # Teachers can see reports they generated
-            reports = Report.objects.filter(generated_by=user)
-        elif user.has_role('STUDENT'):
+            reports = Report.objects.filter(generated_by_id=user.pk)
+        elif user.has_role('STUDENT') and user.authz.student_id:
             # Students can see their own reports (linked by email)
-            try:
-                student = Student.objects.get(email=user.email)
-                reports = Report.objects.filter(student_id=student.id)
-            except Student.DoesNotExist:
-                reports = Report.objects.none()
+            reports = Report.objects.filter(student_id=user.authz.student_id)
         else:
             reports = Report.objects.none()
         
-        serializer = ReportListSerializer(reports, many=True)
-        return Response(serializer.data)
+        report_status = self.request.query_params.get('status')
+        report_type = self.request.query_params.get('report_type')
+        if report_status:
+            reports = reports.filter(status=report_status.upper())
+        if report_type:
+            reports = reports.filter(report_type=report_type.upper())
+        
+        return reports.select_related('class_instance', 'student')
+
+
+def _visible_subscriptions(user):
+    """Subscriptions the user may see: their own, or all for admins"""
+    subscriptions = ReportSubscription.objects.select_related('class_instance', 'student')
+    if user.has_role('ADMIN'):
+        return subscriptions
+    return subscriptions.filter(created_by_id=user.pk)
+
+
+class ReportSubscriptionListView(generics.ListCreateAPIView):
+    """
+    GET, POST /api/reports/subscriptions/
+    List or create scheduled reports
+    
+    Subscribed reports are generated overnight over a rolling window and
+    their download links are emailed to the recipients, so recurring
+    reports do not have to be requested during the day.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ReportSubscriptionSerializer
+    
+    def get_queryset(self):
+        return _visible_subscriptions(self.request.user)
+    
+    def create(self, request, *args, **kwargs):
+        """Create a subscription for a report the user may request"""
+        serializer = self.get_serializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors,
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        denied = _check_report_access(request.user, data['report_type'], {
+            'class_id': data['class_instance_id'],
+            'student_id': data['student_id'],
+        })
+        if denied:
+            return denied
+        
+        serializer.save(created_by_id=request.user.pk)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ReportSubscriptionDetailView(generics.RetrieveDestroyAPIView):
+    """
+    GET, DELETE /api/reports/subscriptions/{id}/
+    Show or cancel a subscription
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ReportSubscriptionSerializer
+    lookup_url_kwarg = 'subscription_id'
+    
+    def get_queryset(self):
+        return _visible_subscriptions(self.request.user)
@@ -193,7 +193,7 @@ class ClassSession(models.Model):
             # Admin can end any session
             if not user.has_role('ADMIN'):
                 # Teacher can only end their own session
-                if self.teacher.user != user:
+                if self.teacher.user_id != user.pk:
                     raise ValidationError(
                         "Only the teacher who started this session can end it"
                     )
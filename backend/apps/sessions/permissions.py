@@ -18,7 +18,7 @@ class CanStartSession(permissions.BasePermission):
             return False
         
         # Must be a teacher
-        if not hasattr(request.user, 'teacher_profile'):
+        if request.user.authz.teacher_id is None:
             return False
         
         return True
@@ -38,8 +38,9 @@ class CanEndSession(permissions.BasePermission):
             return True
         
         # Teachers can only end their own sessions
-        if hasattr(request.user, 'teacher_profile'):
-            return obj.teacher.user == request.user
+        teacher_id = request.user.authz.teacher_id
+        if teacher_id:
+            return obj.teacher_id == teacher_id
         
         return False
 
@@ -59,7 +60,7 @@ class CanViewSession(permissions.BasePermission):
         
         # Teachers and admins can view
         return (
-            hasattr(request.user, 'teacher_profile') or 
+            request.user.authz.teacher_id is not None or
             request.user.has_role('ADMIN')
         )
     
@@ -70,8 +71,9 @@ class CanViewSession(permissions.BasePermission):
             return True
         
         # Teachers can view their own sessions
-        if hasattr(request.user, 'teacher_profile'):
-            return obj.teacher.user == request.user
+        teacher_id = request.user.authz.teacher_id
+        if teacher_id:
+            return obj.teacher_id == teacher_id
         
         return False
 
@@ -87,6 +89,6 @@ class IsTeacherOrAdmin(permissions.BasePermission):
             return False
         
         return (
-            hasattr(request.user, 'teacher_profile') or 
+            request.user.authz.teacher_id is not None or
             request.user.has_role('ADMIN')
         )
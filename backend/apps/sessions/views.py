@@ -17,6 +17,7 @@ from .serializers import (
     EndSessionSerializer,
     ActiveSessionSerializer
 )
+from classroom_api.pagination import StartTimeCursorPagination
 from .permissions import (
     CanStartSession,
     CanEndSession,
@@ -40,6 +41,7 @@ class ClassSessionViewSet(viewsets.ModelViewSet):
     
     queryset = ClassSession.objects.all()
     permission_classes = [IsAuthenticated, IsTeacherOrAdmin]
+    pagination_class = StartTimeCursorPagination
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action"""
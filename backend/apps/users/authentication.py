@@ -0,0 +1,143 @@
+"""
+Stateless JWT authentication
+
+Access tokens carry the user's role names, teacher profile id and
+authz_version as signed claims. RoleClaimsJWTAuthentication turns them into
+a LazyTokenUser: permission checks are answered from the claims and the User
+row is only loaded if a view reads some other attribute. Revocation works by
+comparing the token's authz_version with the cached current version, which
+revoke_authorization() bumps whenever roles or profiles change.
+"""
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authorization import (
+    AuthorizationContext,
+    TokenAuthorizationContext,
+    get_authz_version,
+)
+
+
+ROLES_CLAIM = 'roles'
+TEACHER_ID_CLAIM = 'teacher_id'
+STUDENT_ID_CLAIM = 'student_id'
+AUTHZ_VERSION_CLAIM = 'authz_version'
+
+
+class RoleClaimsRefreshToken(RefreshToken):
+    """Refresh token whose access tokens embed authorization claims"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_authorization_claims(user)
+        return token
+
+    def set_authorization_claims(self, user):
+        """Read roles, teacher and student records and authz_version fresh from the DB"""
+        from apps.classes.models import Student, Teacher
+
+        User = get_user_model()
+        self[AUTHZ_VERSION_CLAIM] = User.objects.filter(pk=user.pk).values_list(
+            'authz_version', flat=True
+        ).get()
+        self[ROLES_CLAIM] = sorted(
+            User.roles.through.objects.filter(user_id=user.pk).values_list(
+                'role__name', flat=True
+            )
+        )
+        teacher_id = Teacher.objects.filter(user_id=user.pk).values_list(
+            'id', flat=True
+        ).first()
+        self[TEACHER_ID_CLAIM] = str(teacher_id) if teacher_id else None
+        # Students are linked to accounts by email, as in AuthorizationContext.student
+        student_id = Student.objects.filter(email=user.email).values_list(
+            'id', flat=True
+        ).first()
+        self[STUDENT_ID_CLAIM] = str(student_id) if student_id else None
+
+
+class LazyTokenUser(SimpleLazyObject):
+    """
+    request.user for claims-authenticated requests
+
+    Identity and authorization come from the token. Any other attribute
+    (email, save(), related managers, ...) loads the real User on first use,
+    and isinstance(user, User) holds so it can be passed to the ORM.
+    """
+
+    def __init__(self, token):
+        user_id = token[api_settings.USER_ID_CLAIM]
+        pk = uuid.UUID(str(user_id))
+        super().__init__(lambda: get_user_model().objects.get(pk=pk))
+
+        self.__dict__['pk'] = pk
+        self.__dict__['id'] = pk
+        self.__dict__['is_active'] = True
+        self.__dict__['authz'] = TokenAuthorizationContext(
+            self,
+            token.get(ROLES_CLAIM, []),
+            _parse_uuid(token.get(TEACHER_ID_CLAIM)),
+            _parse_uuid(token.get(STUDENT_ID_CLAIM))
+        )
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        return isinstance(other, get_user_model()) and other.pk == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def has_role(self, role_name):
+        return self.authz.has_role(role_name)
+
+    def has_any_role(self, *role_names):
+        return self.authz.has_any_role(*role_names)
+
+    def reset_authz(self):
+        """Fall back to DB-backed checks once roles change mid-request"""
+        self.__dict__['authz'] = AuthorizationContext(self)
+
+
+def _parse_uuid(value):
+    return uuid.UUID(value) if value else None
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the token's authorization claims
+
+    Tokens issued without claims fall back to the stock per-request user
+    lookup, so sessions that predate the claims keep working until refresh.
+    """
+
+    def get_user(self, validated_token):
+        if AUTHZ_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        current_version = get_authz_version(user_id)
+        if current_version is None:
+            raise AuthenticationFailed(_('User not found or inactive'), code='user_inactive')
+
+        if validated_token[AUTHZ_VERSION_CLAIM] != current_version:
+            raise AuthenticationFailed(
+                _('Token permissions are out of date'), code='token_not_valid'
+            )
+
+        return LazyTokenUser(validated_token)
@@ -0,0 +1,177 @@
+"""
+Request-scoped authorization context
+
+Loads a user's role names and teacher/student profiles at most once and
+reuses them for every permission check made while handling a request.
+DRF authenticates a fresh User instance per request, so caching on the
+instance is request-scoped; the m2m_changed handlers in signals.py drop the
+cache whenever roles change on an instance that is still in use.
+
+Access tokens carry the same information as claims (see authentication.py).
+Each user has an authz_version that is bumped whenever their roles,
+teacher profile or linked student record change; tokens minted for an
+older version are rejected.
+The current version is read from the cache so checking it costs no query.
+Writers store the committed version in the cache and readers only add
+missing keys, so a reader holding a pre-commit value cannot overwrite it.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils.functional import cached_property
+
+
+# Also bounds how long a version can be stale if two revocations race
+AUTHZ_VERSION_CACHE_TIMEOUT = 60 * 5
+
+
+class AuthorizationContext:
+    """Roles and profiles for one user, resolved lazily and cached"""
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def role_names(self):
+        """frozenset of the user's role names (one query)"""
+        if not self.user.pk:
+            return frozenset()
+        return frozenset(self.user.roles.values_list('name', flat=True))
+
+    def has_role(self, role_name):
+        return role_name in self.role_names
+
+    def has_any_role(self, *role_names):
+        return not self.role_names.isdisjoint(role_names)
+
+    @property
+    def is_admin(self):
+        return self.has_role('ADMIN')
+
+    @cached_property
+    def teacher(self):
+        """The user's Teacher profile, or None"""
+        # Shares Django's reverse one-to-one cache with user.teacher_profile
+        return getattr(self.user, 'teacher_profile', None)
+
+    @property
+    def teacher_id(self):
+        return self.teacher.id if self.teacher else None
+
+    @cached_property
+    def student(self):
+        """The Student record linked to this account by email, or None"""
+        from apps.classes.models import Student
+        return Student.objects.filter(email=self.user.email).first()
+
+    @property
+    def student_id(self):
+        return self.student.id if self.student else None
+
+
+class TokenAuthorizationContext(AuthorizationContext):
+    """AuthorizationContext answered from signed token claims"""
+
+    def __init__(self, user, role_names, teacher_id, student_id=None):
+        super().__init__(user)
+        self.__dict__['role_names'] = frozenset(role_names)
+        self._teacher_id = teacher_id
+        self._student_id = student_id
+
+    @property
+    def teacher_id(self):
+        return self._teacher_id
+
+    @cached_property
+    def teacher(self):
+        if not self._teacher_id:
+            return None
+        from apps.classes.models import Teacher
+        return Teacher.objects.filter(id=self._teacher_id).first()
+
+    @property
+    def student_id(self):
+        return self._student_id
+
+    @cached_property
+    def student(self):
+        if not self._student_id:
+            return None
+        from apps.classes.models import Student
+        return Student.objects.filter(id=self._student_id).first()
+
+
+def _authz_version_key(user_id):
+    return f'users:authz_version:{user_id}'
+
+
+def _load_authz_versions(user_ids):
+    """
+    Versions keyed by str(user id); -1 caches "no usable account" so
+    repeated bad tokens stay cheap
+
+    Token claims carry ids as strings and the ORM returns UUIDs, so both
+    sides are compared as strings.
+    """
+    from django.contrib.auth import get_user_model
+    versions = {str(user_id): -1 for user_id in user_ids}
+    rows = get_user_model().objects.filter(pk__in=user_ids).values_list(
+        'pk', 'authz_version', 'is_active'
+    )
+    for pk, version, is_active in rows:
+        versions[str(pk)] = version if is_active else -1
+    return versions
+
+
+def get_authz_version(user_id):
+    """
+    Return the user's current authz_version, or None if the account is
+    missing or inactive
+
+    Served from the cache; only a cache miss reads the users table. The
+    value read on a miss is only added, never overwriting one stored by
+    refresh_authz_version() in the meantime.
+    """
+    key = _authz_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _load_authz_versions([user_id])[str(user_id)]
+        if not cache.add(key, version, AUTHZ_VERSION_CACHE_TIMEOUT):
+            cached = cache.get(key)
+            if cached is not None:
+                version = cached
+    return version if version >= 0 else None
+
+
+def refresh_authz_version(user_ids):
+    """Store the committed versions in the cache once the current transaction commits"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def store():
+        cache.set_many(
+            {_authz_version_key(user_id): version
+             for user_id, version in _load_authz_versions(user_ids).items()},
+            AUTHZ_VERSION_CACHE_TIMEOUT
+        )
+
+    transaction.on_commit(store)
+
+
+def revoke_authorization(user_ids):
+    """
+    Invalidate every token issued to these users before now
+
+    Clients get a 401 on their next request and pick up the new
+    roles through /token/refresh/.
+    """
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if not user_ids:
+        return
+
+    from django.contrib.auth import get_user_model
+    get_user_model().objects.filter(pk__in=user_ids).update(
+        authz_version=F('authz_version') + 1
+    )
+    refresh_authz_version(user_ids)
@@ -0,0 +1,84 @@
+"""
+Bulk-import user accounts (and their Student/Teacher records) from CSV or JSON lines
+"""
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.services import (
+    AccountImportService,
+    IMPORT_CHUNK_SIZE,
+    IMPORT_FORMATS,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Import users from a CSV/JSONL file. Columns: email, first_name, last_name, '
+        'password, roles (e.g. "STUDENT;TEACHER"), student_id, date_of_birth, '
+        'enrollment_date, major, employee_id, department, specialization, hire_date'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument(
+            '--format',
+            choices=IMPORT_FORMATS,
+            help='File format (defaults to the file extension)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help='Rows validated and written per transaction'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Password-hashing processes (default: CPU count)'
+        )
+        parser.add_argument(
+            '--default-role',
+            help='Role for rows that list none'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the file without writing anything'
+        )
+        parser.add_argument(
+            '--errors',
+            help='Write per-row errors to this JSONL file instead of stdout'
+        )
+    
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        
+        try:
+            service = AccountImportService(
+                chunk_size=options['chunk_size'],
+                workers=options['workers'] or os.cpu_count(),
+                dry_run=options['dry_run'],
+                default_role=options['default_role']
+            )
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                result = service.run(AccountImportService.read_rows(stream, import_format))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        
+        if options['errors']:
+            with open(options['errors'], 'w', encoding='utf-8') as out:
+                for error in result['errors']:
+                    out.write(json.dumps(error) + '\n')
+        else:
+            for error in result['errors']:
+                self.stdout.write(
+                    f"Row {error['row']} ({error['email'] or '-'}): {'; '.join(error['errors'])}"
+                )
+        
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['created']} account(s), {result['failed']} row(s) failed"
+        ))
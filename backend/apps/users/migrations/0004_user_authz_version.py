@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='authz_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_authz_version'),
+    ]
+
+    operations = [
+        # Source of auto-generated Teacher.employee_id values
+        # (see apps.users.services.RoleAssignmentService.allocate_employee_ids)
+        migrations.RunSQL(
+            sql='CREATE SEQUENCE IF NOT EXISTS teacher_employee_id_seq;',
+            reverse_sql='DROP SEQUENCE IF EXISTS teacher_employee_id_seq;',
+        ),
+    ]
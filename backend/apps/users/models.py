@@ -1,6 +1,10 @@
 import uuid
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.utils.functional import cached_property
+
+from classroom_api.search import trigram_index
+from .authorization import AuthorizationContext
 
 
 class UserManager(BaseUserManager):
@@ -29,6 +33,9 @@ class User(AbstractUser):
     username = None  # Remove username field
     mfa_secret = models.CharField(max_length=32, blank=True, null=True)
     mfa_enabled = models.BooleanField(default=False)
+    # Bumped whenever roles or the teacher profile change; access tokens
+    # carrying an older value are rejected (see apps.users.authentication)
+    authz_version = models.PositiveIntegerField(default=0, editable=False)
     
     # Note: AbstractUser provides these fields which map to your schema:
     # - password -> password_hash (Django handles hashing automatically)
@@ -42,13 +49,31 @@ class User(AbstractUser):
     
     class Meta:
         db_table = 'users_user'  # Actual table name created by Django
+        indexes = [
+            trigram_index('email', 'users_user'),
+            trigram_index('first_name', 'users_user'),
+            trigram_index('last_name', 'users_user'),
+        ]
     
     def __str__(self):
         return self.email
     
+    @cached_property
+    def authz(self):
+        """Roles and profiles for this user, loaded once per instance"""
+        return AuthorizationContext(self)
+    
+    def reset_authz(self):
+        """Forget cached roles/profiles after they change"""
+        self.__dict__.pop('authz', None)
+    
     def has_role(self, role_name):
         """Check if user has a specific role"""
-        return self.roles.filter(name=role_name).exists()
+        return self.authz.has_role(role_name)
+    
+    def has_any_role(self, *role_names):
+        """Check if user has at least one of the given roles"""
+        return self.authz.has_any_role(*role_names)
 
 
 class Role(models.Model):
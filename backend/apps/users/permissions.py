@@ -3,14 +3,14 @@ from rest_framework import permissions
 
 class IsAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.roles.filter(name='ADMIN').exists()
+        return request.user.is_authenticated and request.user.has_role('ADMIN')
 
 
 class IsTeacher(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.roles.filter(name='TEACHER').exists()
+        return request.user.is_authenticated and request.user.has_role('TEACHER')
 
 
 class IsTeacherOrAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.roles.filter(name__in=['TEACHER', 'ADMIN']).exists()
+        return request.user.is_authenticated and request.user.has_any_role('TEACHER', 'ADMIN')
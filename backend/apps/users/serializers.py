@@ -1,5 +1,10 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from .authentication import RoleClaimsRefreshToken
 from .models import User, Role
+from .services import ROLE_ACTIONS
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -51,3 +56,90 @@ class RoleSerializer(serializers.ModelSerializer):
     class Meta:
         model = Role
         fields = ('id', 'name')
+
+
+class BulkRoleUpdateSerializer(serializers.Serializer):
+    MAX_USERS = 5000
+    
+    user_ids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=MAX_USERS
+    )
+    roles = serializers.ListField(child=serializers.CharField(max_length=30))
+    action = serializers.ChoiceField(choices=ROLE_ACTIONS, default='add')
+
+
+class AccountImportRowSerializer(serializers.Serializer):
+    """One row of a bulk account import (see AccountImportService)"""
+    email = serializers.EmailField(max_length=255)
+    first_name = serializers.CharField(max_length=150, required=False)
+    last_name = serializers.CharField(max_length=150, required=False)
+    password = serializers.CharField(min_length=8, required=False)
+    roles = serializers.CharField(required=False, default='')
+    
+    # Student fields, used when roles include STUDENT
+    student_id = serializers.CharField(max_length=50, required=False)
+    date_of_birth = serializers.DateField(required=False)
+    enrollment_date = serializers.DateField(required=False)
+    major = serializers.CharField(max_length=100, required=False)
+    
+    # Teacher fields, used when roles include TEACHER
+    employee_id = serializers.CharField(max_length=50, required=False)
+    department = serializers.CharField(max_length=100, required=False)
+    specialization = serializers.CharField(max_length=100, required=False)
+    hire_date = serializers.DateField(required=False)
+    
+    def validate_email(self, value):
+        return User.objects.normalize_email(value)
+    
+    def validate_roles(self, value):
+        """Accept 'STUDENT;TEACHER' (or comma-separated) role lists"""
+        names = {name.strip().upper() for name in value.replace(',', ';').split(';') if name.strip()}
+        unknown = names - set(dict(Role.ROLE_CHOICES))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown role(s): {', '.join(sorted(unknown))}")
+        return sorted(names)
+    
+    def validate(self, data):
+        if Role.STUDENT in data['roles']:
+            missing = [
+                field for field in ('student_id', 'first_name', 'last_name')
+                if not data.get(field)
+            ]
+            if missing:
+                raise serializers.ValidationError(
+                    f"Students require {', '.join(missing)}"
+                )
+        return data
+
+
+class RoleClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh serializer that re-reads authorization claims from the DB
+    
+    Access tokens minted on refresh always carry the user's current roles,
+    so a token rejected as out of date is fixed by a single refresh.
+    """
+    token_class = RoleClaimsRefreshToken
+    
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        
+        user = User.objects.filter(
+            pk=refresh[jwt_settings.USER_ID_CLAIM],
+            is_active=True
+        ).first()
+        if user is None:
+            raise AuthenticationFailed('User not found or inactive', code='user_inactive')
+        
+        refresh.set_authorization_claims(user)
+        data = {'access': str(refresh.access_token)}
+        
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        
+        return data
@@ -1,10 +1,46 @@
 """
-Signals for automatic Teacher profile creation
+Signals for automatic Teacher profile creation and authorization revocation
 """
-from django.db.models.signals import m2m_changed
+import logging
+
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.dispatch import receiver
+from .authorization import refresh_authz_version, revoke_authorization
 from .models import User, Role
-from datetime import date
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(m2m_changed, sender=User.roles.through)
+def revoke_authorization_on_role_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Invalidate cached role sets and issued tokens when roles change
+    
+    Works from both sides of the relation: user.roles.add(role) and
+    role.users.add(user). Changes made from the Role side touch other User
+    instances, which are request-scoped and will reload on the next request.
+    """
+    if reverse:
+        # instance is a User
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.reset_authz()
+            revoke_authorization([instance.pk])
+        return
+    
+    # instance is a Role; pk_set holds user ids (None for clear)
+    if action == 'pre_clear':
+        instance._cleared_user_ids = list(instance.users.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        revoke_authorization(getattr(instance, '_cleared_user_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        revoke_authorization(pk_set or [])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def refresh_authz_version_on_user_change(sender, instance, **kwargs):
+    """Cache the new is_active/existence for token checks once committed"""
+    refresh_authz_version([instance.pk])
 
 
 @receiver(m2m_changed, sender=User.roles.through)
@@ -15,8 +51,9 @@ def create_teacher_profile_on_role_assignment(sender, instance, action, pk_set,
     This prevents the "You do not have permission" error when users with TEACHER role
     try to start sessions.
     """
-    # Only act when roles are added (not removed or cleared)
-    if action != 'post_add':
+    # Only act when roles are added (not removed or cleared) through a User;
+    # bulk assignment goes through RoleAssignmentService instead
+    if action != 'post_add' or not isinstance(instance, User):
         return
     
     # Check if TEACHER role was added
@@ -27,32 +64,19 @@ def create_teacher_profile_on_role_assignment(sender, instance, action, pk_set,
         ).exists()
         
         if teacher_role_added:
-            # Check if user already has a teacher profile
-            if not hasattr(instance, 'teacher_profile'):
-                # Import here to avoid circular imports
-                from apps.classes.models import Teacher
-                
-                # Generate employee_id from email
-                email_prefix = instance.email.split('@')[0].upper()[:10]
-                employee_id = f'EMP-{email_prefix}'
-                
-                # Make sure employee_id is unique
-                counter = 1
-                original_employee_id = employee_id
-                while Teacher.objects.filter(employee_id=employee_id).exists():
-                    employee_id = f'{original_employee_id}-{counter}'
-                    counter += 1
-                
-                # Create Teacher profile
-                Teacher.objects.create(
-                    user=instance,
-                    employee_id=employee_id,
-                    department='General',
-                    specialization='',
-                    hire_date=date.today()
+            from .services import RoleAssignmentService
+            
+            created = RoleAssignmentService.create_teacher_profiles([instance.pk])
+            if created:
+                # bulk_create skips the Teacher post_save revocation, and an
+                # earlier teacher_profile miss may be cached on the instance
+                instance._state.fields_cache.pop('teacher_profile', None)
+                instance.reset_authz()
+                revoke_authorization([instance.pk])
+                logger.info(
+                    f'Auto-created Teacher profile for {instance.email} '
+                    f'(Employee ID: {created[0].employee_id})'
                 )
-                
-                print(f'✓ Auto-created Teacher profile for {instance.email} (Employee ID: {employee_id})')
 
 
 @receiver(m2m_changed, sender=User.roles.through)
@@ -79,8 +103,8 @@ def remove_teacher_profile_on_role_removal(sender, instance, action, pk_set, **k
             still_has_teacher_role = instance.roles.filter(name='TEACHER').exists()
             
             if not still_has_teacher_role and hasattr(instance, 'teacher_profile'):
-                from apps.classes.models import Teacher
                 instance.teacher_profile.delete()
-                print(f'✓ Deleted Teacher profile for {instance.email}')
+                instance.reset_authz()
+                logger.info(f'Deleted Teacher profile for {instance.email}')
     
     pass
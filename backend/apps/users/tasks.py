@@ -0,0 +1,65 @@
+"""
+Celery tasks for account imports.
+"""
+
+import logging
+import os
+from celery import shared_task
+
+from .services import AccountImportService
+
+logger = logging.getLogger(__name__)
+
+# 20k accounts at ~0.3s per PBKDF2 hash need well over the default limit
+# on small workers
+IMPORT_TIME_LIMIT = 4 * 60 * 60
+
+
+@shared_task(bind=True, max_retries=0, time_limit=IMPORT_TIME_LIMIT)
+def import_accounts_task(self, path: str, import_format: str, dry_run: bool = False,
+                         default_role: str = None):
+    """
+    Celery task to import accounts from a stored upload.
+
+    Routed to the 'imports' queue, whose worker runs with --pool=solo: the
+    password-hashing process pool forks, which prefork pool children (being
+    daemonic) may not do. While running, the task state is PROGRESS with
+    the created/failed counts so far.
+
+    Args:
+        path: File saved by AccountImportService.store_upload(); deleted afterwards
+        import_format: 'csv' or 'jsonl'
+        dry_run: Validate only, write nothing
+        default_role: Role given to rows that list none
+
+    Returns:
+        dict: {'created': int, 'failed': int, 'errors': [{'row', 'email', 'errors'}]}
+    """
+    def report_progress(result):
+        self.update_state(state='PROGRESS', meta={
+            'created': result['created'],
+            'failed': result['failed'],
+        })
+
+    try:
+        service = AccountImportService(
+            workers=os.cpu_count(),
+            dry_run=dry_run,
+            default_role=default_role
+        )
+        with open(path, encoding='utf-8-sig', newline='') as stream:
+            result = service.run(
+                AccountImportService.read_rows(stream, import_format),
+                progress_callback=report_progress
+            )
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            logger.warning(f"Could not remove import file {path}")
+
+    logger.info(
+        f"Account import {self.request.id}: {result['created']} created, "
+        f"{result['failed']} failed"
+    )
+    return result
@@ -10,8 +10,11 @@ from .views import (
     MFADisableView,
     RoleViewSet,
     UserListView,
+    UserStatsView,
     UpdateUserRolesView,
     DeleteUserView,
+    UserImportView,
+    UserImportStatusView,
 )
 
 router = DefaultRouter()
@@ -26,7 +29,11 @@ urlpatterns = [
     path('mfa/verify/', MFAVerifyView.as_view(), name='mfa-verify'),
     path('mfa/disable/', MFADisableView.as_view(), name='mfa-disable'),
     path('list/', UserListView.as_view(), name='user-list'),
+    path('list/stats/', UserStatsView.as_view(), name='user-stats'),
     path('<uuid:user_id>/update-roles/', UpdateUserRolesView.as_view(), name='update-user-roles'),
+    path('import/', UserImportView.as_view(), name='user-import'),
+    path('import/<str:task_id>/', UserImportStatusView.as_view(), name='user-import-status'),
+    path('bulk-update-roles/', UpdateUserRolesView.as_view(), name='bulk-update-user-roles'),
     path('<uuid:user_id>/delete/', DeleteUserView.as_view(), name='delete-user'),
     path('', include(router.urls)),
 ]
@@ -1,23 +1,38 @@
-from rest_framework import status, permissions
+from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
-from rest_framework_simplejwt.tokens import RefreshToken
+from celery.result import AsyncResult
 from django.contrib.auth import authenticate
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import Count, Q, Value, prefetch_related_objects
+from .authentication import RoleClaimsRefreshToken
 from .models import User, Role
 from .serializers import (
     UserSerializer, 
     RegisterSerializer, 
     MFASetupSerializer, 
     MFAVerifySerializer,
-    RoleSerializer
+    RoleSerializer,
+    BulkRoleUpdateSerializer,
 )
+from .services import AccountImportService, IMPORT_FORMATS, RoleAssignmentService
+from .tasks import import_accounts_task
+from classroom_api.exports import get_export_format, stream_queryset
+from classroom_api.pagination import EstimatedCountPagination
 import pyotp
-import io
+import os
 import base64
 
 
+USER_EXPORT_FIELDS = [
+    'id', 'email', 'first_name', 'last_name', 'role_names',
+    'is_active', 'mfa_enabled', 'date_joined'
+]
+
+
 class RegisterView(APIView):
     permission_classes = [permissions.AllowAny]
     
@@ -25,7 +40,7 @@ class RegisterView(APIView):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = RoleClaimsRefreshToken.for_user(user)
             return Response({
                 'user': {
                     'id': str(user.id),
@@ -78,7 +93,7 @@ class LoginView(APIView):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
         
-        refresh = RefreshToken.for_user(user)
+        refresh = RoleClaimsRefreshToken.for_user(user)
         return Response({
             'user': {
                 'id': str(user.id),
@@ -175,11 +190,47 @@ class RoleViewSet(ModelViewSet):
     http_method_names = ['get', 'post']
 
 
-class UserListView(APIView):
-    """List all users - Admin only"""
+class UserListView(generics.ListAPIView):
+    """
+    User directory - Admin only
+    
+    Query params:
+    - limit/offset: page through the directory (unpaginated without ?limit=)
+    - search: match email, first or last name (trigram-indexed)
+    - role: only users holding any of these roles (comma-separated or repeated)
+    - is_active: true/false
+    - export=csv|jsonl: stream every matching account instead
+    """
+    serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EstimatedCountPagination
+    search_fields = ['email', 'first_name', 'last_name']
     
-    def get(self, request):
+    def get_queryset(self):
+        queryset = User.objects.order_by('email')
+        params = self.request.query_params
+        
+        role_names = [
+            name.strip().upper()
+            for value in params.getlist('role')
+            for name in value.split(',')
+            if name.strip()
+        ]
+        if role_names:
+            # Subquery instead of a join, so no DISTINCT is needed
+            queryset = queryset.filter(
+                id__in=User.roles.through.objects.filter(
+                    role__name__in=role_names
+                ).values('user_id')
+            )
+        
+        is_active = params.get('is_active')
+        if is_active is not None:
+            queryset = queryset.filter(is_active=is_active.lower() in ('1', 'true', 'yes'))
+        
+        return queryset
+    
+    def list(self, request, *args, **kwargs):
         # Check if user is admin
         if not request.user.has_role('ADMIN'):
             return Response(
@@ -187,13 +238,65 @@ class UserListView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        users = User.objects.all()
-        serializer = UserSerializer(users, many=True)
+        try:
+            export_format = get_export_format(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        if export_format:
+            users = queryset.annotate(
+                role_names=ArrayAgg(
+                    'roles__name',
+                    filter=Q(roles__isnull=False),
+                    distinct=True,
+                    default=Value([])
+                )
+            )
+            return stream_queryset(users, USER_EXPORT_FIELDS, export_format, 'users')
+        
+        # Roles are loaded for the current page only, in one extra query
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            prefetch_related_objects(page, 'roles')
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        
+        serializer = self.get_serializer(queryset.prefetch_related('roles'), many=True)
         return Response(serializer.data)
 
 
+class UserStatsView(APIView):
+    """Directory totals for the admin panel - Admin only"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        # Check if user is admin
+        if not request.user.has_role('ADMIN'):
+            return Response(
+                {'detail': 'Admin access required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        totals = User.objects.aggregate(
+            total=Count('id'),
+            mfa_enabled=Count('id', filter=Q(mfa_enabled=True)),
+            active=Count('id', filter=Q(is_active=True))
+        )
+        totals['by_role'] = dict(
+            Role.objects.annotate(user_count=Count('users')).values_list('name', 'user_count')
+        )
+        return Response(totals)
+
+
 class UpdateUserRolesView(APIView):
-    """Update user roles - Admin only"""
+    """
+    Update user roles - Admin only
+    
+    PATCH /users/<id>/update-roles/ replaces one user's roles.
+    POST /users/bulk-update-roles/ adds, removes or sets roles for many
+    users at once: {"user_ids": [...], "roles": [...], "action": "add"}
+    """
     permission_classes = [permissions.IsAuthenticated]
     
     def patch(self, request, user_id):
@@ -214,22 +317,147 @@ class UpdateUserRolesView(APIView):
         
         role_names = request.data.get('roles', [])
         
-        # Clear existing roles
-        user.roles.clear()
-        
-        # Add new roles
-        for role_name in role_names:
-            try:
-                role = Role.objects.get(name=role_name)
-                user.roles.add(role)
-            except Role.DoesNotExist:
-                return Response(
-                    {'detail': f'Role {role_name} not found'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        try:
+            RoleAssignmentService.update_roles([user.id], role_names, action='set')
+        except ValueError as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         serializer = UserSerializer(user)
         return Response(serializer.data)
+    
+    def post(self, request, user_id=None):
+        # Check if user is admin
+        if not request.user.has_role('ADMIN'):
+            return Response(
+                {'detail': 'Admin access required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        if user_id is not None:
+            return Response(
+                {'detail': 'Use PATCH to update a single user'},
+                status=status.HTTP_405_METHOD_NOT_ALLOWED
+            )
+        
+        serializer = BulkRoleUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            updated = RoleAssignmentService.update_roles(
+                serializer.validated_data['user_ids'],
+                serializer.validated_data['roles'],
+                action=serializer.validated_data['action']
+            )
+        except ValueError as e:
+            return Response(
+                {'detail': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            'message': f'Updated roles for {updated} user(s)',
+            'updated_count': updated,
+        })
+
+
+class UserImportView(APIView):
+    """
+    Bulk-import accounts from an uploaded CSV or JSONL file - Admin only
+    
+    multipart fields: file, format (csv|jsonl, default from the file name),
+    default_role, dry_run. The file is stored and imported by
+    import_accounts_task with the same pipeline as `manage.py import_accounts`;
+    responds 202 with a task_id to poll at UserImportStatusView.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+    
+    def post(self, request):
+        # Check if user is admin
+        if not request.user.has_role('ADMIN'):
+            return Response(
+                {'detail': 'Admin access required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': 'file is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        import_format = (
+            request.data.get('format') or os.path.splitext(upload.name)[1].lstrip('.')
+        ).lower()
+        if import_format not in IMPORT_FORMATS:
+            return Response(
+                {'error': f"Unsupported import format '{import_format}'. "
+                          f"Use one of: {', '.join(IMPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        default_role = request.data.get('default_role') or None
+        
+        try:
+            # Validates default_role before anything is queued
+            AccountImportService(dry_run=dry_run, default_role=default_role)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        path = AccountImportService.store_upload(upload, import_format)
+        try:
+            task = import_accounts_task.delay(
+                path, import_format, dry_run=dry_run, default_role=default_role
+            )
+        except Exception:
+            os.remove(path)
+            raise
+        
+        return Response({
+            'message': 'Account import queued',
+            'task_id': task.id,
+            'status': 'queued'
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class UserImportStatusView(APIView):
+    """
+    Poll an account import - Admin only
+    
+    status is queued, running (with created/failed so far), completed (with
+    the per-row errors) or failed (with the error that stopped the import).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, task_id):
+        if not request.user.has_role('ADMIN'):
+            return Response(
+                {'detail': 'Admin access required'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        result = AsyncResult(task_id)
+        if result.name and result.name != import_accounts_task.name:
+            return Response(
+                {'error': 'Import not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        data = {'task_id': task_id}
+        if result.state == 'SUCCESS':
+            data.update(status='completed', **result.result)
+        elif result.state == 'FAILURE':
+            data.update(status='failed', error=str(result.result))
+        elif result.state in ('STARTED', 'PROGRESS'):
+            data.update(status='running', **(result.info or {}))
+        else:
+            data.update(status='queued')
+        return Response(data)
 
 
 class DeleteUserView(APIView):
@@ -0,0 +1,175 @@
+"""
+File download helpers
+
+Serves stored files so that large transfers do not occupy a Django worker:
+- With SENDFILE_BACKEND set, the response only carries headers and the
+  front proxy sends the file itself (nginx X-Accel-Redirect, or
+  X-Sendfile for Apache/lighttpd). The proxy then handles Range and
+  conditional requests.
+- Otherwise the file is streamed from Django with ETag/Last-Modified,
+  conditional GET (304) and single-range (206) support.
+
+Files stored gzip-compressed (*.gz) are sent as-is with
+Content-Encoding: gzip to clients that accept it, and decompressed on the
+fly for the rare client that does not. nginx keeps only a few upstream
+headers on X-Accel-Redirect, so its internal location must set
+Content-Encoding itself, e.g.:
+
+    location /protected/media/ {
+        internal;
+        alias /app/media/;
+        location ~ \\.gz$ { add_header Content-Encoding gzip; }
+    }
+"""
+import gzip
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+SENDFILE_HEADERS = {
+    'x-accel-redirect': 'X-Accel-Redirect',
+    'x-sendfile': 'X-Sendfile',
+}
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _accepts_gzip(request):
+    return 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+
+def _read_chunks(file_handle, length=None):
+    """Yield up to length bytes (or the rest of the file) in chunks"""
+    try:
+        while length is None or length > 0:
+            size = DOWNLOAD_CHUNK_SIZE if length is None else min(DOWNLOAD_CHUNK_SIZE, length)
+            chunk = file_handle.read(size)
+            if not chunk:
+                break
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+    finally:
+        file_handle.close()
+
+
+def _parse_range(header, size):
+    """
+    Return (start, end) for a single satisfiable byte range, or None
+
+    Multi-range requests are answered with the whole file, which RFC 9110
+    allows.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        start = max(0, size - int(last))
+        end = size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+
+    if start > end or start >= size:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _offload_path(path):
+    """URL for the proxy's internal location, or None if path is not under MEDIA_ROOT"""
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([media_root, real_path]) != media_root:
+        return None
+    relative = os.path.relpath(real_path, media_root)
+    return settings.SENDFILE_URL_PREFIX.rstrip('/') + '/' + quote(relative.replace(os.sep, '/'))
+
+
+def file_download_response(request, path, filename, content_type):
+    """
+    Build a download response for a stored file
+
+    Args:
+        request: The incoming request
+        path: Absolute path of the stored file; *.gz files are gzip-compressed
+        filename: Download filename (of the uncompressed content)
+        content_type: Content type of the uncompressed content
+
+    Returns:
+        HttpResponse or StreamingHttpResponse
+    """
+    gzipped = path.endswith('.gz')
+    stat = os.stat(path)
+    etag = quote_etag(f"{int(stat.st_mtime):x}-{stat.st_size:x}")
+    last_modified = http_date(stat.st_mtime)
+
+    def with_headers(response):
+        response['Content-Type'] = content_type
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['ETag'] = etag
+        response['Last-Modified'] = last_modified
+        response['Cache-Control'] = 'private, max-age=0, must-revalidate'
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    # Compressed files for a client that cannot take gzip: decompress here.
+    # The representation differs from the stored bytes, so no ETag or Range.
+    if gzipped and not _accepts_gzip(request):
+        response = StreamingHttpResponse(_read_chunks(gzip.open(path, 'rb')))
+        response['Content-Type'] = content_type
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=stat.st_mtime)
+    if conditional is not None:
+        return with_headers(conditional)
+
+    header = SENDFILE_HEADERS.get(settings.SENDFILE_BACKEND)
+    if header:
+        target = _offload_path(path) if header == 'X-Accel-Redirect' else path
+        if target:
+            response = with_headers(HttpResponse())
+            response[header] = target
+            if gzipped:
+                response['Content-Encoding'] = 'gzip'
+            return response
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or etag in parse_etags(if_range) or if_range == last_modified):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file_handle = open(path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        file_handle.seek(start)
+        response = StreamingHttpResponse(_read_chunks(file_handle, end - start + 1), status=206)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = StreamingHttpResponse(_read_chunks(file_handle))
+        response['Content-Length'] = str(size)
+
+    response['Accept-Ranges'] = 'bytes'
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    return with_headers(response)
@@ -0,0 +1,117 @@
+"""
+Project-wide pagination classes
+
+Pagination is opt-in per request so existing clients that expect plain
+lists keep working:
+- LimitOffsetPagination (the default) only paginates when ?limit= is sent
+- EstimatedCountPagination does the same but answers `count` from the
+  planner's reltuples estimate for very large unfiltered tables
+- CursorPagination variants paginate when ?cursor= or ?page_size= is sent,
+  giving stable O(1) pages over append-heavy tables
+
+Views opt in to a style with `pagination_class = ...`.
+"""
+from django.db import connections
+from rest_framework import pagination
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class LimitOffsetPagination(pagination.LimitOffsetPagination):
+    """Limit/offset pagination, active only when the client sends ?limit="""
+    default_limit = None
+    max_limit = MAX_PAGE_SIZE
+
+
+class EstimatedCountPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination that avoids COUNT(*) on huge unfiltered tables
+
+    When the queryset has no WHERE clause and pg_class.reltuples says the
+    table holds at least `estimate_threshold` rows, that estimate is
+    returned as `count` and the response carries `count_is_estimate: true`.
+    Filtered querysets are always counted exactly.
+    """
+    estimate_threshold = 100_000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_is_estimate = False
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_count(self, queryset):
+        if self._is_unfiltered(queryset):
+            estimate = self._estimate_rows(queryset)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                self.count_is_estimate = True
+                return estimate
+        return super().get_count(queryset)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_is_estimate'] = self.count_is_estimate
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count_is_estimate'] = {'type': 'boolean'}
+        return schema
+
+    @staticmethod
+    def _is_unfiltered(queryset):
+        query = getattr(queryset, 'query', None)
+        return (
+            query is not None
+            and not query.where
+            and not query.distinct
+            and not query.combinator
+            and query.low_mark == 0
+            and query.high_mark is None
+        )
+
+    @staticmethod
+    def _estimate_rows(queryset):
+        """Return the planner's row estimate for the queryset's table"""
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+
+        # reltuples is -1 for tables that were never analyzed
+        if not row or row[0] < 0:
+            return None
+        return row[0]
+
+
+class CursorPagination(pagination.CursorPagination):
+    """
+    Cursor pagination, active only when ?cursor= or ?page_size= is sent
+
+    Subclasses set `ordering` to an indexed, effectively unique column.
+    """
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+
+    def get_page_size(self, request):
+        page_size = super().get_page_size(request)
+        if page_size is None and request.query_params.get(self.cursor_query_param):
+            return DEFAULT_PAGE_SIZE
+        return page_size
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """Newest-first cursor pages for models with a created_at column"""
+    ordering = '-created_at'
+
+
+class StartTimeCursorPagination(CursorPagination):
+    """Newest-first cursor pages for class sessions"""
+    ordering = '-start_time'
@@ -0,0 +1,103 @@
+"""
+Index-backed search filter
+
+DRF's SearchFilter ORs every search field into one WHERE clause, joining
+related tables as it goes. Postgres cannot use per-table indexes for an OR
+that spans a join, so it falls back to sequential scans. This backend keeps
+the same `search_fields` syntax but rewrites one-hop relation lookups into
+`fk IN (SELECT pk ...)` subqueries, so every branch can be answered from the
+pg_trgm GIN indexes declared on the models.
+"""
+from collections import defaultdict
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import Upper
+from rest_framework.filters import SearchFilter
+
+
+def trigram_index(field_name, table):
+    """
+    GIN trigram index matching the UPPER(col) LIKE UPPER('%term%') SQL that
+    Django emits for icontains/istartswith on Postgres
+    """
+    return GinIndex(
+        OpClass(Upper(field_name), name='gin_trgm_ops'),
+        name=f'{table}_{field_name}_trgm'
+    )
+
+
+def prefix_index(field_name, table):
+    """B-tree index serving istartswith (autocomplete) lookups"""
+    return models.Index(
+        OpClass(Upper(field_name), name='text_pattern_ops'),
+        name=f'{table}_{field_name}_prefix'
+    )
+
+
+class IndexedSearchFilter(SearchFilter):
+    """SearchFilter variant that keeps each OR branch on a single table"""
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = self.get_search_fields(view, request)
+        search_terms = self.get_search_terms(request)
+
+        if not search_fields or not search_terms:
+            return queryset
+
+        model = queryset.model
+        lookups = [self.construct_search(str(field)) for field in search_fields]
+
+        for term in search_terms:
+            local = Q()
+            related = defaultdict(Q)
+
+            for lookup in lookups:
+                parts = lookup.split(LOOKUP_SEP)
+                field = self._forward_relation(model, parts[0]) if len(parts) == 3 else None
+
+                if field is not None:
+                    related[field] |= Q(**{LOOKUP_SEP.join(parts[1:]): term})
+                else:
+                    local |= Q(**{lookup: term})
+
+            condition = local
+            for field, related_condition in related.items():
+                matching = field.related_model._default_manager.filter(
+                    related_condition
+                ).values('pk')
+                condition |= Q(**{f'{field.name}__in': matching})
+
+            queryset = queryset.filter(condition)
+
+        return queryset
+
+    @staticmethod
+    def _forward_relation(model, name):
+        """Return the ForeignKey/OneToOneField called `name`, if there is one"""
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+        if field.is_relation and (field.many_to_one or field.one_to_one) and field.concrete:
+            return field
+        return None
+
+
+def create_trigram_extension(sender, using, **kwargs):
+    """
+    Make sure pg_trgm exists before any migration creates gin_trgm_ops indexes
+
+    Connected to pre_migrate so it runs ahead of every app's migrations,
+    including test database setup.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm;')
@@ -33,6 +33,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
@@ -114,11 +115,17 @@ AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.RoleClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_FILTER_BACKENDS': [
+        'classroom_api.search.IndexedSearchFilter',
+    ],
+    # Opt-in: lists are only paginated when the client sends ?limit=
+    # (see classroom_api/pagination.py for the cursor and estimated-count styles)
+    'DEFAULT_PAGINATION_CLASS': 'classroom_api.pagination.LimitOffsetPagination',
 }
 
 SIMPLE_JWT = {
@@ -129,6 +136,16 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    # Re-reads role claims on refresh (see apps/users/authentication.py)
+    'TOKEN_REFRESH_SERIALIZER': 'apps.users.serializers.RoleClaimsTokenRefreshSerializer',
+}
+
+# Shared cache; holds the per-user authz_version that JWT revocation checks
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f"redis://{os.getenv('REDIS_HOST', 'redis')}:{os.getenv('REDIS_PORT', '6379')}/1",
+    }
 }
 
 CORS_ALLOWED_ORIGINS = [
@@ -142,6 +159,31 @@ CORS_ALLOW_CREDENTIALS = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Report downloads: '' streams files from Django; 'x-accel-redirect' (nginx)
+# or 'x-sendfile' (Apache/lighttpd) hands the transfer to the front proxy.
+# See classroom_api/downloads.py for the matching nginx location.
+SENDFILE_BACKEND = os.getenv('SENDFILE_BACKEND', '').lower()
+SENDFILE_URL_PREFIX = os.getenv('SENDFILE_URL_PREFIX', '/protected/media/')
+
+# Report retention: files are deleted this many days after completion (and
+# regenerated if requested again); the rows of expired and failed reports
+# are deleted after REPORT_ROW_RETENTION_DAYS.
+REPORT_RETENTION_DAYS = {
+    'STUDENT': 30,
+    'CLASS': 30,
+    'MATRIX': 30,
+    'INSTITUTION': 7,
+    'BUNDLE': 7,
+}
+REPORT_ROW_RETENTION_DAYS = 180
+# Per-user cap on stored report bytes; the oldest files are expired first
+REPORT_STORAGE_QUOTA_BYTES = int(os.getenv('REPORT_STORAGE_QUOTA_MB', '500')) * 1024 * 1024
+# Report subscriptions are generated from this local hour, at most this many
+# at a time, and emailed as links to SITE_URL
+REPORT_SUBSCRIPTION_HOUR = int(os.getenv('REPORT_SUBSCRIPTION_HOUR', '1'))
+REPORT_SUBSCRIPTION_CONCURRENCY = int(os.getenv('REPORT_SUBSCRIPTION_CONCURRENCY', '4'))
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:8000')
+
 # Celery Configuration
 CELERY_BROKER_URL = f"redis://{os.getenv('REDIS_HOST', 'redis')}:{os.getenv('REDIS_PORT', '6379')}/0"
 CELERY_RESULT_BACKEND = 'django-db'
@@ -153,6 +195,11 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_RESULT_EXTENDED = True
+# Account imports fork a password-hashing pool, which prefork pool children
+# cannot do; they run on their own worker (see docker-compose celery-imports)
+CELERY_TASK_ROUTES = {
+    'apps.users.tasks.import_accounts_task': {'queue': 'imports'},
+}
 
 # Celery Beat Schedule
 from celery.schedules import crontab
@@ -167,6 +214,15 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': crontab(hour=9, minute=0, day_of_week='monday'),  # Every Monday at 9 AM
         'kwargs': {'threshold': 75.0}
     },
+    'cleanup-expired-reports': {
+        'task': 'apps.reports.tasks.cleanup_expired_reports_task',
+        'schedule': crontab(minute=30),  # Every hour
+    },
+    'generate-subscribed-reports': {
+        'task': 'apps.reports.tasks.generate_subscribed_reports_task',
+        # Every 15 minutes; subscriptions only fall due at REPORT_SUBSCRIPTION_HOUR
+        'schedule': crontab(minute='*/15'),
+    },
     'cleanup-old-notifications': {
         'task': 'apps.notifications.tasks.cleanup_old_notifications_task',
         'schedule': crontab(hour=2, minute=0, day_of_week='monday'),  # Every Monday at 2 AM
@@ -84,6 +84,22 @@ export const studentService = {
     return response.data;
   },
 
+  // Server-side search across student ID, name and email
+  search: async (term, classId = null) => {
+    const params = { search: term };
+    if (classId) params.class_id = classId;
+    const response = await api.get('/classes/students/', { params });
+    return response.data;
+  },
+
+  // Prefix autocomplete for roster pickers
+  autocomplete: async (query, classId = null, limit = 10) => {
+    const params = { q: query, limit };
+    if (classId) params.class_id = classId;
+    const response = await api.get('/classes/students/autocomplete/', { params });
+    return response.data;
+  },
+
   // Get single student by ID
   getById: async (id) => {
     const response = await api.get(`/classes/students/${id}/`);
@@ -141,6 +157,32 @@ export const enrollmentService = {
     });
     return response.data;
   },
+
+  // Enroll many students at once (UUIDs or student_id codes)
+  bulkEnroll: async (classId, students) => {
+    const response = await api.post(`/classes/classes/${classId}/bulk-enroll/`, {
+      students,
+    });
+    return response.data;
+  },
+
+  // Enroll students from a CSV file with a student_id column
+  bulkEnrollCsv: async (classId, file) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    const response = await api.post(`/classes/classes/${classId}/bulk-enroll/`, formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    });
+    return response.data;
+  },
+
+  // Unenroll many students at once
+  bulkUnenroll: async (classId, students) => {
+    const response = await api.post(`/classes/classes/${classId}/bulk-unenroll/`, {
+      students,
+    });
+    return response.data;
+  },
 };
 
 export default {
@@ -18,7 +18,7 @@ const notificationsService = {
   /**
    * Trigger low attendance alerts
    * @param {number} threshold - Attendance threshold percentage (0-100)
-   * @returns {Promise} Response with message, count, notification_ids, and students_alerted
+   * @returns {Promise} Response with message, task_id, threshold and status
    */
   async triggerLowAttendanceAlerts(threshold = 75.0) {
     const response = await api.post('/notifications/trigger-low-attendance-alert/', {
@@ -4,6 +4,9 @@
  */
 import api from './axios';
 
+// Give up polling after this long; the worker's own time limit is 30 minutes
+const REPORT_WAIT_TIMEOUT_MS = 10 * 60 * 1000;
+
 export const reportsService = {
   /**
    * Generate a new report
@@ -14,7 +17,7 @@ export const reportsService = {
    * @param {string} data.start_date - YYYY-MM-DD
    * @param {string} data.end_date - YYYY-MM-DD
    * @param {string} data.format - 'csv' or 'pdf' (default: 'csv')
-   * @returns {Promise} Report metadata with download_url
+   * @returns {Promise} Queued report metadata (status PENDING) with status_url
    */
   async generateReport(data) {
     const response = await api.post('/reports/generate/', data);
@@ -22,23 +25,97 @@ export const reportsService = {
   },
 
   /**
-   * List all reports for the current user
-   * @returns {Promise} Array of report metadata
+   * Queue class reports for every matching class, zipped into one bundle (admin only)
+   * @param {Object} data - At least one of academic_year, semester, department, subject_id,
+   *   plus start_date, end_date and format ('csv' or 'parquet')
+   * @returns {Promise} Queued bundle report metadata with status_url
+   */
+  async generateBundle(data) {
+    const response = await api.post('/reports/bundles/', data);
+    return response.data;
+  },
+
+  /**
+   * Get generation status and progress of a report
+   * @param {string} reportId - UUID of the report
+   * @returns {Promise} { id, status, progress, error_message, download_url }
    */
-  async listReports() {
-    const response = await api.get('/reports/');
+  async getReportStatus(reportId) {
+    const response = await api.get(`/reports/${reportId}/status/`);
     return response.data;
   },
 
   /**
-   * Download a generated report
+   * Poll a report until it is COMPLETED or FAILED
+   * @param {string} reportId - UUID of the report
+   * @param {Function} onProgress - Optional callback receiving each status payload
+   * @param {number} intervalMs - Delay between polls
+   * @param {number} timeoutMs - Stop polling after this long
+   * @returns {Promise} Final status payload; rejects if generation failed or timed out
+   */
+  async waitForReport(reportId, onProgress = null, intervalMs = 1500, timeoutMs = REPORT_WAIT_TIMEOUT_MS) {
+    const deadline = Date.now() + timeoutMs;
+    for (;;) {
+      const reportStatus = await this.getReportStatus(reportId);
+      if (onProgress) onProgress(reportStatus);
+
+      if (reportStatus.status === 'COMPLETED') return reportStatus;
+      if (reportStatus.status === 'FAILED') {
+        throw new Error(reportStatus.error_message || 'Report generation failed');
+      }
+      if (Date.now() + intervalMs > deadline) {
+        throw new Error(
+          `Report is still ${reportStatus.status.toLowerCase()} after ${Math.round(timeoutMs / 60000)} minutes; ` +
+          'check the reports list later'
+        );
+      }
+
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  },
+
+  /**
+   * List reports for the current user, newest first
+   * @param {Object} params - Optional filters and paging
+   * @param {string} params.status - e.g. 'COMPLETED'
+   * @param {string} params.report_type - e.g. 'CLASS'
+   * @param {number} params.page_size - Return one cursor page of this size
+   * @returns {Promise} Array of report metadata, or { next, previous, results } when paged
+   */
+  async listReports(params = {}) {
+    const response = await api.get('/reports/', { params });
+    return response.data;
+  },
+
+  /**
+   * Download a generated report, waiting for regeneration if it had expired
    * @param {string} reportId - UUID of the report
    * @returns {Promise} Blob data for file download
    */
   async downloadReport(reportId) {
-    const response = await api.get(`/reports/${reportId}/download/`, {
+    const request = () => api.get(`/reports/${reportId}/download/`, {
       responseType: 'blob', // Important for file download
     });
+    const response = await request();
+
+    // Expired reports answer 202 and are generated again under the same ID
+    if (response.status === 202) {
+      await this.waitForReport(reportId);
+      return request();
+    }
+    return response;
+  },
+
+  /**
+   * Stream a report straight from the database without queueing it
+   * @param {Object} params - Same parameters as generateReport
+   * @returns {Promise} Blob data for file download
+   */
+  async exportReport(params) {
+    const response = await api.get('/reports/export/', {
+      params,
+      responseType: 'blob',
+    });
     return response;
   },
 
@@ -80,7 +157,8 @@ export const reportsService = {
         format: 'csv'
       });
 
-      // Download the file
+      // Wait for the background job, then download the file
+      await this.waitForReport(report.id);
       const response = await this.downloadReport(report.id);
       
       // Trigger download with proper filename
@@ -116,7 +194,8 @@ export const reportsService = {
         format: 'csv'
       });
 
-      // Download the file
+      // Wait for the background job, then download the file
+      await this.waitForReport(report.id);
       const response = await this.downloadReport(report.id);
       
       // Trigger download with proper filename
@@ -2,29 +2,62 @@ import { useState, useEffect } from 'react';
 import axiosInstance from '../api/axios';
 import { useAuth } from '../auth/AuthContext';
 
+const PAGE_SIZE = 50;
+
 const AdminPanel = () => {
   const { hasRole } = useAuth();
   const [users, setUsers] = useState([]);
+  const [totalUsers, setTotalUsers] = useState(0);
+  const [stats, setStats] = useState({ total: 0, mfa_enabled: 0, by_role: {} });
   const [roles, setRoles] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
   const [selectedUser, setSelectedUser] = useState(null);
   const [showModal, setShowModal] = useState(false);
+  const [search, setSearch] = useState('');
+  const [debouncedSearch, setDebouncedSearch] = useState('');
+  const [roleFilter, setRoleFilter] = useState('');
+  const [page, setPage] = useState(0);
 
   useEffect(() => {
-    fetchData();
+    fetchRolesAndStats();
   }, []);
 
-  const fetchData = async () => {
+  // Wait for typing to pause before querying the directory
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      setDebouncedSearch(search.trim());
+      setPage(0);
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [search]);
+
+  useEffect(() => {
+    fetchUsers();
+  }, [debouncedSearch, roleFilter, page]);
+
+  const fetchUsers = async () => {
     setLoading(true);
     setError('');
-    
+
     try {
-      // Fetch users
-      const usersResponse = await axiosInstance.get('/users/list/');
-      setUsers(usersResponse.data);
+      const params = { limit: PAGE_SIZE, offset: page * PAGE_SIZE };
+      if (debouncedSearch) params.search = debouncedSearch;
+      if (roleFilter) params.role = roleFilter;
+
+      const usersResponse = await axiosInstance.get('/users/list/', { params });
+      setUsers(usersResponse.data.results);
+      setTotalUsers(usersResponse.data.count);
+    } catch (err) {
+      setError('Failed to load users: ' + (err.response?.data?.detail || err.message));
+    } finally {
+      setLoading(false);
+    }
+  };
 
+  const fetchRolesAndStats = async () => {
+    try {
       // Fetch available roles
       const rolesResponse = await axiosInstance.get('/users/roles/');
       // Filter out lowercase "teacher" role, keep only "TEACHER"
@@ -32,13 +65,20 @@ const AdminPanel = () => {
         role.name !== 'teacher'
       );
       setRoles(filteredRoles);
+
+      const statsResponse = await axiosInstance.get('/users/list/stats/');
+      setStats(statsResponse.data);
     } catch (err) {
       setError('Failed to load data: ' + (err.response?.data?.detail || err.message));
-    } finally {
-      setLoading(false);
     }
   };
 
+  const fetchData = async () => {
+    await Promise.all([fetchUsers(), fetchRolesAndStats()]);
+  };
+
+  const pageCount = Math.max(1, Math.ceil(totalUsers / PAGE_SIZE));
+
   const handleEditRoles = (user) => {
     setSelectedUser(user);
     setShowModal(true);
@@ -142,8 +182,30 @@ const AdminPanel = () => {
 
       {/* Users Table */}
       <div className="bg-white rounded-lg shadow-md overflow-hidden">
-        <div className="px-6 py-4 border-b border-gray-200 bg-gray-50">
+        <div className="px-6 py-4 border-b border-gray-200 bg-gray-50 flex flex-wrap items-center justify-between gap-4">
           <h2 className="text-xl font-semibold text-gray-900">User Management</h2>
+          <div className="flex gap-3">
+            <input
+              type="search"
+              value={search}
+              onChange={(e) => setSearch(e.target.value)}
+              placeholder="Search name or email..."
+              className="px-3 py-2 border border-gray-300 rounded-lg text-sm focus:ring-purple-500 focus:border-purple-500"
+            />
+            <select
+              value={roleFilter}
+              onChange={(e) => {
+                setRoleFilter(e.target.value);
+                setPage(0);
+              }}
+              className="px-3 py-2 border border-gray-300 rounded-lg text-sm focus:ring-purple-500 focus:border-purple-500"
+            >
+              <option value="">All roles</option>
+              {roles.map((role) => (
+                <option key={role.name} value={role.name}>{role.name}</option>
+              ))}
+            </select>
+          </div>
         </div>
 
         {loading && !showModal ? (
@@ -243,6 +305,32 @@ const AdminPanel = () => {
             </table>
           </div>
         )}
+
+        {/* Pagination */}
+        <div className="px-6 py-3 border-t border-gray-200 bg-gray-50 flex items-center justify-between text-sm text-gray-600">
+          <span>
+            {totalUsers === 0
+              ? 'No matching users'
+              : `Showing ${page * PAGE_SIZE + 1}-${Math.min((page + 1) * PAGE_SIZE, totalUsers)} of ${totalUsers}`}
+          </span>
+          <div className="flex gap-2">
+            <button
+              onClick={() => setPage(page - 1)}
+              disabled={page === 0 || loading}
+              className="px-3 py-1 border border-gray-300 rounded-lg disabled:opacity-50"
+            >
+              Previous
+            </button>
+            <span className="px-2 py-1">Page {page + 1} of {pageCount}</span>
+            <button
+              onClick={() => setPage(page + 1)}
+              disabled={page + 1 >= pageCount || loading}
+              className="px-3 py-1 border border-gray-300 rounded-lg disabled:opacity-50"
+            >
+              Next
+            </button>
+          </div>
+        </div>
       </div>
 
       {/* Role Management Modal */}
@@ -316,18 +404,18 @@ const AdminPanel = () => {
       <div className="grid grid-cols-1 md:grid-cols-3 gap-6 mt-6">
         <div className="bg-white rounded-lg shadow-md p-6">
           <h3 className="text-sm font-semibold text-gray-600 uppercase mb-2">Total Users</h3>
-          <p className="text-3xl font-bold text-purple-600">{users.length}</p>
+          <p className="text-3xl font-bold text-purple-600">{stats.total}</p>
         </div>
         <div className="bg-white rounded-lg shadow-md p-6">
           <h3 className="text-sm font-semibold text-gray-600 uppercase mb-2">Teachers</h3>
           <p className="text-3xl font-bold text-purple-600">
-            {users.filter(u => u.roles?.includes('TEACHER')).length}
+            {stats.by_role?.TEACHER || 0}
           </p>
         </div>
         <div className="bg-white rounded-lg shadow-md p-6">
           <h3 className="text-sm font-semibold text-gray-600 uppercase mb-2">MFA Enabled</h3>
           <p className="text-3xl font-bold text-purple-600">
-            {users.filter(u => u.mfa_enabled).length}
+            {stats.mfa_enabled}
           </p>
         </div>
       </div>
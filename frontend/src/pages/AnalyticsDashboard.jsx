@@ -8,6 +8,9 @@ import { useAuth } from '../auth/AuthContext';
 import api from '../api/axios';
 import reportsService from '../api/reportsService';
 
+// Most recent reports shown in the list
+const REPORTS_PAGE_SIZE = 50;
+
 export default function AnalyticsDashboard() {
   const navigate = useNavigate();
   const { user } = useAuth();
@@ -53,12 +56,12 @@ export default function AnalyticsDashboard() {
       const [studentsRes, classesRes, reportsRes] = await Promise.all([
         api.get('/classes/students/').catch(() => ({ data: [] })),
         api.get('/classes/classes/').catch(() => ({ data: [] })),
-        reportsService.listReports().catch(() => [])
+        reportsService.listReports({ page_size: REPORTS_PAGE_SIZE }).catch(() => [])
       ]);
 
       setStudents(Array.isArray(studentsRes.data) ? studentsRes.data : studentsRes.data.results || []);
       setClasses(Array.isArray(classesRes.data) ? classesRes.data : classesRes.data.results || []);
-      setReports(Array.isArray(reportsRes) ? reportsRes : []);
+      setReports(Array.isArray(reportsRes) ? reportsRes : reportsRes.results || []);
     } catch (err) {
       console.error('Error fetching data:', err);
     } finally {
@@ -117,13 +120,21 @@ export default function AnalyticsDashboard() {
 
       const report = await reportsService.generateReport(reportData);
       
+      // Show the queued report right away, then follow its progress
+      setReports((current) => [report, ...current]);
+      const finalStatus = await reportsService.waitForReport(report.id, (reportStatus) => {
+        setReports((current) => current.map((r) =>
+          r.id === report.id ? { ...r, status: reportStatus.status, progress: reportStatus.progress } : r
+        ));
+      });
+      
       // Refresh reports list
-      const reportsRes = await reportsService.listReports();
-      setReports(Array.isArray(reportsRes) ? reportsRes : []);
+      const reportsRes = await reportsService.listReports({ page_size: REPORTS_PAGE_SIZE });
+      setReports(Array.isArray(reportsRes) ? reportsRes : reportsRes.results || []);
       
       // Auto-download the generated report
-      if (report.status === 'COMPLETED') {
-        await handleDownload(report);
+      if (finalStatus.status === 'COMPLETED') {
+        await handleDownload({ ...report, status: finalStatus.status });
       }
       
       // Reset form and close
@@ -135,14 +146,14 @@ export default function AnalyticsDashboard() {
       
     } catch (err) {
       console.error('Error generating report:', err);
-      setReportError(err.response?.data?.error || 'Failed to generate report');
+      setReportError(err.response?.data?.error || err.message || 'Failed to generate report');
     } finally {
       setGeneratingReport(false);
     }
   };
 
   const handleDownload = async (report) => {
-    if (report.status !== 'COMPLETED') {
+    if (report.status !== 'COMPLETED' && report.status !== 'EXPIRED') {
       setReportError('Only completed reports can be downloaded');
       return;
     }
@@ -174,20 +185,25 @@ export default function AnalyticsDashboard() {
     }
   };
 
-  const getStatusBadge = (status) => {
+  const getStatusBadge = (status, progress) => {
     const styles = {
       COMPLETED: 'bg-green-100 text-green-800',
       PENDING: 'bg-yellow-100 text-yellow-800',
+      PROCESSING: 'bg-blue-100 text-blue-800',
       FAILED: 'bg-red-100 text-red-800',
+      EXPIRED: 'bg-gray-100 text-gray-700',
     };
     const icons = {
       COMPLETED: 'fi fi-ss-check',
       PENDING: 'fi fi-ss-hourglass',
+      PROCESSING: 'fi fi-ss-hourglass',
       FAILED: 'fi fi-ss-cross',
+      EXPIRED: 'fi fi-ss-clock',
     };
     return (
       <span className={`px-2 py-1 rounded-full text-xs font-semibold ${styles[status]}`}>
         <i className={icons[status]}></i> {status}
+        {status === 'PROCESSING' && progress != null ? ` ${progress}%` : ''}
       </span>
     );
   };
@@ -471,8 +487,8 @@ export default function AnalyticsDashboard() {
                     </div>
                   </div>
                   <div className="flex items-center gap-3">
-                    {getStatusBadge(report.status)}
-                    {report.status === 'COMPLETED' && (
+                    {getStatusBadge(report.status, report.progress)}
+                    {(report.status === 'COMPLETED' || report.status === 'EXPIRED') && (
                       <button
                         onClick={() => handleDownload(report)}
                         disabled={downloadingId === report.id}
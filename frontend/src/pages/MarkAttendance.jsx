@@ -6,6 +6,7 @@ import { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { attendanceService } from '../api/attendanceService';
 import { sessionService } from '../api/sessionService';
+import { studentService } from '../api/academicService';
 
 export default function MarkAttendance() {
   const navigate = useNavigate();
@@ -23,6 +24,8 @@ export default function MarkAttendance() {
   const [success, setSuccess] = useState('');
   const [savingStudentId, setSavingStudentId] = useState(null);
   const [searchQuery, setSearchQuery] = useState('');
+  // IDs of roster students matching searchQuery, or null when not searching
+  const [searchMatchIds, setSearchMatchIds] = useState(null);
   const [statusFilter, setStatusFilter] = useState('ALL');
   const [lastSaved, setLastSaved] = useState(null);
 
@@ -41,6 +44,31 @@ export default function MarkAttendance() {
     }
   }, [selectedSessionId]);
 
+  // Match the search with the indexed autocomplete endpoint, debounced
+  const classId = sessionData?.class_id;
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query || !classId) {
+      setSearchMatchIds(null);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const matches = await studentService.autocomplete(query, classId, 50);
+        if (!cancelled) setSearchMatchIds(new Set(matches.map(match => match.id)));
+      } catch (err) {
+        console.error('Error searching students:', err);
+      }
+    }, 250);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery, classId]);
+
   const fetchActiveSessions = async () => {
     try {
       setLoadingSessions(true);
@@ -171,13 +199,7 @@ export default function MarkAttendance() {
 
   const filteredStudents = getEnrolledStudents().filter(student => {
     // Search filter
-    if (searchQuery) {
-      const query = searchQuery.toLowerCase();
-      const matchesId = student.student_id?.toLowerCase().includes(query);
-      const matchesName = student.student_name?.toLowerCase().includes(query);
-      const matchesEmail = student.student_email?.toLowerCase().includes(query);
-      if (!matchesId && !matchesName && !matchesEmail) return false;
-    }
+    if (searchMatchIds && !searchMatchIds.has(student.id)) return false;
     
     // Status filter
     if (statusFilter !== 'ALL') {
@@ -121,17 +121,8 @@ const NotificationsManager = () => {
       setSendingAlerts(true);
       const result = await notificationsService.triggerLowAttendanceAlerts(threshold);
       
-      if (result.count === 0) {
-        showToast(`No students found with attendance below ${threshold}%`, 'info');
-      } else {
-        const studentsList = result.students_alerted
-          ?.map(s => `${s.name} (${s.attendance_rate}%)`)
-          .join(', ') || '';
-        showToast(
-          `${result.count} alert(s) sent to: ${studentsList}`,
-          'success'
-        );
-      }
+      // Alerts are detected and sent in the background; they show up in the list as they are created
+      showToast(result.message, 'success');
       refreshNotifications(); // Refresh list
     } catch (error) {
       console.error('Error sending low attendance alerts:', error);
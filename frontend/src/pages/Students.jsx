@@ -13,6 +13,8 @@ const Students = () => {
   const [managingStudent, setManagingStudent] = useState(null);
   const [searchTerm, setSearchTerm] = useState('');
   const [filterClass, setFilterClass] = useState('');
+  // IDs of students matching searchTerm, or null when not searching
+  const [searchMatchIds, setSearchMatchIds] = useState(null);
   
   const [formData, setFormData] = useState({
     first_name: '',
@@ -30,6 +32,30 @@ const Students = () => {
     fetchData();
   }, [filterClass]);
 
+  // Match the search with the indexed autocomplete endpoint, debounced
+  useEffect(() => {
+    const query = searchTerm.trim();
+    if (!query) {
+      setSearchMatchIds(null);
+      return;
+    }
+
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const matches = await studentService.autocomplete(query, filterClass || null, 50);
+        if (!cancelled) setSearchMatchIds(new Set(matches.map(match => match.id)));
+      } catch (err) {
+        console.error('Error searching students:', err);
+      }
+    }, 250);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchTerm, filterClass]);
+
   const fetchData = async () => {
     setLoading(true);
     setError('');
@@ -235,15 +261,9 @@ const Students = () => {
   };
 
   // Filter students based on search
-  const filteredStudents = students.filter(student => {
-    const fullName = student.full_name || `${student.first_name} ${student.last_name}`;
-    const studentId = student.student_id || '';
-    return (
-      fullName.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      student.email.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      studentId.toLowerCase().includes(searchTerm.toLowerCase())
-    );
-  });
+  const filteredStudents = searchMatchIds
+    ? students.filter(student => searchMatchIds.has(student.id))
+    : students;
 
   return (
     <div className="max-w-7xl mx-auto">